@@ -0,0 +1 @@
+"""排隊系統效能測試（離線執行，使用假的 Discord / Twitch 物件）"""
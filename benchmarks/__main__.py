@@ -0,0 +1,433 @@
+"""排隊系統效能測試
+
+在不同排隊人數下量測每個操作的延遲與記憶體配置，結果輸出成 JSON：
+
+    python -m benchmarks
+    python -m benchmarks --sizes 10,1000 --repeat 200 --output bench_results.json
+    python -m benchmarks --only 上車,queue.
+
+指令處理函數的測試需要安裝 requirements.txt 中的套件（會 import main，
+但不會連線 Discord / Twitch）。
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+from expiring import ExpiringSet
+from feed import QueueFeed
+from history import QueueHistory
+from dispatch import TWITCH, CommandTable
+from ingest import OP_JOIN, ChatIngest, ChatRequest
+from queue_entry import QueueEntry
+from ride_queue import RideQueue
+from viewer_status import StatusResolver
+from rotation import RotationEngine, TIER_DISCORD_SUB, TIER_VIEWER
+from teams import PairHistory, balance
+
+from benchmarks.fakes import (
+    FakeChannel, FakeContext, FakeDiscordBot, FakeGuild, FakeMember,
+    FakeHelixClient, FakeRole, FakeTwitchAuthor,
+)
+
+DEFAULT_SIZES = (10, 100, 1_000, 10_000, 100_000)
+SUBSCRIBER_RATIO = 0.2  # 預先填入名單時訂閱者的比例
+
+
+class Case:
+    """一個測試項目：setup(size) 建立狀態，op(state, i) 執行一次操作"""
+
+    def __init__(self, name, setup, op, is_async=False, teardown=None):
+        self.name = name
+        self.setup = setup
+        self.op = op
+        self.is_async = is_async
+        self.teardown = teardown
+
+
+async def _run_ops(case, state, repeat, timings=None):
+    op = case.op
+    perf = time.perf_counter_ns
+    for i in range(repeat):
+        start = perf()
+        if case.is_async:
+            await op(state, i)
+        else:
+            op(state, i)
+        if timings is not None:
+            timings.append(perf() - start)
+
+
+async def run_case(case, size, repeat):
+    # 第一輪：量測延遲
+    state = await _maybe_await(case.setup(size))
+    timings = []
+    await _run_ops(case, state, repeat, timings)
+    if case.teardown:
+        await _maybe_await(case.teardown(state))
+
+    # 第二輪：以 tracemalloc 量測記憶體配置（會變慢，所以與延遲分開量測）
+    state = await _maybe_await(case.setup(size))
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    await _run_ops(case, state, repeat)
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if case.teardown:
+        await _maybe_await(case.teardown(state))
+
+    timings.sort()
+    return {
+        "case": case.name,
+        "size": size,
+        "ops": repeat,
+        "mean_us": statistics.fmean(timings) / 1000,
+        "p50_us": timings[len(timings) // 2] / 1000,
+        "p95_us": timings[min(len(timings) - 1, int(len(timings) * 0.95))] / 1000,
+        "max_us": timings[-1] / 1000,
+        "alloc_bytes_per_op": (after - before) / repeat,
+        "peak_bytes": peak - before,
+    }
+
+
+async def _maybe_await(value):
+    if asyncio.iscoroutine(value):
+        return await value
+    return value
+
+
+# ======================
+#  資料結構
+# ======================
+def _filled_queue(size):
+    q = RideQueue()
+    for i in range(size):
+        tier = TIER_DISCORD_SUB if random.random() < SUBSCRIBER_RATIO else TIER_VIEWER
+        q.append(("discord", i), f"member-{i}", tier=tier)
+    return q
+
+
+def _queue_setup(size):
+    return {"queue": _filled_queue(size), "size": size, "next": itertools.count(size)}
+
+
+def _op_append(state, i):
+    n = next(state["next"])
+    state["queue"].append(("discord", n), f"member-{n}", tier=TIER_VIEWER)
+
+
+def _op_position(state, i):
+    state["queue"].position(("discord", random.randrange(state["size"])))
+
+
+def _op_remove_append(state, i):
+    # 中途跳車後再上車，維持名單人數
+    q = state["queue"]
+    key = ("discord", random.randrange(state["size"]))
+    member = q.remove(key)
+    if member is not None:
+        q.append(key, member, tier=TIER_VIEWER)
+
+
+def _op_slice(state, i):
+    q = state["queue"]
+    start = len(q) // 2
+    q.slice_items(start, start + 20)
+
+
+def _rotation_setup(size):
+    state = _queue_setup(size)
+    state["engine"] = RotationEngine()
+    return state
+
+
+def _op_rotate(state, i):
+    q = state["queue"]
+    for key, member in state["engine"].rotate(q, 4):
+        q.append(key, member, tier=TIER_DISCORD_SUB)
+
+
+def _expiring_setup(size):
+    s = ExpiringSet(ttl=30, maxsize=max(size, 1))
+    for i in range(size):
+        s.add(i)
+    return {"set": s, "next": itertools.count(size)}
+
+
+def _op_expiring_add(state, i):
+    state["set"].add(next(state["next"]))
+
+
+def _ingest_setup(size):
+    # 緩衝區已有 size 筆請求，聊天中約一成是指令
+    ingest = ChatIngest(handler=None, maxsize=max(size, 1) * 2)
+    for i in range(size):
+        ingest.offer(ChatRequest(None, OP_JOIN, f"user-{i}", None))
+    chat = ["!上車" if i % 10 == 0 else f"hype hype {i}" for i in range(100)]
+    table = CommandTable()
+    table.add("上車", [TWITCH])
+    return {"ingest": ingest, "chat": chat, "table": table}
+
+
+def _op_ingest_chat(state, i):
+    content = state["chat"][i % 100]
+    if state["table"].match(content, TWITCH) is not None:
+        state["ingest"].offer(ChatRequest(None, OP_JOIN, f"chatter-{i}", None))
+
+
+def _teams_setup(size):
+    # 語音頻道最多 size 人（至少 40 人），評分 800 ~ 2000，最近幾次分組有人常同隊
+    players = max(min(size, 100), 40)
+    ratings = [random.randint(800, 2000) for _ in range(players)]
+    history = PairHistory(window=5, limit=2)
+    for _ in range(3):
+        ids = list(range(players))
+        random.shuffle(ids)
+        history.record(ids[:players // 2], ids[players // 2:])
+    return {"ratings": ratings, "hot": history.hot_pairs(list(range(players)))}
+
+
+def _op_teams_balance(state, i):
+    balance(state["ratings"], state["hot"])
+
+
+FEED_CLIENTS = 100  # 同時連線的疊加畫面數
+
+
+def _feed_setup(size):
+    q = _filled_queue(size)
+    feed = QueueFeed(q, lambda key, member: {"id": f"{key[0]}:{key[1]}", "name": member},
+                     lambda: {"enabled": True}, client_buffer=1_000_000)
+    clients = [feed.connect() for _ in range(FEED_CLIENTS)]
+    return {"queue": q, "feed": feed, "clients": clients, "next": itertools.count(size)}
+
+
+def _op_feed_join(state, i):
+    # 一次變動推送給所有客戶端（事件只序列化一次）
+    n = next(state["next"])
+    state["queue"].append(("discord", n), f"member-{n}", tier=TIER_VIEWER)
+
+
+def _op_feed_snapshot(state, i):
+    # 每次快照前都有變動，量測序列化整份名單的成本
+    _op_feed_join(state, i)
+    state["feed"].snapshot()
+
+
+HISTORY_BATCH = 100  # 每次寫入資料庫的事件數
+HISTORY_ROUNDS = 20  # 預先記錄的換人次數
+
+
+async def _history_setup(size):
+    # 資料庫中已有 size 筆上車紀錄，這場直播已經換人 HISTORY_ROUNDS 次
+    directory = tempfile.mkdtemp()
+    history = QueueHistory(Path(directory) / "history.db", retention_days=0)
+    history.load()
+    now = time.time()
+    history.open_stream(1, now=now - HISTORY_ROUNDS * 600)
+    entries = [QueueEntry("discord", i, f"viewer-{i}", joined_at=now - HISTORY_ROUNDS * 600) for i in range(size)]
+    for entry in entries:
+        history.record(1, "join", [(entry.key, entry)], now=entry.joined_at)
+    for r in range(HISTORY_ROUNDS):
+        played = [(entry.key, entry) for entry in entries[r * 4:(r + 1) * 4]]
+        history.record(1, "rotate", played, now=now - (HISTORY_ROUNDS - r) * 600 + random.uniform(-60, 60))
+    await history.flush()
+    return {"history": history, "directory": directory, "size": size, "next": itertools.count(size)}
+
+
+def _history_teardown(state):
+    state["history"].close()
+    shutil.rmtree(state["directory"], ignore_errors=True)
+
+
+async def _op_history_write(state, i):
+    # 一批上車紀錄在一個交易中寫入，同時更新彙總表
+    history = state["history"]
+    for _ in range(HISTORY_BATCH):
+        n = next(state["next"])
+        entry = QueueEntry("discord", n, f"viewer-{n}")
+        history.record(1, "join", [(entry.key, entry)])
+    await history.flush()
+
+
+def _op_history_eta(state, i):
+    state["history"].eta(1, i % max(state["size"], 1) + 1, 4)
+
+
+def _op_history_stats(state, i):
+    state["history"].stream_stats(1)
+
+
+STRUCTURE_CASES = [
+    Case("queue.append", _queue_setup, _op_append),
+    Case("queue.position", _queue_setup, _op_position),
+    Case("queue.remove+append", _queue_setup, _op_remove_append),
+    Case("queue.slice_page", _queue_setup, _op_slice),
+    Case("rotation.rotate", _rotation_setup, _op_rotate),
+    Case("expiring.add", _expiring_setup, _op_expiring_add),
+    Case("ingest.chat", _ingest_setup, _op_ingest_chat),
+    Case("teams.balance", _teams_setup, _op_teams_balance),
+    Case("feed.publish", _feed_setup, _op_feed_join),
+    Case("feed.snapshot", _feed_setup, _op_feed_snapshot),
+    Case("history.write", _history_setup, _op_history_write, is_async=True, teardown=_history_teardown),
+    Case("history.eta", _history_setup, _op_history_eta, teardown=_history_teardown),
+    Case("history.stream_stats", _history_setup, _op_history_stats, teardown=_history_teardown),
+]
+
+
+# ======================
+#  指令處理函數
+# ======================
+def handler_cases():
+    """需要 import main 的測試項目（缺少套件時回傳空列表）"""
+    try:
+        import main
+    except ImportError as e:
+        print(f"[Bench] 略過指令測試：無法載入 main（{e}）")
+        return []
+
+    line = next(iter(main.registry))
+    guild = FakeGuild()
+    channel = FakeChannel(line.channel_id, guild)
+    admin = FakeMember("admin", guild, roles=[FakeRole("保姆", guild)])
+    sub_role = FakeRole("訂閱者", guild)
+    # Twitch 指令透過 bot.get_channel 找到 Discord 頻道（不連線）
+    main.bot.get_channel = FakeDiscordBot([channel]).get_channel
+    # 排隊名單只存 ID，顯示時透過 bot.get_guild 查詢成員
+    line.guild_id = guild.id
+    main.bot.get_guild = lambda guild_id: guild if guild_id == guild.id else None
+
+    # 不連線 Discord，視為排隊名單已還原完成
+    main.queues_ready.set()
+
+    # Twitch 觀眾狀態以替身查詢（不等待合併），查到後在背景調整優先順序
+    main.viewer_status = StatusResolver(FakeHelixClient(), window=0)
+    asyncio.get_running_loop().create_task(main.viewer_status.run())
+
+    # 送出的訊息不等待合併、不限速
+    main.outbox.window = 0
+    main.outbox.rate = 10 ** 9
+
+    def new_member(i):
+        roles = [sub_role] if random.random() < SUBSCRIBER_RATIO else []
+        return FakeMember(f"viewer-{i}", guild, roles=roles)
+
+    def setup(size):
+        line.queue.clear()
+        line.enabled = True
+        members = [new_member(i) for i in range(size)]
+        for m in members:
+            entry = main.discord_entry(m, line)
+            line.queue.append(entry.key, entry, tier=main.get_tier(entry, line))
+        return {"members": members, "size": size, "next": itertools.count(size)}
+
+    async def teardown(state):
+        await main.outbox.flush()
+        line.queue.clear()
+
+    def middle(state):
+        return state["members"][state["size"] // 2]
+
+    async def op_ride_new(state, i):
+        await main.上車.callback(FakeContext(new_member(next(state["next"])), channel))
+
+    async def op_ride_duplicate(state, i):
+        await main.上車.callback(FakeContext(middle(state), channel))
+
+    async def op_leave_rejoin(state, i):
+        member = middle(state) if i % 2 == 0 else state["members"][-1]
+        ctx = FakeContext(member, channel)
+        await main.跳車.callback(ctx)
+        await main.上車.callback(ctx)
+
+    # 記錄換人移除的成員，之後放回名單末尾以維持人數
+    rotated = []
+    line.queue.subscribe(lambda op, entries: rotated.extend(entries) if op == "rotate" else None)
+
+    async def op_rotate(state, i):
+        rotated.clear()
+        await main.換人.callback(FakeContext(admin, channel))
+        for key, entry in rotated:
+            line.queue.append(key, entry, tier=main.get_tier(entry, line))
+
+    async def op_status(state, i):
+        await main.查車況.callback(FakeContext(admin, channel))
+
+    def op_board_render(state, i):
+        line.board.page = i % line.board.page_count()
+        line.board.render()
+
+    async def op_twitch_ride(state, i):
+        name = f"twitch_{next(state['next'])}"
+        author = FakeTwitchAuthor(name, is_subscriber=random.random() < SUBSCRIBER_RATIO)
+        await main.apply_twitch_batch([ChatRequest(line, OP_JOIN, name, author)])
+
+    return [
+        Case("上車", setup, op_ride_new, is_async=True, teardown=teardown),
+        Case("上車(重複)", setup, op_ride_duplicate, is_async=True, teardown=teardown),
+        Case("跳車+上車", setup, op_leave_rejoin, is_async=True, teardown=teardown),
+        Case("換人", setup, op_rotate, is_async=True, teardown=teardown),
+        Case("查車況", setup, op_status, is_async=True, teardown=teardown),
+        Case("排隊清單.render", setup, op_board_render, teardown=teardown),
+        Case("twitch.上車", setup, op_twitch_ride, is_async=True, teardown=teardown),
+    ]
+
+
+# ======================
+#  主程式
+# ======================
+async def run(sizes, repeat, only):
+    cases = STRUCTURE_CASES + handler_cases()
+    if only:
+        cases = [c for c in cases if any(c.name.startswith(prefix) for prefix in only)]
+
+    results = []
+    print(f"{'case':<22}{'size':>8}{'mean µs':>12}{'p95 µs':>12}{'alloc B/op':>14}")
+    for case in cases:
+        for size in sizes:
+            result = await run_case(case, size, repeat)
+            results.append(result)
+            print(f"{case.name:<22}{size:>8}{result['mean_us']:>12.2f}{result['p95_us']:>12.2f}"
+                  f"{result['alloc_bytes_per_op']:>14.1f}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="排隊系統效能測試")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="排隊人數，以逗號分隔")
+    parser.add_argument("--repeat", type=int, default=500, help="每個項目的操作次數")
+    parser.add_argument("--only", default="", help="只執行名稱以這些前綴開頭的項目，以逗號分隔")
+    parser.add_argument("--output", default="bench_results.json", help="JSON 結果輸出路徑")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    only = [s for s in args.only.split(",") if s]
+    results = asyncio.run(run(sizes, args.repeat, only))
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"[Bench] 結果已寫入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""效能測試用的輕量替身物件
+
+只實作指令處理函數實際用到的屬性與方法，不連線 Discord / Twitch。
+"""
+import asyncio
+import itertools
+
+_ids = itertools.count(10_000)
+
+
+def next_id():
+    return next(_ids)
+
+
+class FakeRole:
+    def __init__(self, name, guild=None):
+        self.id = next_id()
+        self.name = name
+        self.guild = guild
+
+
+class FakeGuild:
+    def __init__(self, guild_id=None):
+        self.id = guild_id or next_id()
+        self.members = {}
+
+    def get_member(self, member_id):
+        return self.members.get(member_id)
+
+    async def fetch_member(self, member_id):
+        return self.members[member_id]
+
+
+class FakeMember:
+    """discord.Member 替身"""
+
+    def __init__(self, name, guild, roles=(), bot=False):
+        self.id = next_id()
+        self.name = name
+        self.display_name = name
+        self.guild = guild
+        self.roles = list(roles)
+        self.bot = bot
+        self.voice = None
+        guild.members[self.id] = self
+
+    def __str__(self):
+        return self.name
+
+
+class FakeMessage:
+    def __init__(self, channel, content="", author=None):
+        self.id = next_id()
+        self.channel = channel
+        self.content = content
+        self.author = author
+        self.reactions = []
+
+    async def add_reaction(self, emoji):
+        self.reactions.append(emoji)
+
+    async def edit(self, content=None, **kwargs):
+        self.content = content
+
+    async def pin(self):
+        pass
+
+
+class FakeChannel:
+    """文字頻道替身，只記錄送出的訊息數量與總字數"""
+
+    def __init__(self, channel_id, guild):
+        self.id = channel_id
+        self.guild = guild
+        self.sent = 0
+        self.sent_chars = 0
+
+    async def send(self, content, **kwargs):
+        self.sent += 1
+        self.sent_chars += len(content)
+        return FakeMessage(self, content)
+
+
+class FakeContext:
+    """commands.Context 替身"""
+
+    def __init__(self, author, channel):
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.message = FakeMessage(channel, author=author)
+
+    async def send(self, content, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+
+class FakeTwitchAuthor:
+    def __init__(self, name, is_subscriber=False, is_follower=False):
+        self.name = name
+        self.id = str(next_id())
+        self.is_subscriber = is_subscriber
+        self.is_follower = is_follower
+
+
+class FakeTwitchMessage:
+    """twitchio Message 替身"""
+
+    def __init__(self, content, author, echo=False):
+        self.content = content
+        self.author = author
+        self.echo = echo
+
+
+class FakeDiscordBot:
+    """Discord Bot 替身（只提供 get_channel）"""
+
+    def __init__(self, channels):
+        self._channels = {c.id: c for c in channels}
+
+    def get_channel(self, channel_id):
+        return self._channels.get(channel_id)
+
+
+class FakeHelixClient:
+    """Twitch Helix API 替身：user_id 以 0 結尾的是訂閱者，偶數結尾的是追隨者"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    async def _call(self):
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+
+    async def user_ids(self, logins):
+        await self._call()
+        return {login: str(next_id()) for login in logins}
+
+    async def subscribers(self, broadcaster_id, user_ids):
+        await self._call()
+        return {uid for uid in user_ids if uid.endswith("0")}
+
+    async def is_follower(self, broadcaster_id, user_id):
+        await self._call()
+        return int(user_id[-1]) % 2 == 0
+
+    async def close(self):
+        pass
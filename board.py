@@ -0,0 +1,164 @@
+"""排隊看板
+
+在頻道中保留一則「排隊看板」訊息，排隊名單變動時直接編輯它，取代每次
+!排隊清單 都重新組出整份名單並發送新訊息：
+- 名單變動後延遲 debounce 秒才編輯，短時間內的多次變動只編輯一次
+- 只渲染目前頁面的成員，名單再長也不會超過 Discord 2000 字上限
+- 每位成員的顯示片段會快取，stamp(成員) 未變時不重新查詢名稱與身分組
+- 看板下方有上一頁 / 下一頁按鈕
+"""
+import asyncio
+
+import discord
+
+from botlog import get_logger
+from outbox import MESSAGE_LIMIT
+
+log = get_logger("queue.board")
+
+
+class BoardView(discord.ui.View):
+    """看板翻頁按鈕"""
+
+    def __init__(self, board):
+        super().__init__(timeout=None)
+        self.board = board
+
+    @discord.ui.button(emoji="◀️", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction, button):
+        self.board.page = max(0, self.board.page - 1)
+        await self.board.respond(interaction)
+
+    @discord.ui.button(emoji="▶️", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction, button):
+        self.board.page = min(self.board.page_count() - 1, self.board.page + 1)
+        await self.board.respond(interaction)
+
+
+class QueueBoard:
+    """可就地更新、分頁的排隊看板"""
+
+    def __init__(self, queue, outbox, describe, is_enabled, max_players, page_size=20, debounce=2.0, stamp=None):
+        self.queue = queue
+        self.outbox = outbox
+        self.describe = describe      # describe(成員) -> (圖示, 顯示名稱, 身份類型)，渲染時才查詢
+        self.stamp = stamp            # stamp(成員) -> 顯示內容的依據（名稱、層級、分類快取的版本）；None 表示每次都查詢
+        self.is_enabled = is_enabled  # 回傳上車系統是否開啟
+        self.max_players = max_players
+        self.page_size = page_size
+        self.debounce = debounce
+
+        self.message = None   # 看板訊息
+        self.page = 0
+        self._view = None
+        self._task = None
+        self._last_content = None
+        self._fragments = {}  # key -> (stamp, 顯示片段)
+
+        # 統計數據
+        self.edits = 0
+        self.fragment_hits = 0
+
+        queue.subscribe(self._on_change)
+
+    # ---------- 渲染 ----------
+    def fragment(self, key, member):
+        """成員的顯示片段 (圖示, "名稱（身份）")，stamp 未變時直接重用，不呼叫 describe"""
+        stamp = self.stamp(member) if self.stamp is not None else None
+        cached = self._fragments.get(key)
+        if stamp is not None and cached is not None and cached[0] == stamp:
+            self.fragment_hits += 1
+            return cached[1]
+        icon, name, role_type = self.describe(member)
+        fragment = (icon, f"{name}（{role_type}）")
+        self._fragments[key] = (stamp, fragment)
+        return fragment
+
+    def line(self, position, key, member, mark=""):
+        """完整的一行：[標記]圖示 名次. 名稱（身份）"""
+        icon, text = self.fragment(key, member)
+        return f"{mark}{icon} {position}. {text}"
+
+    def page_count(self):
+        return max(1, -(-len(self.queue) // self.page_size))
+
+    def render(self):
+        """渲染目前頁面"""
+        if not self.is_enabled():
+            return "⛔ 上車系統尚未開啟！"
+        total = len(self.queue)
+        if not total:
+            return "📭 目前沒有人排隊喔～"
+
+        pages = self.page_count()
+        self.page = min(self.page, pages - 1)
+        start = self.page * self.page_size
+        lines = [f"🚌 目前排隊共 {total} 人（第 {self.page + 1}/{pages} 頁）："]
+        for i, (key, member) in enumerate(self.queue.slice_items(start, start + self.page_size), start=start + 1):
+            # 前 MAX_PLAYERS 位標記為即將上場
+            mark = "🎮" if i <= self.max_players else "🕓"
+            lines.append(self.line(i, key, member, mark))
+        content = "\n".join(lines)
+        if len(content) > MESSAGE_LIMIT:
+            # 只保留完整的行，不從名稱或 markdown 中間截斷
+            content = content[:MESSAGE_LIMIT + 1].rsplit("\n", 1)[0]
+        return content
+
+    # ---------- 更新 ----------
+    def _on_change(self, op, entries):
+        if op == "clear":
+            self._fragments.clear()
+        elif op != "join":
+            for key, _ in entries:
+                self._fragments.pop(key, None)
+        self.schedule()
+
+    def schedule(self):
+        """排程一次延遲編輯（已排程時不重複排程）"""
+        if self.message is None or self._task is not None:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._debounced_edit())
+
+    async def _debounced_edit(self):
+        try:
+            await asyncio.sleep(self.debounce)
+        finally:
+            self._task = None
+        await self._edit()
+
+    async def _edit(self):
+        content = self.render()
+        if content == self._last_content or self.message is None:
+            return
+        try:
+            await self.message.edit(content=content, view=self._view)
+            self._last_content = content
+            self.edits += 1
+        except discord.NotFound:
+            # 看板訊息被刪除，下次 !排隊清單 時重新建立
+            self.message = None
+        except discord.HTTPException as e:
+            log.error("更新看板失敗 - %s", e)
+
+    async def respond(self, interaction):
+        """翻頁按鈕：直接以互動回應更新看板"""
+        content = self.render()
+        await interaction.response.edit_message(content=content, view=self._view)
+        self._last_content = content
+
+    async def show(self, channel):
+        """顯示看板：已存在時只更新內容，否則發送新的看板訊息，回傳是否發送了新訊息"""
+        if self.message is not None and self.message.channel.id == channel.id:
+            self.schedule()
+            return False
+
+        if self._view is None:
+            self._view = BoardView(self)
+        content = self.render()
+        self.message = await self.outbox.send_now(channel, content, view=self._view)
+        self._last_content = content
+        try:
+            await self.message.pin()
+        except discord.HTTPException:
+            pass  # 沒有釘選權限時略過
+        return True
@@ -0,0 +1,24 @@
+"""啟動時間紀錄
+
+記錄從程式開始執行到各元件就緒（網頁伺服器、日誌讀取、Discord、Twitch）
+所經過的時間，用來比較每次冷啟動的速度。
+"""
+import time
+
+
+class BootTimer:
+    """記錄各啟動階段完成的時間點（相對於程式開始執行）"""
+
+    def __init__(self, started=None):
+        self.started = time.perf_counter() if started is None else started
+        self.marks = {}  # 階段名稱 -> 秒數（保持完成順序）
+
+    def mark(self, phase):
+        """記錄階段完成（同一階段只記錄第一次）"""
+        if phase not in self.marks:
+            self.marks[phase] = time.perf_counter() - self.started
+        return self.marks[phase]
+
+    def report(self):
+        """一行文字的啟動時間報告"""
+        return "、".join(f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in self.marks.items())
@@ -0,0 +1,140 @@
+"""日誌設定
+
+取代直接 print 到 stdout：
+- 各模組透過 get_logger("twitch") 等取得子系統的 logger（名稱為 bot.<子系統>），
+  訊息以 %s 延遲格式化，等級不夠時完全不會組字串
+- 所有紀錄先放進 QueueHandler，由 QueueListener 的背景執行緒寫出，
+  事件循環中的處理函數只需要付出一次 enqueue 的成本
+- 各子系統的等級可以用環境變數調整，不需要改程式碼：
+      LOG_LEVEL=INFO
+      LOG_LEVELS=twitch=WARNING,queue=DEBUG
+- 高頻率的事件可以取樣，例如 LOG_SAMPLE=twitch.chat=100 表示每 100 則只輸出 1 則
+  （WARNING 以上的紀錄一定輸出）
+- LOG_FORMAT=json 時每筆紀錄輸出成一行 JSON
+- discord.py / twitchio 本身的紀錄預設只輸出 WARNING 以上，可用
+  LOG_LEVELS=discord.py=INFO,twitchio=DEBUG 調整
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+ROOT = "bot"
+
+LIBRARIES = {"discord.py": "discord", "twitchio": "twitchio"}  # 設定名稱 -> 套件的 logger 名稱
+
+TEXT_FORMAT = "%(asctime)s %(levelname)-7s [%(subsystem)s] %(message)s"
+
+_listener = None
+
+
+def get_logger(subsystem):
+    """取得子系統的 logger，例如 get_logger("twitch.chat")"""
+    return logging.getLogger(f"{ROOT}.{subsystem}")
+
+
+def parse_levels(spec):
+    """解析 "twitch=WARNING,queue=DEBUG" 格式的設定"""
+    levels = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        name, value = item.split("=", 1)
+        levels[name.strip()] = value.strip().upper()
+    return levels
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """不在呼叫端格式化訊息，直接把紀錄放進佇列（格式化在背景執行緒進行）"""
+
+    def prepare(self, record):
+        return record
+
+
+class SubsystemFilter(logging.Filter):
+    """加上 record.subsystem（logger 名稱去掉 bot. 前綴）"""
+
+    def filter(self, record):
+        name = record.name
+        record.subsystem = name[len(ROOT) + 1:] if name.startswith(ROOT + ".") else name
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """同一個訊息格式每 every 則只保留 1 則（WARNING 以上不取樣）"""
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = max(1, int(every))
+        self._counts = {}
+        self.suppressed = 0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.every == 1:
+            return True
+        count = self._counts.get(record.msg, 0)
+        self._counts[record.msg] = count + 1
+        if count % self.every == 0:
+            return True
+        self.suppressed += 1
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    """每筆紀錄一行 JSON"""
+
+    def format(self, record):
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "subsystem": getattr(record, "subsystem", record.name),
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+def setup_logging(level=None, levels=None, samples=None, fmt=None, stream=None):
+    """設定 bot.* 的日誌輸出（重複呼叫時不會重複設定），未指定的參數從環境變數讀取"""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    levels = levels if levels is not None else parse_levels(os.getenv("LOG_LEVELS", ""))
+    samples = samples if samples is not None else parse_levels(os.getenv("LOG_SAMPLE", ""))
+    fmt = fmt or os.getenv("LOG_FORMAT", "text")
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT, "%H:%M:%S"))
+
+    # 事件循環只負責放進佇列，格式化與寫出都在背景執行緒
+    records = queue.SimpleQueue()
+    handler = DeferredQueueHandler(records)
+    handler.addFilter(SubsystemFilter())
+
+    root = logging.getLogger(ROOT)
+    root.setLevel(level)
+    root.addHandler(handler)
+    root.propagate = False
+    for name, value in levels.items():
+        if name not in LIBRARIES:
+            get_logger(name).setLevel(value)
+    for name, every in samples.items():
+        get_logger(name).addFilter(SamplingFilter(every))
+
+    # discord.py / twitchio 本身的紀錄也經過同一個佇列，只輸出警告以上
+    for name, library in LIBRARIES.items():
+        library_logger = logging.getLogger(library)
+        library_logger.setLevel(levels.get(name, "WARNING"))
+        library_logger.addHandler(handler)
+        library_logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
@@ -0,0 +1,149 @@
+"""執行中的診斷資訊（!診斷 指令使用）
+
+直播中 Bot 卡住時，不需要重新部署加 print 就能看到原因：
+- 慢回呼偵測：暫時替換 asyncio 的 Handle._run，記錄執行超過門檻的回呼
+  與它所屬的 Task / 協程名稱。預設關閉，關閉時還原成原本的方法，沒有任何成本
+- Task 統計：依協程名稱分組計算執行中的 Task 數，殘留的計時工作等會很明顯
+- 記憶體：需要時才啟動 tracemalloc，之後取快照列出配置最多的程式位置
+"""
+import asyncio
+import time
+import tracemalloc
+from collections import Counter, deque
+
+from botlog import get_logger
+
+log = get_logger("system.diagnostics")
+
+
+def _coro_chain(coro):
+    """協程目前在 await 的呼叫鏈（外層在前）"""
+    names = []
+    while coro is not None and hasattr(coro, "__qualname__"):
+        names.append(coro.__qualname__)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return names
+
+
+def _task_chain(callback):
+    """Task 步驟回呼的協程呼叫鏈（不是 Task 的回呼回傳 None）"""
+    owner = getattr(callback, "__self__", None)
+    if isinstance(owner, asyncio.Task):
+        return _coro_chain(owner.get_coro())
+    return None
+
+
+def describe_callback(callback, chain=None):
+    """回呼的顯示名稱：Task 的步驟顯示 Task 名稱與最內層的協程（chain 為執行前取得的呼叫鏈）"""
+    owner = getattr(callback, "__self__", None)
+    if isinstance(owner, asyncio.Task):
+        if chain is None:
+            chain = _coro_chain(owner.get_coro())
+        return f"{owner.get_name()} ({chain[-1]})" if chain else owner.get_name()
+    return getattr(callback, "__qualname__", None) or repr(callback)
+
+
+class SlowCallbackMonitor:
+    """記錄執行超過 threshold 秒、阻塞事件循環的回呼"""
+
+    def __init__(self, threshold=0.1, keep=20):
+        self.threshold = threshold
+        self.recent = deque(maxlen=keep)  # 最近的 (時間, 名稱, 秒數)
+        self.counts = Counter()           # 名稱 -> 次數
+        self.total = 0
+        self._original = None             # 啟用時原本的 Handle._run
+
+    @property
+    def enabled(self):
+        return self._original is not None
+
+    def enable(self, threshold=None):
+        if threshold is not None:
+            self.threshold = threshold
+        if self.enabled:
+            return
+        original = asyncio.Handle._run
+        monitor = self
+        perf = time.perf_counter
+
+        def _run(handle):
+            callback = handle._callback
+            # 執行前先取得呼叫鏈：執行後協程已經停在下一個 await，或已經結束
+            chain = _task_chain(callback)
+            start = perf()
+            original(handle)
+            elapsed = perf() - start
+            if elapsed >= monitor.threshold:
+                monitor._record(callback, chain, elapsed)
+
+        self._original = original
+        asyncio.Handle._run = _run
+        log.info("慢回呼偵測已開啟（門檻 %.0f ms）", self.threshold * 1000)
+
+    def disable(self):
+        if not self.enabled:
+            return
+        asyncio.Handle._run = self._original
+        self._original = None
+        log.info("慢回呼偵測已關閉")
+
+    def _record(self, callback, chain, elapsed):
+        name = describe_callback(callback, chain)
+        self.recent.append((time.time(), name, elapsed))
+        self.counts[name] += 1
+        self.total += 1
+        log.warning("回呼執行了 %.0f ms：%s", elapsed * 1000, name)
+
+    def clear(self):
+        self.recent.clear()
+        self.counts.clear()
+        self.total = 0
+
+
+def task_summary(loop=None):
+    """執行中的 Task 依協程名稱分組：[(名稱, 數量), ...]，數量多的在前"""
+    counts = Counter()
+    for task in asyncio.all_tasks(loop):
+        chain = _coro_chain(task.get_coro())
+        counts[chain[0] if chain else task.get_name()] += 1
+    return counts.most_common()
+
+
+class MemoryTracer:
+    """需要時才啟動的 tracemalloc（啟動後所有配置都會變慢，用完請關閉）"""
+
+    def __init__(self, frames=1):
+        self.frames = frames
+        self.started_here = False  # 由這裡啟動（PYTHONTRACEMALLOC 等外部啟動的不會被關閉）
+
+    @property
+    def tracing(self):
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self.started_here = True
+
+    def stop(self):
+        if self.started_here:
+            tracemalloc.stop()
+            self.started_here = False
+
+    def top(self, limit=10):
+        """配置最多的程式位置：(總 bytes, [(位置, bytes, 個數), ...])，沒有啟動時回傳 None
+
+        取快照會阻塞，請在執行緒池中呼叫。
+        """
+        if not tracemalloc.is_tracing():
+            return None
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ))
+        stats = snapshot.statistics("lineno")
+        rows = []
+        for stat in stats[:limit]:
+            frame = stat.traceback[0]
+            rows.append((f"{frame.filename}:{frame.lineno}", stat.size, stat.count))
+        return sum(stat.size for stat in stats), rows
@@ -0,0 +1,72 @@
+"""Discord 與 Twitch 共用的指令分派表
+
+啟動時建立「指令文字 -> 指令」的 dict，每則訊息只需要：
+- 檢查開頭是不是指令前綴（大部分聊天在這一步就被排除）
+- 取出第一個詞查表一次
+不需要對每個關鍵字做子字串搜尋。每個指令可以限定平台，也可以個別停用。
+"""
+
+DISCORD = "discord"
+TWITCH = "twitch"
+
+
+class Command:
+    """分派表中的一個指令"""
+
+    __slots__ = ("name", "platforms", "enabled")
+
+    def __init__(self, name, platforms):
+        self.name = name
+        self.platforms = set(platforms)
+        self.enabled = True
+
+
+class CommandTable:
+    """預先建立的指令分派表"""
+
+    def __init__(self, prefix="!"):
+        self.prefix = prefix
+        self._commands = {}  # 指令名稱 -> Command
+        self._lookup = {}    # 指令文字（名稱或別名，不含前綴）-> Command
+
+        # 統計數據
+        self.matched = 0   # 符合指令的訊息數
+        self.ignored = 0   # 不是指令（或已停用）的訊息數
+
+    def __contains__(self, name):
+        return name in self._commands
+
+    def add(self, name, platforms, aliases=()):
+        """加入指令（同名指令已存在時合併平台與別名）"""
+        command = self._commands.get(name)
+        if command is None:
+            command = self._commands[name] = Command(name, platforms)
+        else:
+            command.platforms.update(platforms)
+        for text in (name, *aliases):
+            self._lookup[text] = command
+        return command
+
+    def set_enabled(self, name, enabled):
+        """啟用 / 停用指令，回傳指令是否存在"""
+        command = self._commands.get(name)
+        if command is None:
+            return False
+        command.enabled = enabled
+        return True
+
+    def disabled(self):
+        return [name for name, command in self._commands.items() if not command.enabled]
+
+    def match(self, content, platform):
+        """訊息對應的指令名稱，不是指令、已停用或不支援該平台時回傳 None"""
+        if not content.startswith(self.prefix):
+            self.ignored += 1
+            return None
+        text = content[len(self.prefix):].split(None, 1)
+        command = self._lookup.get(text[0]) if text else None
+        if command is None or not command.enabled or platform not in command.platforms:
+            self.ignored += 1
+            return None
+        self.matched += 1
+        return command.name
@@ -0,0 +1,85 @@
+"""會自動過期、有容量上限的集合
+
+用於 Discord 訊息 ID 去重與 Twitch 使用者冷卻時間：
+- 每個集合有固定的 TTL，因此插入順序就是過期順序，
+  清理時只需要從最舊的一端開始移除，不需要為每個 key 建立計時工作
+- 超過容量上限時淘汰最舊的 key，記憶體用量固定
+- 所有集合共用一個背景清理工作（Sweeper）
+"""
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class ExpiringSet:
+    """在 ttl 秒後自動移除 key 的集合"""
+
+    def __init__(self, ttl, maxsize):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._expires = OrderedDict()  # key -> 過期時間（依插入順序 = 過期順序）
+
+        # 統計數據
+        self.hits = 0       # add() 時 key 已存在的次數
+        self.evictions = 0  # 因容量上限被提早淘汰的數量
+
+    def __len__(self):
+        return len(self._expires)
+
+    def __contains__(self, key):
+        expires = self._expires.get(key)
+        if expires is None:
+            return False
+        if expires <= time.monotonic():
+            del self._expires[key]
+            return False
+        return True
+
+    def add(self, key):
+        """加入 key，成功回傳 True；key 尚未過期則回傳 False"""
+        now = time.monotonic()
+        self.sweep(now)
+        if key in self._expires:
+            self.hits += 1
+            return False
+        if len(self._expires) >= self.maxsize:
+            self._expires.popitem(last=False)
+            self.evictions += 1
+        self._expires[key] = now + self.ttl
+        return True
+
+    def discard(self, key):
+        self._expires.pop(key, None)
+
+    def sweep(self, now=None):
+        """移除所有已過期的 key，回傳移除數量"""
+        if now is None:
+            now = time.monotonic()
+        expires = self._expires
+        removed = 0
+        while expires:
+            key, deadline = next(iter(expires.items()))
+            if deadline > now:
+                break
+            del expires[key]
+            removed += 1
+        return removed
+
+
+class Sweeper:
+    """定期清理所有已註冊集合的單一背景工作"""
+
+    def __init__(self, interval=5.0):
+        self.interval = interval
+        self._sets = []
+
+    def register(self, expiring_set):
+        self._sets.append(expiring_set)
+        return expiring_set
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            for s in self._sets:
+                s.sweep(now)
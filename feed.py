@@ -0,0 +1,104 @@
+"""排隊名單的唯讀 API（給直播的疊加畫面使用）
+
+- snapshot()：整份名單的 JSON，附版本號與 ETag；名單沒有變動時重用同一份
+  序列化結果，疊加畫面輪詢時帶 If-None-Match 就只會拿到 304
+- 名單每次變動（上車、跳車、換人…）產生一筆差異事件，只序列化一次，
+  以 server-sent events 的格式放進每個連線中客戶端的佇列
+- 每個客戶端的佇列有上限，跟不上的客戶端會被中斷，重新連線時會先收到完整名單
+"""
+import asyncio
+import json
+import time
+
+from botlog import get_logger
+
+log = get_logger("web.feed")
+
+
+def _event(name, version, data):
+    """組成一筆 server-sent event（data 為已序列化的單行 JSON）"""
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (version, name.encode(), data)
+
+
+class QueueFeed:
+    """排隊名單的快照與變動事件"""
+
+    def __init__(self, queue, serialize, state, client_buffer=256):
+        self.queue = queue
+        self.serialize = serialize  # serialize(key, 成員) -> dict
+        self.state = state          # state() -> 名單以外的欄位（開關、人數上限等）
+        self.client_buffer = client_buffer
+        self.version = 0
+        # 重新啟動後版本號會從 0 開始，ETag 加上啟動時間避免與重啟前的快照相同
+        self._epoch = f"{int(time.time()):x}"
+        self._snapshot = None  # (ETag, JSON bytes)
+        self._clients = set()  # 各客戶端的 asyncio.Queue
+
+        # 統計數據
+        self.snapshot_builds = 0  # 實際序列化整份名單的次數
+        self.events = 0           # 推送的差異事件數
+        self.dropped_clients = 0  # 跟不上而被中斷的客戶端數
+
+        queue.subscribe(self.publish)
+
+    @property
+    def etag(self):
+        return f'"{self._epoch}-{self.version}"'
+
+    @property
+    def clients(self):
+        return len(self._clients)
+
+    def snapshot(self):
+        """(ETag, JSON bytes)，名單沒有變動時重用快取"""
+        if self._snapshot is None:
+            body = dict(self.state(), version=self.version,
+                        queue=[self.serialize(key, member) for key, member in self.queue.items()])
+            self._snapshot = (self.etag, json.dumps(body, ensure_ascii=False).encode())
+            self.snapshot_builds += 1
+        return self._snapshot
+
+    def publish(self, op, entries=()):
+        """名單或狀態變動：更新版本號並推送差異給所有客戶端"""
+        self.version += 1
+        self._snapshot = None
+        if not self._clients:
+            return
+
+        data = {"version": self.version, "op": op,
+                "entries": [self.serialize(key, member) for key, member in entries]}
+        event = _event(op, self.version, json.dumps(data, ensure_ascii=False).encode())
+        self.events += 1
+        for client in list(self._clients):
+            try:
+                client.put_nowait(event)
+            except asyncio.QueueFull:
+                self._drop(client)
+
+    def connect(self):
+        """新的客戶端：回傳佇列，第一筆是完整名單，之後是差異事件（None 表示連線結束）"""
+        client = asyncio.Queue(self.client_buffer)
+        _, body = self.snapshot()
+        client.put_nowait(_event("snapshot", self.version, body))
+        self._clients.add(client)
+        return client
+
+    def disconnect(self, client):
+        self._clients.discard(client)
+
+    def _drop(self, client):
+        self.dropped_clients += 1
+        log.warning("疊加畫面客戶端跟不上名單變動，中斷連線")
+        self._end(client)
+
+    def _end(self, client):
+        # 清掉尚未送出的事件，確保結束訊號放得進佇列
+        self._clients.discard(client)
+        while not client.empty():
+            client.get_nowait()
+        client.put_nowait(None)
+
+    def close(self):
+        """中斷所有客戶端（程式結束時呼叫）"""
+        for client in list(self._clients):
+            self._end(client)
@@ -0,0 +1,348 @@
+"""排隊歷史紀錄與等待時間統計
+
+換人之後被移出名單的人原本就不會留下紀錄。這裡把上車、跳車、換人寫進 SQLite：
+- 記錄時只放進記憶體緩衝區，由背景工作每隔 flush_interval 秒在執行緒池中
+  以一個交易批次寫入（和 QueueJournal 一樣，不阻塞事件循環）
+- 寫入時同時更新預先彙總的表：每場直播（開始上車到停止上車）一列、
+  每個頻道每小時一列；統計查詢只讀彙總表，不掃描完整的事件紀錄
+- 每輪時間（同一場直播中兩次換人的間隔）保留最近 window 輪在記憶體中，
+  以中位數推算排隊第 N 位大約多久後上場，查詢時不需要讀資料庫
+"""
+import asyncio
+import sqlite3
+import statistics
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from botlog import get_logger
+from storage import FlushLoop
+
+log = get_logger("queue.history")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS streams (
+    id          INTEGER PRIMARY KEY,
+    line        INTEGER NOT NULL,
+    started     REAL NOT NULL,
+    ended       REAL,
+    joins       INTEGER NOT NULL DEFAULT 0,
+    leaves      INTEGER NOT NULL DEFAULT 0,
+    rounds      INTEGER NOT NULL DEFAULT 0,
+    players     INTEGER NOT NULL DEFAULT 0,
+    wait_total  REAL NOT NULL DEFAULT 0,
+    wait_max    REAL NOT NULL DEFAULT 0,
+    round_total REAL NOT NULL DEFAULT 0,
+    round_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS streams_line ON streams (line, started);
+
+CREATE TABLE IF NOT EXISTS events (
+    id       INTEGER PRIMARY KEY,
+    stream   INTEGER,
+    line     INTEGER NOT NULL,
+    ts       REAL NOT NULL,
+    op       TEXT NOT NULL,
+    platform TEXT,
+    uid      TEXT,
+    waited   REAL
+);
+CREATE INDEX IF NOT EXISTS events_stream ON events (stream, ts);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+
+CREATE TABLE IF NOT EXISTS rounds (
+    id       INTEGER PRIMARY KEY,
+    stream   INTEGER,
+    line     INTEGER NOT NULL,
+    ts       REAL NOT NULL,
+    duration REAL,
+    players  INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rounds_line ON rounds (line, ts);
+
+CREATE TABLE IF NOT EXISTS hourly (
+    line       INTEGER NOT NULL,
+    hour       INTEGER NOT NULL,
+    joins      INTEGER NOT NULL DEFAULT 0,
+    leaves     INTEGER NOT NULL DEFAULT 0,
+    rounds     INTEGER NOT NULL DEFAULT 0,
+    players    INTEGER NOT NULL DEFAULT 0,
+    wait_total REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (line, hour)
+);
+"""
+
+# 彙總表中由事件累加的欄位
+STREAM_COLUMNS = ("joins", "leaves", "rounds", "players", "wait_total", "round_total", "round_count")
+HOURLY_COLUMNS = ("joins", "leaves", "rounds", "players", "wait_total")
+
+_UPDATE_STREAM = "UPDATE streams SET {}, wait_max = MAX(wait_max, ?) WHERE id = ?".format(
+    ", ".join(f"{c} = {c} + ?" for c in STREAM_COLUMNS))
+_UPSERT_HOURLY = "INSERT INTO hourly (line, hour, {}) VALUES (?, ?, {}) ON CONFLICT (line, hour) DO UPDATE SET {}".format(
+    ", ".join(HOURLY_COLUMNS), ", ".join("?" * len(HOURLY_COLUMNS)),
+    ", ".join(f"{c} = {c} + excluded.{c}" for c in HOURLY_COLUMNS))
+
+
+class QueueHistory:
+    """排隊歷史資料庫（所有頻道共用一個檔案）"""
+
+    def __init__(self, path, window=20, max_round=3600, retention_days=90, flush_interval=1.0):
+        self.path = Path(path)
+        self.window = window                  # 推算每輪時間用的最近輪數
+        self.max_round = max_round            # 超過這個秒數的換人間隔（中場休息等）不算進每輪時間
+        self.retention_days = retention_days  # 事件紀錄保留天數（彙總表不刪除），0 表示不刪除
+
+        self.enabled = True  # 資料庫無法開啟時停止記錄，不影響排隊功能
+        self._db = None
+        self._db_lock = threading.Lock()  # 寫入與查詢在不同的執行緒中進行
+        self._flush_lock = None           # 讓批次依序寫入（在 flush() 中建立）
+        self._writer = FlushLoop(self.flush, flush_interval)
+        self._buffer = []
+
+        self._next_stream = 1
+        self._streams = {}        # 頻道 ID -> 進行中的直播 ID
+        self._last_rotation = {}  # 頻道 ID -> (直播 ID, 上次換人的時間)
+        self._rounds = {}         # 頻道 ID -> 最近幾輪的秒數
+
+        # 統計數據
+        self.rows_written = 0  # 寫入的事件數
+
+    @property
+    def pending(self):
+        return len(self._buffer)
+
+    # ---------- 讀取 ----------
+    def load(self):
+        """開啟資料庫，讀取進行中的直播與最近幾輪的時間（會阻塞，請在執行緒池中呼叫）"""
+        started = time.perf_counter()
+        try:
+            self._open()
+        except (OSError, sqlite3.Error) as e:
+            self.enabled = False
+            self._buffer = []
+            log.error("無法開啟排隊歷史 %s，停止記錄：%s", self.path, e)
+            return
+        log.info("排隊歷史已開啟：%d 場直播進行中（耗時 %.1f ms）",
+                 len(self._streams), (time.perf_counter() - started) * 1000)
+
+    def _open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        db.executescript(SCHEMA)
+
+        if self.retention_days:
+            with db:
+                db.execute("DELETE FROM events WHERE ts < ?", (time.time() - self.retention_days * 86400,))
+
+        self._next_stream = (db.execute("SELECT MAX(id) FROM streams").fetchone()[0] or 0) + 1
+        # 重新啟動前沒有停止上車的直播繼續記錄
+        for row in db.execute("SELECT id, line FROM streams WHERE ended IS NULL"):
+            self._streams[row["line"]] = row["id"]
+        for (line_id,) in db.execute("SELECT DISTINCT line FROM streams").fetchall():
+            rows = db.execute(
+                "SELECT stream, ts, duration FROM rounds WHERE line = ? ORDER BY ts DESC LIMIT ?",
+                (line_id, self.window),
+            ).fetchall()
+            if rows and rows[0]["stream"] == self._streams.get(line_id):
+                self._last_rotation[line_id] = (rows[0]["stream"], rows[0]["ts"])
+            self._rounds[line_id] = deque(
+                (row["duration"] for row in reversed(rows) if row["duration"] is not None), maxlen=self.window)
+
+        self._db = db
+
+    # ---------- 記錄 ----------
+    def open_stream(self, line_id, now=None):
+        """開始上車：開始一場新的直播（已經有進行中的直播時沿用，例如重新啟動後）"""
+        if line_id in self._streams:
+            return
+        stream_id = self._next_stream
+        self._next_stream += 1
+        self._streams[line_id] = stream_id
+        self._push(("open", stream_id, line_id, time.time() if now is None else now))
+
+    def close_stream(self, line_id, now=None):
+        """停止上車：結束這場直播"""
+        stream_id = self._streams.pop(line_id, None)
+        self._last_rotation.pop(line_id, None)
+        if stream_id is not None:
+            self._push(("close", stream_id, line_id, time.time() if now is None else now))
+
+    def record(self, line_id, op, entries, now=None):
+        """排隊名單的變動（RideQueue 的 listener，entries 為 [(key, QueueEntry), ...]）"""
+        now = time.time() if now is None else now
+        stream_id = self._streams.get(line_id)
+        if op == "join":
+            for _, entry in entries:
+                self._push(("event", stream_id, line_id, now, op, entry.platform, str(entry.uid), None))
+        elif op in ("leave", "rotate"):
+            # 跳車時記錄等了多久才放棄，換人時記錄等了多久才上場
+            for _, entry in entries:
+                self._push(("event", stream_id, line_id, now, op, entry.platform, str(entry.uid),
+                            now - entry.joined_at))
+        if op == "rotate":
+            self._push(("round", stream_id, line_id, now, self._note_round(line_id, stream_id, now), len(entries)))
+        elif op == "clear":
+            self._push(("event", stream_id, line_id, now, op, None, None, None))
+        # "merge"（綁定帳號後合併重複的位置）不是上車也不是跳車，不記錄
+
+    def _note_round(self, line_id, stream_id, now):
+        """記錄換人時間，回傳與上次換人的間隔（不算進每輪時間時回傳 None）"""
+        if stream_id is None:
+            return None
+        last = self._last_rotation.get(line_id)
+        self._last_rotation[line_id] = (stream_id, now)
+        if last is None or last[0] != stream_id:
+            return None  # 這場直播的第一次換人
+        duration = now - last[1]
+        if not 0 < duration <= self.max_round:
+            return None
+        rounds = self._rounds.get(line_id)
+        if rounds is None:
+            rounds = self._rounds[line_id] = deque(maxlen=self.window)
+        rounds.append(duration)
+        return duration
+
+    def _push(self, record):
+        if not self.enabled:
+            return
+        self._buffer.append(record)
+        self._writer.wake()
+
+    # ---------- 寫入 ----------
+    async def run(self):
+        """背景寫入工作"""
+        await self._writer.run()
+
+    async def flush(self):
+        """將緩衝區寫入資料庫（資料庫還沒開啟時保留在緩衝區）"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._buffer or self._db is None:
+                return
+            batch, self._buffer = self._buffer, []
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self._write, batch)
+            except sqlite3.Error as e:
+                log.error("寫入排隊歷史失敗（%d 筆）：%s", len(batch), e)
+
+    def _write(self, batch):
+        opened, closed, events, rounds = [], [], [], []
+        streams = {}  # 直播 ID -> STREAM_COLUMNS 的增量 + [最長等待]
+        hours = {}    # (頻道 ID, 小時) -> HOURLY_COLUMNS 的增量
+
+        def add(stream_id, line_id, ts, joins=0, leaves=0, played=0, waited=0.0, round_=0, duration=None):
+            if stream_id is not None:
+                row = streams.get(stream_id)
+                if row is None:
+                    row = streams[stream_id] = [0, 0, 0, 0, 0.0, 0.0, 0, 0.0]
+                row[0] += joins
+                row[1] += leaves
+                row[2] += round_
+                row[3] += played
+                row[4] += waited
+                if duration is not None:
+                    row[5] += duration
+                    row[6] += 1
+                if played:
+                    row[7] = max(row[7], waited)
+            hour = hours.get((line_id, int(ts // 3600)))
+            if hour is None:
+                hour = hours[(line_id, int(ts // 3600))] = [0, 0, 0, 0, 0.0]
+            hour[0] += joins
+            hour[1] += leaves
+            hour[2] += round_
+            hour[3] += played
+            hour[4] += waited
+
+        for record in batch:
+            kind, stream_id, line_id, ts = record[:4]
+            if kind == "open":
+                opened.append((stream_id, line_id, ts))
+            elif kind == "close":
+                closed.append((ts, stream_id))
+            elif kind == "round":
+                duration, players = record[4:]
+                rounds.append((stream_id, line_id, ts, duration, players))
+                add(stream_id, line_id, ts, round_=1, duration=duration)
+            else:
+                op, platform, uid, waited = record[4:]
+                events.append((stream_id, line_id, ts, op, platform, uid, waited))
+                if op == "join":
+                    add(stream_id, line_id, ts, joins=1)
+                elif op == "leave":
+                    add(stream_id, line_id, ts, leaves=1)
+                elif op == "rotate":
+                    add(stream_id, line_id, ts, played=1, waited=waited)
+
+        with self._db_lock, self._db:
+            db = self._db
+            db.executemany("INSERT INTO streams (id, line, started) VALUES (?, ?, ?)", opened)
+            db.executemany("INSERT INTO events (stream, line, ts, op, platform, uid, waited) "
+                           "VALUES (?, ?, ?, ?, ?, ?, ?)", events)
+            db.executemany("INSERT INTO rounds (stream, line, ts, duration, players) VALUES (?, ?, ?, ?, ?)", rounds)
+            db.executemany(_UPDATE_STREAM, [(*row[:7], row[7], stream_id) for stream_id, row in streams.items()])
+            db.executemany(_UPSERT_HOURLY, [(*key, *row) for key, row in hours.items()])
+            db.executemany("UPDATE streams SET ended = ? WHERE id = ?", closed)
+        self.rows_written += len(events)
+
+    # ---------- 查詢 ----------
+    def round_estimate(self, line_id):
+        """每輪時間的估計（最近幾輪的中位數，還沒有資料時回傳 None）"""
+        rounds = self._rounds.get(line_id)
+        return statistics.median(rounds) if rounds else None
+
+    def eta(self, line_id, position, max_players, now=None):
+        """排隊第 position 位大約幾秒後上場（還沒有每輪時間的資料時回傳 None）
+
+        每次換人上場 max_players 人，第 1 ~ max_players 位在下一次換人時上場；
+        訂閱者優先等換人規則會讓實際順序有些不同，只是估計值。
+        """
+        estimate = self.round_estimate(line_id)
+        if estimate is None or position < 1:
+            return None
+        until_next = estimate
+        last = self._last_rotation.get(line_id)
+        if last is not None and last[0] == self._streams.get(line_id):
+            now = time.time() if now is None else now
+            until_next = max(0.0, estimate - (now - last[1]))
+        return until_next + (position - 1) // max_players * estimate
+
+    def stream_stats(self, line_id, limit=1):
+        """頻道最近幾場直播的統計（新的在前；會阻塞，請在執行緒池中呼叫）"""
+        if self._db is None:
+            return []
+        now = time.time()
+        with self._db_lock:
+            rows = self._db.execute(
+                "SELECT * FROM streams WHERE line = ? ORDER BY started DESC LIMIT ?", (line_id, limit)).fetchall()
+        stats = []
+        for row in rows:
+            stat = dict(row)
+            stat["duration"] = (row["ended"] or now) - row["started"]
+            # 剛開始的直播換算成每小時的次數沒有意義
+            stat["rounds_per_hour"] = row["rounds"] / (stat["duration"] / 3600) if stat["duration"] >= 600 else None
+            stat["avg_wait"] = row["wait_total"] / row["players"] if row["players"] else None
+            stat["avg_round"] = row["round_total"] / row["round_count"] if row["round_count"] else None
+            stats.append(stat)
+        return stats
+
+    def hourly(self, line_id, since):
+        """頻道從 since（Unix 時間）起每小時的統計，依時間排序（會阻塞，請在執行緒池中呼叫）"""
+        if self._db is None:
+            return []
+        with self._db_lock:
+            rows = self._db.execute(
+                "SELECT * FROM hourly WHERE line = ? AND hour >= ? ORDER BY hour", (line_id, int(since // 3600)),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        """關閉資料庫（程式結束時，在 flush() 之後呼叫）"""
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
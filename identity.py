@@ -0,0 +1,98 @@
+"""Twitch 帳號與 Discord 成員的綁定
+
+同一位觀眾可能從 Discord（!上車）和 Twitch 聊天各排一次隊。綁定後：
+- 以雙向 dict 做 O(1) 查詢：Twitch 帳號 -> Discord 成員 ID、Discord 成員 ID -> Twitch 帳號
+- 上車時同時檢查另一個平台的帳號是否已在排隊，一個人只佔一個位置
+- 換人的優先層級取兩個平台中較高的一個
+
+綁定流程：在 Discord 輸入 !綁定 <Twitch 帳號> 後，需要在 ttl 秒內由該 Twitch
+帳號在聊天室輸入 !綁定 確認，避免冒用別人的帳號。綁定存成一個 JSON 檔
+（Twitch 端的身份層級只存在記憶體中，見 _twitch_tiers）。
+"""
+import json
+import time
+from pathlib import Path
+
+from storage import write_json
+
+
+class IdentityIndex:
+    """Twitch 帳號 <-> Discord 成員 ID 的雙向對照表"""
+
+    def __init__(self, path, ttl=600):
+        self.path = Path(path)
+        self.ttl = ttl                 # 綁定請求等待 Twitch 端確認的秒數
+        self._discord_by_twitch = {}   # Twitch 帳號 -> Discord 成員 ID
+        self._twitch_by_discord = {}   # Discord 成員 ID -> Twitch 帳號
+        self._pending = {}             # Twitch 帳號 -> (Discord 成員 ID, 過期時間)
+        # 已綁定的 Twitch 帳號最近一次的身份層級。不寫入檔案：層級只在 Twitch 端上車或查到
+        # 觀眾狀態時更新，重新啟動後到該帳號再次出現前，從 Discord 上車只會用 Discord 的層級
+        self._twitch_tiers = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                for login, discord_id in json.load(f).items():
+                    self._set(login, int(discord_id))
+
+    def __len__(self):
+        return len(self._discord_by_twitch)
+
+    def discord_for(self, login):
+        return self._discord_by_twitch.get(login)
+
+    def twitch_for(self, discord_id):
+        return self._twitch_by_discord.get(discord_id)
+
+    def alias(self, key):
+        """排隊名單 key 在另一個平台的 key（沒有綁定時回傳 None）"""
+        platform, uid = key
+        if platform == "twitch":
+            discord_id = self._discord_by_twitch.get(uid)
+            return ("discord", discord_id) if discord_id is not None else None
+        login = self._twitch_by_discord.get(uid)
+        return ("twitch", login) if login is not None else None
+
+    # ---------- 綁定 ----------
+    def request(self, discord_id, login):
+        """Discord 端提出綁定請求，等待該 Twitch 帳號確認"""
+        now = time.monotonic()
+        for pending_login in [k for k, (_, expires) in self._pending.items() if expires <= now]:
+            del self._pending[pending_login]
+        self._pending[login] = (discord_id, now + self.ttl)
+
+    def confirm(self, login):
+        """Twitch 端確認綁定，成功時回傳 Discord 成員 ID（沒有請求或已過期時回傳 None）"""
+        pending = self._pending.pop(login, None)
+        if pending is None or pending[1] <= time.monotonic():
+            return None
+        discord_id = pending[0]
+        self.unlink(discord_id)
+        old_discord_id = self._discord_by_twitch.get(login)
+        if old_discord_id is not None:
+            self.unlink(old_discord_id)
+        self._set(login, discord_id)
+        return discord_id
+
+    def unlink(self, discord_id):
+        """解除綁定，回傳原本綁定的 Twitch 帳號"""
+        login = self._twitch_by_discord.pop(discord_id, None)
+        if login is not None:
+            self._discord_by_twitch.pop(login, None)
+            self._twitch_tiers.pop(login, None)
+        return login
+
+    def _set(self, login, discord_id):
+        self._discord_by_twitch[login] = discord_id
+        self._twitch_by_discord[discord_id] = login
+
+    # ---------- 身份層級 ----------
+    def note_twitch_tier(self, login, tier):
+        """記住已綁定的 Twitch 帳號的身份層級（從 Discord 上車時用來合併優先順序）"""
+        if login in self._discord_by_twitch:
+            self._twitch_tiers[login] = tier
+
+    def twitch_tier(self, login):
+        return self._twitch_tiers.get(login)
+
+    def save(self):
+        """寫入磁碟（會阻塞，請在執行緒池中呼叫）"""
+        write_json(self.path, self._discord_by_twitch)
@@ -0,0 +1,101 @@
+"""Twitch 聊天指令的緩衝與批次處理
+
+聊天訊息不在 event_message 中逐則處理，而是：
+- 先以指令分派表（dispatch.py）快速分類，不是指令的聊天直接丟棄
+- 指令放進有上限的緩衝區，由背景工作每隔一小段時間取出一批，
+  一次套用到排隊名單
+- 緩衝區滿時依 overflow 策略丟棄最新（drop_newest）或最舊（drop_oldest）
+  的請求，並記錄數量，聊天洗版時不會拖慢 Discord 端
+"""
+import asyncio
+from collections import deque
+
+from botlog import get_logger
+
+log = get_logger("twitch.ingest")
+
+OP_JOIN = "join"
+OP_LEAVE = "leave"
+OP_LINK = "link"    # 確認 Discord 帳號綁定（identity.py）
+
+OVERFLOW_POLICIES = ("drop_newest", "drop_oldest")
+
+
+class ChatRequest:
+    """一筆待處理的聊天指令"""
+
+    __slots__ = ("line", "op", "user_name", "author")
+
+    def __init__(self, line, op, user_name, author):
+        self.line = line
+        self.op = op
+        self.user_name = user_name
+        self.author = author
+
+
+class ChatIngest:
+    """有上限的聊天指令緩衝區，批次交給 handler 處理"""
+
+    def __init__(self, handler, maxsize=1000, batch_size=50, window=0.05, overflow="drop_newest", on_drop=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"未知的 overflow 策略：{overflow}")
+        self.handler = handler      # await handler(list[ChatRequest])
+        self.on_drop = on_drop      # on_drop(ChatRequest)：drop_oldest 擠掉已接受的請求時呼叫
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.window = window        # 收集一批請求的等待時間（秒）
+        self.overflow = overflow
+        self._pending = deque()
+        self._wakeup = None
+
+        # 統計數據
+        self.accepted = 0   # 放進緩衝區的請求數
+        self.dropped = 0    # 緩衝區滿而丟棄的請求數
+        self.batches = 0    # 處理的批次數
+        self.processed = 0  # 處理完成的請求數
+        self.max_batch = 0
+
+    @property
+    def backlog(self):
+        return len(self._pending)
+
+    def offer(self, request):
+        """放進緩衝區，回傳請求是否被接受（drop_oldest 時新請求一定會被接受）"""
+        if len(self._pending) >= self.maxsize:
+            self.dropped += 1
+            if self.overflow == "drop_newest":
+                return False
+            evicted = self._pending.popleft()
+            if self.on_drop is not None:
+                self.on_drop(evicted)
+        self._pending.append(request)
+        self.accepted += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    def _take(self):
+        count = min(self.batch_size, len(self._pending))
+        return [self._pending.popleft() for _ in range(count)]
+
+    async def run(self):
+        """背景處理工作"""
+        self._wakeup = asyncio.Event()
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                # 等待一小段時間，讓同時間的指令合併成一批
+                if self.window > 0:
+                    await asyncio.sleep(self.window)
+
+            batch = self._take()
+            self.batches += 1
+            self.max_batch = max(self.max_batch, len(batch))
+            try:
+                await self.handler(batch)
+            except Exception:
+                log.exception("批次處理聊天指令失敗")
+            self.processed += len(batch)
+            # 批次之間讓出事件循環，讓 Discord 端的工作可以執行
+            await asyncio.sleep(0)
@@ -0,0 +1,155 @@
+"""排隊狀態的持久化：append-only 操作日誌 + 定期快照
+
+- 每個操作（上車、跳車、換人、合併綁定帳號、清除、開啟/關閉）都帶有遞增序號，先放進
+  記憶體緩衝區，再由背景工作批次寫入日誌並 fsync（在執行緒池中進行，
+  不阻塞事件循環）
+- 每累積 snapshot_every 筆操作就寫一份壓縮後的快照並清空日誌
+- 啟動時讀取快照，再重播序號大於快照的日誌尾端即可還原
+"""
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+
+from botlog import get_logger
+from storage import FlushLoop, write_json
+
+log = get_logger("queue.journal")
+
+
+async def _in_thread(fn, *args):
+    """在執行緒池中執行；被取消時仍等執行緒寫完才結束（執行緒中的寫入無法中斷）"""
+    future = asyncio.get_running_loop().run_in_executor(None, fn, *args)
+    try:
+        await asyncio.shield(future)
+    except asyncio.CancelledError:
+        await future
+        raise
+
+
+class QueueJournal:
+    """排隊狀態日誌"""
+
+    SNAPSHOT_FILE = "snapshot.json"
+    JOURNAL_FILE = "journal.log"
+
+    def __init__(self, directory, snapshot_every=500, flush_interval=0.2):
+        self.directory = Path(directory)
+        self.snapshot_every = snapshot_every
+        self.state_fn = None  # 回傳目前狀態（可序列化的 dict）的函數，用於寫快照
+
+        self._seq = 0
+        self._buffer = []
+        self._since_snapshot = 0
+        self._snapshot_requested = False
+        self._writer = FlushLoop(self.flush, flush_interval)
+        self._flush_lock = None  # 讓寫入依序進行（在 flush() 中建立）
+
+    @property
+    def snapshot_path(self):
+        return self.directory / self.SNAPSHOT_FILE
+
+    @property
+    def journal_path(self):
+        return self.directory / self.JOURNAL_FILE
+
+    # ---------- 還原 ----------
+    def load(self):
+        """讀取快照與日誌，回傳還原後的狀態 {"enabled": bool, "entries": [...]}"""
+        started = time.perf_counter()
+        state = {"seq": 0, "enabled": False, "entries": []}
+        if self.snapshot_path.exists():
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                state.update(json.load(f))
+
+        entries = {tuple(e["key"]): e for e in state["entries"]}  # dict 保持插入順序
+        enabled = state["enabled"]
+        seq = state["seq"]
+        replayed = 0
+
+        if self.journal_path.exists():
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # 當機時寫到一半的最後一行
+                    if record["seq"] <= seq:
+                        continue
+                    seq = record["seq"]
+                    replayed += 1
+                    op = record["op"]
+                    if op == "join":
+                        entries.setdefault(tuple(record["key"]), record["entry"])
+                    elif op == "leave":
+                        entries.pop(tuple(record["key"]), None)
+                    elif op in ("rotate", "merge"):
+                        for key in record["keys"]:
+                            entries.pop(tuple(key), None)
+                    elif op == "clear":
+                        entries.clear()
+                    elif op == "open":
+                        enabled = True
+                    elif op == "close":
+                        enabled = False
+
+        self._seq = seq
+        elapsed = (time.perf_counter() - started) * 1000
+        log.info("%s 已還原 %d 人（重播 %d 筆操作，耗時 %.1f ms）", self.directory, len(entries), replayed, elapsed)
+        return {"enabled": enabled, "entries": list(entries.values())}
+
+    # ---------- 寫入 ----------
+    def record(self, op, **data):
+        """記錄一筆操作（只放進緩衝區，不阻塞）"""
+        self._seq += 1
+        data["seq"] = self._seq
+        data["op"] = op
+        self._buffer.append(json.dumps(data, ensure_ascii=False))
+        self._since_snapshot += 1
+        if self._since_snapshot >= self.snapshot_every:
+            self._snapshot_requested = True
+        self._writer.wake()
+
+    def request_snapshot(self):
+        """要求在下一次寫入時順便寫一份快照"""
+        self._snapshot_requested = True
+        self._writer.wake()
+
+    async def run(self):
+        """背景寫入工作"""
+        await self._writer.run()
+
+    async def flush(self):
+        """將緩衝區寫入磁碟，必要時寫快照
+
+        寫入依序進行：同時呼叫時（例如關閉時背景工作還在寫），後面的會等前面的寫完，
+        否則日誌可能不依序號排列（重播時會略過），或快照清空剛寫入的日誌。
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if self._buffer:
+                batch, self._buffer = self._buffer, []
+                await _in_thread(self._append, batch)
+
+            if self._snapshot_requested and self.state_fn is not None:
+                self._snapshot_requested = False
+                self._since_snapshot = 0
+                state = self.state_fn()
+                state["seq"] = self._seq
+                await _in_thread(self._write_snapshot, state)
+
+    def _append(self, lines):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write_snapshot(self, state):
+        write_json(self.snapshot_path, state)
+        # 快照已包含日誌中的所有操作，可以清空日誌
+        with open(self.journal_path, "w", encoding="utf-8") as f:
+            f.flush()
+            os.fsync(f.fileno())
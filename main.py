@@ -1,15 +1,35 @@
+import time
+from boot import BootTimer
+
+boot = BootTimer()  # 啟動時間紀錄（從這裡開始計時，包含載入套件的時間）
+
+import logging
 import random
 import discord
 from discord.ext import commands
 from datetime import datetime
 import os
-from threading import Thread
-from flask import Flask
-import logging
+from aiohttp import web
 from pathlib import Path
+from typing import Optional
 import asyncio
-import twitchio
-from twitchio.ext import commands as twitch_commands
+
+from botlog import get_logger, setup_logging
+from expiring import ExpiringSet, Sweeper
+from diagnostics import MemoryTracer, SlowCallbackMonitor, task_summary
+from dispatch import DISCORD, TWITCH, CommandTable
+from history import QueueHistory
+from identity import IdentityIndex
+from ingest import OP_JOIN, OP_LEAVE, OP_LINK, ChatIngest, ChatRequest
+from members import MemberLRU
+from metrics import METRICS_CONTENT_TYPE, LoopLagMonitor, Registry
+from outbox import Outbox
+from queue_entry import QueueEntry, twitch_tier
+from supervisor import Supervisor, session_start_delay
+from registry import LineRegistry, QueueLine, load_line_settings, migrate_legacy_journal
+from viewer_status import HELIX_URL, HelixClient, StatusResolver
+from teams import PairHistory, RatingStore, balance
+from rotation import TIER_DISCORD_SUB, TIER_TWITCH_SUB, TIER_FOLLOWER, TIER_VIEWER, TIERS, higher_tier
 
 # 載入 .env 文件（如果存在）
 env_file = Path(__file__).parent / '.env'
@@ -21,9 +41,13 @@ if env_file.exists():
                 key, value = line.split('=', 1)
                 os.environ[key.strip()] = value.strip()
 
-# 關閉 Flask 的日誌輸出
-log = logging.getLogger('werkzeug')
-log.setLevel(logging.ERROR)
+# 各子系統的日誌（等級可用 LOG_LEVEL / LOG_LEVELS 調整，見 botlog.py）
+log = get_logger("system")
+discord_log = get_logger("discord")
+twitch_log = get_logger("twitch")
+chat_log = get_logger("twitch.chat")  # 每則聊天指令一筆，量大時可用 LOG_SAMPLE 取樣
+queue_log = get_logger("queue")
+web_log = get_logger("web")
 
 # Discord Bot 設定
 intents = discord.Intents.default()
@@ -31,378 +55,890 @@ intents.voice_states = True
 intents.members = True
 intents.message_content = True
 
-bot = commands.Bot(command_prefix="!", intents=intents)
-
-# Flask 網頁伺服器（用於 Render 端口檢測）
-app = Flask(__name__)
+# 低記憶體模式（LOW_MEMORY=1）：只快取語音頻道中的成員、啟動時不載入所有成員，
+# 其他成員在需要時才查詢（見 members.py），身分組分類快取改為有上限的 LRU
+LOW_MEMORY = os.getenv("LOW_MEMORY", "0") == "1"
+if LOW_MEMORY:
+    member_cache_flags = discord.MemberCacheFlags.none()
+    member_cache_flags.voice = True  # !抽 需要語音頻道中的成員
+else:
+    member_cache_flags = discord.MemberCacheFlags.from_intents(intents)
+bot_options = dict(command_prefix="!", intents=intents, member_cache_flags=member_cache_flags,
+                   chunk_guilds_at_startup=not LOW_MEMORY)
+
+# 同時服務多個社群時可開啟自動分片（DISCORD_SHARDED=1），各分片各自維持 Gateway 連線
+if os.getenv("DISCORD_SHARDED", "0") == "1":
+    shard_count = os.getenv("DISCORD_SHARD_COUNT")
+    bot = commands.AutoShardedBot(**bot_options, shard_count=int(shard_count) if shard_count else None)
+else:
+    bot = commands.Bot(**bot_options)
+
+# 網頁伺服器（用於 Render / Heroku 端口檢測），與 Bot 共用事件循環
+app = web.Application()
 
 # ======================
 #  全域變數
 # ======================
-queue = []  # 排隊名單
+# 以下為預設上車頻道的設定（未設定 QUEUE_LINES 時使用，也是各頻道設定的預設值）
 AUTHORIZED_ROLES = ["慕笙寶寶", "💟保姆", "保姆"]
+AUTHORITY_KEYWORDS = ["管理", "保姆", "慕笙"]  # 身分組名稱包含這些字也視為授權身分
 MAX_PLAYERS = 4
-processed_messages = set()  # 防止重複處理
-queue_enabled = False  # 上車系統開關（預設關閉）
 ALLOWED_CHANNEL_ID = 1435699524084699247  # 指定頻道ID
-twitch_processed_users = set()  # 防止 Twitch 重複處理
 twitch_bot = None  # Twitch Bot 全域變數
+twitch_status = "disabled"  # Twitch 連線狀態：disabled / connecting / connected / disconnected / error
+viewer_status = None  # Twitch 觀眾訂閱 / 追隨狀態查詢（Twitch 啟用後建立）
+
+# Discord 與 Twitch 連線的監督（失敗時以帶抖動的指數退避重新連線）
+supervisor = Supervisor(
+    base=float(os.getenv("RECONNECT_BASE", "1")),           # 第一次重試前等待的秒數
+    cap=float(os.getenv("RECONNECT_MAX", "300")),           # 最長等待秒數
+    stable_after=float(os.getenv("RECONNECT_STABLE", "60")),  # 連線超過此秒數後退避重新計算
+)
+
+# 啟動流程中各元件的就緒事件（取代固定秒數的等待）
+journals_loaded = asyncio.Event()  # 各頻道的排隊日誌已讀取
+queues_ready = asyncio.Event()     # Discord 已連線且排隊名單已還原，可以開始處理指令
+
+# 換人規則：各身份層級的優先配額、連續上場上限、上場後冷卻輪數
+LINE_DEFAULTS = {
+    "channel_id": ALLOWED_CHANNEL_ID,
+    "twitch_channel": os.getenv("TWITCH_CHANNEL", "m0623lalala"),
+    "max_players": MAX_PLAYERS,
+    "authorized_roles": AUTHORIZED_ROLES,
+    "authority_keywords": AUTHORITY_KEYWORDS,
+    "rotation_quotas": os.getenv("ROTATION_QUOTAS", "discord_sub:2"),
+    "rotation_max_consecutive": int(os.getenv("ROTATION_MAX_CONSECUTIVE", "0")),
+    "rotation_cooldown": int(os.getenv("ROTATION_COOLDOWN", "0")),
+}
+
+# 對外訊息佇列：合併同頻道短時間內的公告，並依頻道速率限制發送
+outbox = Outbox(
+    window=float(os.getenv("OUTBOX_WINDOW", "1.5")),  # 公告合併等待秒數
+    rate=int(os.getenv("OUTBOX_RATE", "5")),          # 每個頻道每 OUTBOX_PER 秒最多幾則
+    per=float(os.getenv("OUTBOX_PER", "5")),
+)
+
+# 會自動過期的去重集合（固定容量，由同一個背景工作清理）
+sweeper = Sweeper()
+processed_messages = sweeper.register(ExpiringSet(  # 防止重複處理同一則 Discord 訊息
+    ttl=float(os.getenv("DEDUP_TTL", "600")),
+    maxsize=int(os.getenv("DEDUP_MAX", "10000")),
+))
+twitch_processed_users = sweeper.register(ExpiringSet(  # Twitch 使用者指令冷卻
+    ttl=float(os.getenv("TWITCH_COOLDOWN", "30")),
+    maxsize=int(os.getenv("TWITCH_COOLDOWN_MAX", "50000")),
+))
+
+# 各頻道的上車系統（排隊名單、開關、看板、換人規則、日誌），在輔助函數之後建立
+registry = LineRegistry()
+STATE_DIR = os.getenv("QUEUE_STATE_DIR", str(Path(__file__).parent / "data"))  # 持久化資料的目錄
+
+# 低記憶體模式下最近用到的成員（一般模式所有成員都在 discord.py 的快取中，不需要）
+members = MemberLRU(
+    maxsize=int(os.getenv("LOW_MEMORY_MEMBERS", "256")) if LOW_MEMORY else 0,
+    # 與身分組分類快取同時過期，過期後重新查詢成員，不會一直用舊的身分組判斷
+    ttl=float(os.getenv("LOW_MEMORY_ROLE_TTL", "300")) if LOW_MEMORY else None,
+    on_refresh=lambda member: refresh_member(member),
+)
+
+# Twitch 帳號與 Discord 成員的綁定（跨平台排隊去重、合併優先層級）
+identity = IdentityIndex(
+    os.getenv("IDENTITY_FILE", str(Path(STATE_DIR) / "identities.json")),
+    ttl=float(os.getenv("LINK_TTL", "600")),  # Discord 提出綁定後，等待 Twitch 確認的秒數
+)
+
+# !抽 平衡 用的玩家評分，以及最近幾次分組中誰和誰同隊
+ratings = RatingStore(os.getenv("RATINGS_FILE", str(Path(STATE_DIR) / "ratings.json")))
+pair_history = PairHistory(
+    window=int(os.getenv("TEAM_PAIR_WINDOW", "5")),  # 記錄最近幾次分組
+    limit=int(os.getenv("TEAM_PAIR_LIMIT", "2")),    # 同隊幾次後盡量拆開，0 表示不限制
+)
+
+# 排隊歷史（上車、跳車、換人的紀錄與每場直播的統計，用來推算還要等多久）
+history = QueueHistory(
+    os.getenv("HISTORY_DB", str(Path(STATE_DIR) / "history.db")),
+    window=int(os.getenv("HISTORY_WINDOW", "20")),                   # 以最近幾輪推算每輪時間
+    max_round=float(os.getenv("HISTORY_MAX_ROUND", "3600")),         # 間隔更久的換人不算一輪（中場休息等）
+    retention_days=int(os.getenv("HISTORY_RETENTION_DAYS", "90")),  # 事件紀錄保留天數，0 表示不刪除
+)
 
 # ======================
-#  輔助函數
+#  效能指標（/metrics）
 # ======================
-def has_authority(member):
-    """檢查是否為授權身分（支援模糊匹配）"""
-    for role in member.roles:
-        # 完全匹配
-        if role.name in AUTHORIZED_ROLES:
-            return True
-        # 模糊匹配：檢查是否包含關鍵字
-        if any(keyword in role.name for keyword in ["管理", "保姆", "慕笙"]):
-            return True
-    return False
-
-def get_role_type(member):
-    """判斷身份組（訂閱 or 觀眾）"""
-    # 檢查是否為 Twitch 使用者
-    if isinstance(member, TwitchBot.TwitchUser):
-        if member.is_subscriber:
-            return "Twitch 訂閱者"
-        elif member.is_follower:
-            return "Twitch 追隨者"
-        else:
-            return "Twitch 觀眾"
-
-    # 檢查 Discord 身分組
-    for role in member.roles:
-        # 檢查身分組名稱是否包含「訂閱」關鍵字
-        if "訂閱" in role.name:
-            return "訂閱"
-    return "觀眾"
-
-def is_allowed_channel(ctx):
-    """檢查是否在允許的頻道中"""
-    return ctx.channel.id == ALLOWED_CHANNEL_ID
+metrics = Registry()
+command_latency = metrics.histogram(
+    "bot_command_latency_seconds", "Discord 指令處理時間", label="command")
+twitch_messages = metrics.counter(
+    "bot_twitch_messages_total", "收到的 Twitch 聊天訊息數")
+twitch_command_counter = metrics.counter(
+    "bot_twitch_commands_total", "收到的 Twitch 指令數", label="command")
+metrics.callback(
+    "bot_dispatch_total", "經過指令分派表的訊息數（符合指令 / 略過）",
+    lambda: {"matched": command_table.matched, "ignored": command_table.ignored},
+    label="result", metric_type="counter")
+metrics.callback(
+    "bot_dedup_hits_total", "去重 / 冷卻集合擋下的重複請求數",
+    lambda: {"discord_message": processed_messages.hits, "twitch_cooldown": twitch_processed_users.hits},
+    label="set", metric_type="counter")
+metrics.callback(
+    "bot_twitch_ingest_total", "Twitch 指令緩衝區的請求數（依結果）",
+    lambda: {"accepted": twitch_ingest.accepted, "dropped": twitch_ingest.dropped,
+             "processed": twitch_ingest.processed},
+    label="result", metric_type="counter")
+metrics.callback(
+    "bot_twitch_ingest_backlog", "Twitch 指令緩衝區中等待處理的請求數", lambda: twitch_ingest.backlog)
+metrics.callback(
+    "bot_twitch_ingest_batches_total", "Twitch 指令的批次處理次數",
+    lambda: twitch_ingest.batches, metric_type="counter")
+metrics.callback(
+    "bot_twitch_status_lookups_total", "Twitch 觀眾狀態查詢（快取命中 / 排入查詢 / API 呼叫 / 錯誤）",
+    lambda: {"hit": viewer_status.hits, "miss": viewer_status.misses,
+             "api_call": viewer_status.api_calls, "error": viewer_status.errors} if viewer_status else {},
+    label="result", metric_type="counter")
+metrics.callback(
+    "bot_queue_length", "排隊人數（依上車頻道與身份層級）",
+    lambda: {(line.name, tier): line.queue.tier_count(tier) for line in registry for tier in TIERS},
+    label=("line", "tier"))
+metrics.callback(
+    "bot_member_lookups_total", "低記憶體模式下成員快取以外的查詢（LRU 命中 / 找不到 / query_members 查到 / 過期後重新查詢）",
+    lambda: {"hit": members.hits, "miss": members.misses, "queried": members.queried, "expired": members.expired},
+    label="result", metric_type="counter")
+metrics.callback(
+    "bot_role_cache_entries", "身分組分類快取中的成員數（依上車頻道）",
+    lambda: {line.name: len(line.classifier) for line in registry}, label="line")
+metrics.callback(
+    "bot_feed_clients", "連線中的疊加畫面客戶端數（依上車頻道）",
+    lambda: {line.name: line.feed.clients for line in registry}, label="line")
+metrics.callback(
+    "bot_feed_snapshot_builds_total", "實際序列化整份排隊名單的次數（依上車頻道）",
+    lambda: {line.name: line.feed.snapshot_builds for line in registry}, label="line", metric_type="counter")
+metrics.callback(
+    "bot_history_pending", "尚未寫入排隊歷史資料庫的紀錄數", lambda: history.pending)
+metrics.callback(
+    "bot_history_events_written_total", "寫入排隊歷史資料庫的事件數",
+    lambda: history.rows_written, metric_type="counter")
+metrics.callback(
+    "bot_board_edits_total", "排隊看板實際編輯的次數（依上車頻道）",
+    lambda: {line.name: line.board.edits for line in registry}, label="line", metric_type="counter")
+metrics.callback(
+    "bot_board_fragment_hits_total", "排隊看板重用快取顯示片段的次數（依上車頻道）",
+    lambda: {line.name: line.board.fragment_hits for line in registry}, label="line", metric_type="counter")
+metrics.callback(
+    "bot_outbox_backlog", "尚未送出的訊息數", lambda: outbox.backlog)
+metrics.callback(
+    "bot_outbox_sent_total", "實際送出的訊息數", lambda: outbox.sent, metric_type="counter")
+metrics.callback(
+    "bot_outbox_rate_limit_waits_total", "因頻道速率限制而等待的次數",
+    lambda: outbox.rate_limit_waits, metric_type="counter")
+metrics.callback(
+    "bot_outbox_rate_limit_wait_seconds_total", "因頻道速率限制而等待的總秒數",
+    lambda: outbox.rate_limit_wait_seconds, metric_type="counter")
+metrics.callback(
+    "bot_connection_up", "Discord / Twitch 是否已連線（1 = 已連線）",
+    lambda: {c.name: int(c.up) for c in supervisor}, label="client")
+metrics.callback(
+    "bot_reconnects_total", "斷線後重新連上的次數（包含恢復 session）",
+    lambda: {c.name: c.reconnects for c in supervisor}, label="client", metric_type="counter")
+metrics.callback(
+    "bot_connection_restarts_total", "連線失敗後重新啟動的次數",
+    lambda: {c.name: c.restarts for c in supervisor}, label="client", metric_type="counter")
+metrics.callback(
+    "bot_downtime_seconds_total", "累計斷線秒數",
+    lambda: {c.name: c.downtime for c in supervisor}, label="client", metric_type="counter")
+metrics.callback(
+    "bot_startup_seconds", "程式開始執行到各啟動階段完成的秒數",
+    lambda: dict(boot.marks), label="phase")
+loop_lag = metrics.histogram(
+    "bot_event_loop_lag_seconds", "事件循環延遲", label="loop")
+# Discord 與 Twitch 共用同一個事件循環（loop="main"）
+loop_lag_monitor = LoopLagMonitor(loop_lag, "main")
+metrics.callback(
+    "bot_event_loop_lag_max_seconds", "啟動以來最大的事件循環延遲",
+    lambda: {"main": loop_lag_monitor.max_lag}, label="loop")
+
+# 慢回呼偵測與記憶體追蹤（用 !診斷 開關，預設關閉，關閉時沒有任何成本）
+slow_callbacks = SlowCallbackMonitor(threshold=float(os.getenv("DIAG_SLOW_CALLBACK_MS", "100")) / 1000)
+memory_tracer = MemoryTracer()
+metrics.callback(
+    "bot_slow_callbacks_total", "執行超過門檻、阻塞事件循環的回呼數（慢回呼偵測開啟時）",
+    lambda: slow_callbacks.total, metric_type="counter")
 
 # ======================
-#  Twitch Bot 設定
+#  輔助函數
 # ======================
-class TwitchBot(twitch_commands.Bot):
-    """Twitch 聊天監聽 Bot"""
-
-    class TwitchUser:
-        """Twitch 觀眾虛擬使用者類別"""
-        def __init__(self, name, is_subscriber=False, is_follower=False):
-            self.display_name = f"[Twitch] {name}"
-            self.name = name
-            self.roles = []
-            self.is_subscriber = is_subscriber  # 是否為訂閱者
-            self.is_follower = is_follower      # 是否為追隨者
-
-        def __eq__(self, other):
-            if isinstance(other, TwitchBot.TwitchUser):
-                return self.name == other.name
-            return False
-
-        def __hash__(self):
-            return hash(f"twitch_{self.name}")
-
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.discord_bot = None  # 儲存 Discord Bot 的引用
-
-    async def event_ready(self):
-        """Twitch 連線成功"""
-        print(f"[Twitch] [OK] 已登入為 {self.nick}")
-        print(f"[Twitch] 已連線至頻道：{os.getenv('TWITCH_CHANNEL', 'm0623lalala')}")
-
-    async def event_message(self, message):
-        """監聽 Twitch 聊天訊息"""
-        # 忽略機器人本身的訊息
-        if message.echo:
-            return
-
-        command = message.content.strip()
-        user_name = message.author.name
-
-        # 處理 !上車 指令
-        if command == "!上車":
-            print(f"[Twitch] 收到來自 {user_name} 的 !上車 指令")
-
-            # 防止重複處理同一使用者
-            if user_name in twitch_processed_users:
-                print(f"[Twitch] 警告：{user_name} 已在處理中，忽略重複請求")
-                return
-
-            # 標記為已處理（30秒內不會再處理同一使用者）
-            twitch_processed_users.add(user_name)
-
-            # 延遲 30 秒移除使用者，允許下次請求
-            async def remove_after_delay():
-                await asyncio.sleep(30)
-                twitch_processed_users.discard(user_name)
-
-            asyncio.create_task(remove_after_delay())
-
-            # 觸發 Discord 相關邏輯
-            if self.discord_bot:
-                await self.handle_twitch_ride(user_name, message)
+def has_authority(member, line):
+    """檢查是否為該頻道的授權身分（完全匹配 authorized_roles 或包含 authority_keywords 中的關鍵字）"""
+    return line.has_authority(member)
+
+TWITCH_ROLE_TYPES = {TIER_TWITCH_SUB: "Twitch 訂閱者", TIER_FOLLOWER: "Twitch 追隨者", TIER_VIEWER: "Twitch 觀眾"}
+
+def resolve_member(line, member_id):
+    """從快取取得頻道所在伺服器的 Discord 成員（查不到時回傳 None）"""
+    guild = bot.get_guild(line.guild_id) if line.guild_id is not None else None
+    return members.get(guild, member_id) if guild is not None else None
+
+def get_role_type(member, line):
+    """判斷身份組（訂閱 or 觀眾）；排隊中的成員以快取中的最新身分組判斷"""
+    if isinstance(member, QueueEntry):
+        if member.is_twitch:
+            return TWITCH_ROLE_TYPES[member.tier]
+        live = resolve_member(line, member.uid)
+        if live is None:
+            # 快取中沒有這位成員（低記憶體模式），使用上車時的判斷結果
+            return "訂閱" if member.tier == TIER_DISCORD_SUB else "觀眾"
+        member = live
+
+    # 檢查 Discord 身分組（名稱包含「訂閱」關鍵字）
+    return line.classifier.role_type(member)
+
+def platform_tier(member, line):
+    """Discord 成員的身份層級"""
+    return TIER_DISCORD_SUB if line.classifier.role_type(member) == "訂閱" else TIER_VIEWER
+
+def get_tier(entry, line):
+    """取得換人用的身份層級（綁定了另一個平台的帳號時，取兩邊較高的層級）"""
+    tier = entry.tier
+    if entry.is_twitch:
+        identity.note_twitch_tier(entry.uid, tier)
+        discord_id = identity.discord_for(entry.uid)
+        linked = resolve_member(line, discord_id) if discord_id is not None else None
+        if linked is not None:
+            tier = higher_tier(tier, platform_tier(linked, line))
+        return tier
+    login = identity.twitch_for(entry.uid)
+    if login is not None:
+        tier = higher_tier(tier, identity.twitch_tier(login))
+    return tier
+
+def discord_entry(member, line):
+    """由 Discord 成員建立排隊項目"""
+    link = identity.twitch_for(member.id)
+    return QueueEntry("discord", member.id, member.display_name, platform_tier(member, line), link_id=link)
+
+def twitch_entry(user_name, is_subscriber, is_follower):
+    """由 Twitch 觀眾建立排隊項目"""
+    link = identity.discord_for(user_name)
+    return QueueEntry("twitch", user_name, user_name, twitch_tier(is_subscriber, is_follower), link_id=link)
+
+def linked_position(line, key):
+    """另一個平台的綁定帳號在排隊中的 (名次, 排隊項目)，沒有綁定或不在排隊時回傳 None"""
+    alias = identity.alias(key)
+    if alias is None:
+        return None
+    position = line.queue.position(alias)
+    return (position, line.queue.get(alias)) if position else None
+
+def describe_member(entry, line):
+    """排隊名單中顯示的 (圖示, 名稱, 身份類型)：訂閱者紅圈，其他白圈（Twitch 和 Discord 相同）
+
+    名稱與身分組在渲染時才從快取查詢，成員改名或改身分組後不會顯示舊資料。
+    """
+    if entry.is_twitch:
+        return ("🔴" if entry.tier == TIER_TWITCH_SUB else "⚪"), f"[Twitch] {entry.name}", TWITCH_ROLE_TYPES[entry.tier]
+    live = resolve_member(line, entry.uid)
+    if live is None:
+        role_type = "訂閱" if entry.tier == TIER_DISCORD_SUB else "觀眾"
+        return ("🔴" if role_type == "訂閱" else "⚪"), entry.name, role_type
+    role_type = line.classifier.role_type(live)
+    return ("🔴" if role_type == "訂閱" else "⚪"), live.display_name, role_type
+
+def queue_key(member):
+    """取得 Discord 成員在排隊名單的索引 key（Twitch 觀眾為 ("twitch", 帳號)）"""
+    return ("discord", member.id)
+
+def format_duration(seconds):
+    """秒數的顯示文字（X 小時 Y 分鐘）"""
+    minutes = int(seconds // 60)
+    if minutes < 1:
+        return "不到 1 分鐘"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours} 小時 {minutes} 分鐘" if hours else f"{minutes} 分鐘"
+
+def get_line(ctx):
+    """取得指令所在頻道的上車系統（不是上車頻道時回傳 None）"""
+    return registry.for_channel(ctx.channel.id)
+
+# 建立各頻道的上車系統（排隊看板：就地編輯的分頁名單，取代每次重新發送整份清單）
+for settings in load_line_settings(LINE_DEFAULTS):
+    registry.add(QueueLine(
+        settings, outbox, describe_member,
+        state_dir=STATE_DIR,
+        board_page_size=int(os.getenv("BOARD_PAGE_SIZE", "20")),
+        board_debounce=float(os.getenv("BOARD_DEBOUNCE", "2")),
+        snapshot_every=int(os.getenv("JOURNAL_SNAPSHOT_EVERY", "500")),
+        # 低記憶體模式下分類快取有上限並定時過期（身分組組合改變時查詢當下就會重新分類）
+        role_cache_size=int(os.getenv("LOW_MEMORY_ROLE_CACHE", "1024")) if LOW_MEMORY else None,
+        role_cache_ttl=float(os.getenv("LOW_MEMORY_ROLE_TTL", "300")) if LOW_MEMORY else None,
+    ))
 
-        # 處理 !跳車 指令
-        elif command == "!跳車":
-            print(f"[Twitch] 收到來自 {user_name} 的 !跳車 指令")
-
-            # 防止重複處理同一使用者
-            if user_name in twitch_processed_users:
-                print(f"[Twitch] 警告：{user_name} 已在處理中，忽略重複請求")
-                return
-
-            # 標記為已處理
-            twitch_processed_users.add(user_name)
-
-            # 延遲 30 秒移除使用者
-            async def remove_after_delay():
-                await asyncio.sleep(30)
-                twitch_processed_users.discard(user_name)
-
-            asyncio.create_task(remove_after_delay())
-
-            # 觸發 Discord 相關邏輯
-            if self.discord_bot:
-                await self.handle_twitch_leave(user_name)
-
-    async def handle_twitch_ride(self, user_name, message):
-        """處理 Twitch 觀眾的上車請求"""
-        global queue_enabled
-
-        # 檢查上車系統是否開啟
-        if not queue_enabled:
-            print(f"[Twitch] 上車系統未開啟，忽略 {user_name} 的請求")
-            return
+# ======================
+#  Twitch 聊天指令
+# ======================
+def twitch_connected():
+    """Twitch 連線成功"""
+    global twitch_status
+    twitch_status = "connected"
+    supervisor.get("twitch").mark_up()
+    twitch_log.info("已連線至頻道：%s（啟動後 %.0f ms）",
+                    ", ".join(registry.twitch_channels()), boot.mark("twitch") * 1000)
+
+async def handle_twitch_message(message):
+    """Twitch 聊天訊息：只查一次指令表，指令放進緩衝區由批次處理"""
+    twitch_messages.inc()
+
+    # 不是指令的聊天直接丟棄
+    command = command_table.match(message.content, TWITCH)
+    if command is None:
+        return
 
-        try:
-            # 取得 Discord 頻道
-            channel = self.discord_bot.get_channel(ALLOWED_CHANNEL_ID)
-            if not channel:
-                print(f"[Twitch] 錯誤：無法找到 Discord 頻道 {ALLOWED_CHANNEL_ID}")
-                return
-
-            # 獲取使用者身份信息
-            is_subscriber = message.author.is_subscriber if hasattr(message.author, 'is_subscriber') else False
-            is_follower = message.author.is_follower if hasattr(message.author, 'is_follower') else False
-
-            # 建立一個虛擬的使用者物件以加入隊伍
-            twitch_user = self.TwitchUser(user_name, is_subscriber=is_subscriber, is_follower=is_follower)
-
-            # 檢查是否已在隊伍中
-            if any(u.name == user_name if isinstance(u, self.TwitchUser) else False for u in queue):
-                position = next((i + 1 for i, u in enumerate(queue) if isinstance(u, self.TwitchUser) and u.name == user_name), None)
-                if position:
-                    msg = f"🚗 Twitch 觀眾 **{user_name}** 已在排隊中！（第 {position} 位）"
-                    # 使用 asyncio.run_coroutine_threadsafe 跨執行緒執行
-                    asyncio.run_coroutine_threadsafe(
-                        channel.send(msg),
-                        self.discord_bot.loop
-                    )
-                    print(f"[Twitch] {user_name} 已在隊伍中（第 {position} 位）")
-                return
-
-            # 直接加到末尾（按打命令的時間順序，不做排序）
-            queue.append(twitch_user)
-            position = len(queue)
-
-            # 在 Discord 發送公告訊息
-            announcement = f"🎮 Twitch 觀眾 **{user_name}** 從台上打了 !上車！"
-            asyncio.run_coroutine_threadsafe(
-                channel.send(announcement),
-                self.discord_bot.loop
-            )
-            print(f"[Twitch] 已在 Discord 發送公告：{announcement}")
-
-            # 根據身份生成不同的歡迎訊息
-            status_icon = ""
-            if is_subscriber:
-                status_icon = "💝 (訂閱者)"
-            elif is_follower:
-                status_icon = "⭐ (追隨者)"
-
-            msg = f"✅ Twitch 觀眾 **{user_name}** {status_icon} 成功上車，目前第 **{position} 位**"
-            asyncio.run_coroutine_threadsafe(
-                channel.send(msg),
-                self.discord_bot.loop
-            )
-            print(f"[Twitch] {user_name} (訂閱:{is_subscriber}, 追隨:{is_follower}) 成功加入隊伍，目前第 {position} 位")
+    # 依 Twitch 頻道找到對應的上車系統
+    line = registry.for_twitch(message.channel.name)
+    if line is None:
+        return
 
-        except Exception as e:
-            print(f"[Twitch] 錯誤：處理上車請求時失敗 - {e}")
-            import traceback
-            traceback.print_exc()
+    user_name = message.author.name
+    op = TWITCH_OPS[command]
+    twitch_command_counter.inc(command)
+    chat_log.info("收到來自 %s 的 !%s 指令", user_name, command)
 
-    async def handle_twitch_leave(self, user_name):
-        """處理 Twitch 觀眾的跳車請求"""
-        global queue_enabled
+    # 防止重複處理同一使用者（冷卻時間內不會再處理，各頻道分開計算；綁定另外計算）
+    request = ChatRequest(line, op, user_name, message.author)
+    cooldown_key = twitch_cooldown_key(request)
+    if not twitch_processed_users.add(cooldown_key):
+        chat_log.debug("%s 已在處理中，忽略重複請求", user_name)
+        return
 
+    if not twitch_ingest.offer(request):
+        # 緩衝區已滿，取消冷卻讓使用者可以再試一次
+        twitch_processed_users.discard(cooldown_key)
+        chat_log.warning("指令緩衝區已滿，捨棄 %s 的 !%s", user_name, command)
+
+def twitch_cooldown_key(request):
+    """Twitch 指令的冷卻鍵：各頻道分開計算，綁定與上車/跳車分開"""
+    if request.op == OP_LINK:
+        return (request.line.channel_id, request.user_name, request.op)
+    return (request.line.channel_id, request.user_name)
+
+def drop_twitch_request(request):
+    """drop_oldest 擠掉的請求：取消冷卻讓使用者可以再試一次"""
+    twitch_processed_users.discard(twitch_cooldown_key(request))
+    chat_log.warning("指令緩衝區已滿，捨棄較早的 %s 的請求", request.user_name)
+
+async def apply_twitch_batch(batch):
+    """將一批 Twitch 指令套用到排隊名單，每個頻道的回覆合併成一則訊息"""
+    # 排隊名單還原完成前先等待，避免還原時覆蓋掉新的上車
+    if not queues_ready.is_set():
+        await queues_ready.wait()
+
+    replies = {}  # 上車系統 -> 回覆訊息（dict 保持處理順序）
+    link_requests = False
+    for request in batch:
+        line = request.line
+        # 綁定不需要上車系統開啟
+        if request.op == OP_LINK:
+            replies.setdefault(line, []).extend(twitch_link(request.user_name))
+            link_requests = True
+            continue
         # 檢查上車系統是否開啟
-        if not queue_enabled:
-            print(f"[Twitch] 上車系統未開啟，忽略 {user_name} 的跳車請求")
-            return
-
-        try:
-            # 取得 Discord 頻道
-            channel = self.discord_bot.get_channel(ALLOWED_CHANNEL_ID)
-            if not channel:
-                print(f"[Twitch] 錯誤：無法找到 Discord 頻道 {ALLOWED_CHANNEL_ID}")
-                return
-
-            # 從隊伍中尋找 Twitch 觀眾
-            twitch_user_to_remove = None
-            for u in queue:
-                if isinstance(u, self.TwitchUser) and u.name == user_name:
-                    twitch_user_to_remove = u
-                    break
-
-            if not twitch_user_to_remove:
-                msg = f"❌ Twitch 觀眾 **{user_name}** 不在排隊名單中"
-                asyncio.run_coroutine_threadsafe(
-                    channel.send(msg),
-                    self.discord_bot.loop
-                )
-                print(f"[Twitch] {user_name} 不在隊伍中")
-                return
-
-            # 從隊伍移除
-            queue.remove(twitch_user_to_remove)
-            msg = f"👋 Twitch 觀眾 **{user_name}** 已跳車。剩餘人數：{len(queue)}"
-            asyncio.run_coroutine_threadsafe(
-                channel.send(msg),
-                self.discord_bot.loop
-            )
-            print(f"[Twitch] {user_name} 成功跳車，剩餘人數：{len(queue)}")
+        if not line.enabled:
+            chat_log.debug("上車系統未開啟，忽略 %s 的請求", request.user_name)
+            continue
+        if request.op == OP_JOIN:
+            lines = twitch_ride(line, request.user_name, request.author)
+        else:
+            lines = twitch_leave(line, request.user_name)
+        replies.setdefault(line, []).extend(lines)
+
+    for line, lines in replies.items():
+        # 取得 Discord 頻道
+        channel = bot.get_channel(line.channel_id)
+        if not channel:
+            twitch_log.error("無法找到 Discord 頻道 %s", line.channel_id)
+            continue
+        outbox.post(channel, "\n".join(lines), coalesce=True)
+
+    if link_requests:
+        await asyncio.to_thread(identity.save)
+
+def twitch_ride(line, user_name, author):
+    """處理 Twitch 觀眾的上車請求，回傳要發送到 Discord 的訊息"""
+    # 獲取使用者身份信息
+    is_subscriber = author.is_subscriber if hasattr(author, 'is_subscriber') else False
+    is_follower = author.is_follower if hasattr(author, 'is_follower') else False
+
+    # 聊天 tags 沒有追隨狀態：先看快取，沒有時上車後在背景查詢
+    author_id = getattr(author, "id", None)
+    status = None
+    if viewer_status is not None and author_id:
+        status = viewer_status.cached(line.twitch_channel, author_id)
+        if status is not None:
+            is_subscriber = is_subscriber or bool(status.subscriber)
+            is_follower = is_follower or bool(status.follower)
+
+    key = ("twitch", user_name)
+
+    # 檢查是否已在隊伍中
+    position = line.queue.position(key)
+    if position:
+        chat_log.debug("%s 已在隊伍中（第 %d 位）", user_name, position)
+        return [f"🚗 Twitch 觀眾 **{user_name}** 已在排隊中！（第 {position} 位）"]
+    linked = linked_position(line, key)
+    if linked:
+        position, member = linked
+        chat_log.debug("%s 已用綁定的 Discord 帳號排隊（第 %d 位）", user_name, position)
+        return [f"🚗 Twitch 觀眾 **{user_name}** 已用 Discord 帳號 {member.name} 排隊中！（第 {position} 位）"]
 
-        except Exception as e:
-            print(f"[Twitch] 錯誤：處理跳車請求時失敗 - {e}")
-            import traceback
-            traceback.print_exc()
+    # 直接加到末尾（按打命令的時間順序，不做排序）
+    entry = twitch_entry(user_name, is_subscriber, is_follower)
+    position = line.queue.append(key, entry, tier=get_tier(entry, line))
+    if viewer_status is not None and author_id and status is None:
+        viewer_status.request(line.twitch_channel, author_id,
+                              lambda result: apply_viewer_status(line, user_name, result))
+
+    # 在 Discord 發送公告訊息
+    announcement = f"🎮 Twitch 觀眾 **{user_name}** 從台上打了 !上車！"
+
+    # 根據身份生成不同的歡迎訊息
+    status_icon = ""
+    if is_subscriber:
+        status_icon = "💝 (訂閱者)"
+    elif is_follower:
+        status_icon = "⭐ (追隨者)"
+
+    msg = f"✅ Twitch 觀眾 **{user_name}** {status_icon} 成功上車，目前第 **{position} 位**"
+    queue_log.info("[Twitch] %s (訂閱:%s, 追隨:%s) 成功加入隊伍，目前第 %d 位",
+                   user_name, is_subscriber, is_follower, position)
+    return [announcement, msg]
+
+def apply_viewer_status(line, user_name, status):
+    """背景查到 Twitch 觀眾的狀態後，更新排隊中的成員並調整換人優先順序"""
+    key = ("twitch", user_name)
+    entry = line.queue.get(key)
+    if entry is None:
+        return  # 已經跳車或上場
+
+    # 狀態只會往上調整（查詢失敗時 subscriber / follower 為 None）
+    tier = higher_tier(entry.tier, twitch_tier(status.subscriber, status.follower))
+    if tier != entry.tier:
+        entry.tier = tier
+        line.queue.retier(key, get_tier(entry, line))
+        line.board.schedule()
+        line.feed.publish("update", [(key, entry)])
+        queue_log.debug("[Twitch] %s 狀態更新（%s）", user_name, TWITCH_ROLE_TYPES[tier])
+
+def twitch_link(user_name):
+    """Twitch 觀眾確認綁定 Discord 帳號，回傳要發送到 Discord 的訊息"""
+    discord_id = identity.confirm(user_name)
+    if discord_id is None:
+        return [f"❌ Twitch 觀眾 **{user_name}** 沒有待確認的綁定，請先在 Discord 輸入 !綁定 {user_name}"]
+    merge_linked_entries(discord_id, user_name)
+    queue_log.info("[Twitch] %s 已綁定 Discord 成員 %s", user_name, discord_id)
+    return [f"🔗 Twitch 觀眾 **{user_name}** 已綁定 <@{discord_id}>"]
+
+def merge_linked_entries(discord_id, login):
+    """剛綁定的帳號若兩個平台都在排隊，只保留較前面的位置，並以合併後的層級重新計算優先順序"""
+    discord_key, twitch_key = ("discord", discord_id), ("twitch", login)
+    for line in registry:
+        discord_position = line.queue.position(discord_key)
+        twitch_position = line.queue.position(twitch_key)
+        if discord_position and twitch_position:
+            # 不是自己跳車，以 "merge" 移除（排隊歷史不算中途跳車）
+            line.queue.remove_many([twitch_key if discord_position < twitch_position else discord_key], op="merge")
+        for key, link_id in ((discord_key, login), (twitch_key, discord_id)):
+            entry = line.queue.get(key)
+            if entry is not None:
+                entry.link_id = link_id
+                line.queue.retier(key, get_tier(entry, line))
+                line.feed.publish("update", [(key, entry)])
+
+def leave_queue(line, key):
+    """跳車：移除 key，不在排隊時改移除另一個平台的綁定帳號（一個人只佔一個位置）"""
+    removed = line.queue.remove(key)
+    if removed is None:
+        alias = identity.alias(key)
+        if alias is not None:
+            removed = line.queue.remove(alias)
+    return removed
+
+def twitch_leave(line, user_name):
+    """處理 Twitch 觀眾的跳車請求，回傳要發送到 Discord 的訊息"""
+    # 從隊伍移除 Twitch 觀眾（或從 Discord 上車的綁定帳號）
+    if leave_queue(line, ("twitch", user_name)) is None:
+        chat_log.debug("%s 不在隊伍中", user_name)
+        return [f"❌ Twitch 觀眾 **{user_name}** 不在排隊名單中"]
+
+    queue_log.info("[Twitch] %s 成功跳車，剩餘人數：%d", user_name, len(line.queue))
+    return [f"👋 Twitch 觀眾 **{user_name}** 已跳車。剩餘人數：{len(line.queue)}"]
+
+# Twitch 支援的指令 -> 排隊操作
+TWITCH_OPS = {"上車": OP_JOIN, "跳車": OP_LEAVE, "綁定": OP_LINK}
+
+# Twitch 指令緩衝區：有上限，批次套用到排隊名單，滿了依策略丟棄
+twitch_ingest = ChatIngest(
+    apply_twitch_batch,
+    maxsize=int(os.getenv("TWITCH_INGEST_MAX", "1000")),
+    batch_size=int(os.getenv("TWITCH_INGEST_BATCH", "50")),
+    window=float(os.getenv("TWITCH_INGEST_WINDOW", "0.05")),
+    overflow=os.getenv("TWITCH_INGEST_OVERFLOW", "drop_newest"),
+    on_drop=drop_twitch_request,
+)
 
 async def run_twitch_bot():
-    """在背景執行 Twitch Bot"""
-    global twitch_bot
+    """在背景執行 Twitch Bot（沒有設定 Twitch 帳號時不會載入 twitchio）"""
+    global twitch_status, viewer_status
+    status_task = None
     try:
-        print("[Twitch] 讀取環境變數...")
         twitch_username = os.getenv("TWITCH_USERNAME")
         twitch_token = os.getenv("TWITCH_TOKEN")
-        twitch_channel = os.getenv("TWITCH_CHANNEL", "m0623lalala")
+        twitch_channels = registry.twitch_channels()
         twitch_client_id = os.getenv("TWITCH_CLIENT_ID")
         twitch_client_secret = os.getenv("TWITCH_CLIENT_SECRET")
 
-        print(f"[Twitch] USERNAME: {twitch_username}")
-        print(f"[Twitch] TOKEN: {twitch_token[:20] if twitch_token else 'None'}...")
-        print(f"[Twitch] CLIENT_ID: {twitch_client_id[:20] if twitch_client_id else 'None'}...")
-        print(f"[Twitch] CLIENT_SECRET: {'<SET>' if twitch_client_secret else '<NOT SET>'}...")
-        print(f"[Twitch] CHANNEL: {twitch_channel}")
+        # 只在除錯時列出設定，憑證不輸出內容
+        twitch_log.debug("USERNAME: %s, TOKEN: %s, CLIENT_ID: %s, CLIENT_SECRET: %s, CHANNELS: %s",
+                         twitch_username,
+                         "<SET>" if twitch_token else "<NOT SET>",
+                         "<SET>" if twitch_client_id else "<NOT SET>",
+                         "<SET>" if twitch_client_secret else "<NOT SET>",
+                         twitch_channels)
+
+        if not twitch_channels:
+            twitch_log.warning("沒有任何上車頻道連結 Twitch 頻道，Twitch 監聽已禁用")
+            return
 
         if not twitch_username or not twitch_token:
-            print("[Twitch] [WARNING] 缺少 TWITCH_USERNAME 或 TWITCH_TOKEN，Twitch 監聽已禁用")
+            twitch_log.warning("缺少 TWITCH_USERNAME 或 TWITCH_TOKEN，Twitch 監聽已禁用")
             return
 
         if not twitch_client_id:
-            print("[Twitch] [WARNING] 缺少 TWITCH_CLIENT_ID，Twitch 監聽已禁用")
+            twitch_log.warning("缺少 TWITCH_CLIENT_ID，Twitch 監聽已禁用")
             return
 
-        print("[Twitch] 建立 TwitchBot 實例...")
+        # 確定要使用 Twitch 後才載入 twitchio
+        from twitch_bot import TwitchBot
+        boot.mark("twitch_import")
+
         # 注意：twitchio 需要 client_secret 參數，即使是公開應用也需要提供（可以是空值或任意值）
         # 使用環境變數中的 CLIENT_SECRET，如果沒有則使用空值
 
         if not twitch_client_secret:
             twitch_client_secret = "public_app_secret"
-            print("[Twitch] [INFO] 使用公開應用模式，設置預設 client_secret")
+            twitch_log.info("使用公開應用模式，設置預設 client_secret")
         else:
-            print("[Twitch] [INFO] 使用 CLIENT_SECRET 進行初始化")
-
-        twitch_bot = TwitchBot(
-            token=twitch_token,
-            client_id=twitch_client_id,
-            client_secret=twitch_client_secret,
-            nick=twitch_username,
-            prefix="!",
-            initial_channels=[twitch_channel],
-            bot_id="xm1hr2qkhidziyahjerkkzvckb0244"
-        )
-
-        # 將 Discord Bot 的引用傳遞給 Twitch Bot
-        twitch_bot.discord_bot = bot
-
-        print("[Twitch] 正在連接到 Twitch...")
-        # 對於公開應用，使用 load_tokens=False 來跳過 client_credentials 認證流程
-        # 只需要 OAuth token 就可以監聽 chat
-        await twitch_bot.start(load_tokens=False)
+            twitch_log.info("使用 CLIENT_SECRET 進行初始化")
+
+        # 觀眾狀態查詢（TWITCH_API_URL 可指向本地的假伺服器，TWITCH_STATUS_LOOKUP=0 可關閉）
+        # 在連線之外建立，重新連線時快取不會遺失
+        if os.getenv("TWITCH_STATUS_LOOKUP", "1") != "0":
+            viewer_status = StatusResolver(
+                HelixClient(twitch_client_id, twitch_token, base_url=os.getenv("TWITCH_API_URL", HELIX_URL)),
+                ttl=float(os.getenv("TWITCH_STATUS_TTL", "600")),
+                negative_ttl=float(os.getenv("TWITCH_STATUS_NEGATIVE_TTL", "120")),
+            )
+            status_task = asyncio.create_task(viewer_status.run())
+
+        async def connect_twitch():
+            """建立新的 Twitch Bot 並連線，連線結束時拋出例外讓監督重新連線"""
+            global twitch_bot, twitch_status
+            if twitch_bot is not None:
+                await twitch_bot.close()
+            twitch_bot = TwitchBot(
+                token=twitch_token,
+                client_id=twitch_client_id,
+                client_secret=twitch_client_secret,
+                nick=twitch_username,
+                prefix="!",
+                initial_channels=twitch_channels,
+                bot_id="xm1hr2qkhidziyahjerkkzvckb0244",
+                on_ready=twitch_connected,
+                on_chat=handle_twitch_message,
+            )
 
-    except Exception as e:
-        print(f"[Twitch] [ERROR] 連接失敗：{e}")
-        import traceback
-        traceback.print_exc()
+            twitch_log.info("正在連接到 Twitch...")
+            twitch_status = "connecting"
+            try:
+                # 對於公開應用，使用 load_tokens=False 來跳過 client_credentials 認證流程
+                # 只需要 OAuth token 就可以監聽 chat
+                await twitch_bot.start(load_tokens=False)
+            except Exception:
+                twitch_status = "error"
+                raise
+            twitch_status = "disconnected"
+            raise ConnectionError("Twitch 連線已中斷")
+
+        await supervisor.watch("twitch", connect_twitch).run()
 
-def run_twitch_in_thread():
-    """在獨立執行緒中執行 Twitch Bot"""
-    print("[Twitch] 正在初始化 Twitch Bot 執行緒...")
-    try:
-        # 為了避免事件循環衝突，強制建立新的事件循環
-        import sys
-        if sys.platform == 'win32':
-            asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        print("[Twitch] 執行緒已建立，正在連接...")
-        loop.run_until_complete(run_twitch_bot())
-        print("[Twitch] 執行緒運行中...")
-        loop.run_forever()
-    except KeyboardInterrupt:
-        print("[Twitch] 執行緒被中斷")
     except Exception as e:
-        print(f"[Twitch] 執行緒錯誤：{e}")
-        import traceback
-        traceback.print_exc()
+        twitch_status = "error"
+        twitch_log.exception("連接失敗：%s", e)
+    finally:
+        if status_task is not None:
+            status_task.cancel()
+            await viewer_status.close()
 
 # ======================
-#  Flask 路由
+#  排隊狀態持久化
 # ======================
-@app.route('/')
-def home():
-    return "LOL 上車系統 Bot is running! ✅"
-
-@app.route('/health')
-def health():
-    return {"status": "ok", "bot": str(bot.user) if bot.user else "connecting"}
+def journal_queue_change(line, op, entries):
+    """排隊名單變動時寫入該頻道的日誌"""
+    journal = line.journal
+    if op == "join":
+        key, entry = entries[0]
+        journal.record("join", key=list(key), entry=entry.to_dict())
+    elif op == "leave":
+        journal.record("leave", key=list(entries[0][0]))
+    elif op in ("rotate", "merge"):
+        journal.record(op, keys=[list(key) for key, _ in entries])
+    elif op == "clear":
+        journal.record("clear")
+
+def queue_state(line):
+    """頻道目前的排隊狀態（寫入快照用）"""
+    return {
+        "enabled": line.enabled,
+        "entries": [entry.to_dict() for entry in line.queue],
+    }
+
+async def restore_queue(line):
+    """依啟動時讀取的狀態還原頻道的排隊名單（只在第一次 on_ready 時執行）"""
+    if line.restored_state is None:
+        return
+    state, line.restored_state = line.restored_state, None
+
+    channel = bot.get_channel(line.channel_id)
+    guild = channel.guild if channel else None
+    # Discord 成員一次查詢（快取中沒有的以 query_members 每 100 人查一次），順便更新身份層級
+    discord_ids = [data["key"][1] for data in state["entries"] if data["key"][0] == "discord"]
+    found, failed = {}, set(discord_ids)
+    if guild is not None:
+        found, failed = await members.fetch_many(guild, discord_ids)
+    for data in state["entries"]:
+        entry = QueueEntry.from_dict(data)
+        if not entry.is_twitch:
+            member = found.get(entry.uid)
+            if member is not None:
+                entry.name = member.display_name
+                entry.tier = platform_tier(member, line)
+            elif entry.uid not in failed:
+                # 查詢成功但伺服器中已沒有這位成員
+                queue_log.warning("成員 %s（%s）已離開伺服器，略過", entry.name, entry.uid)
+                continue
+            # 查詢失敗的成員保留上車時的名稱與層級，之後查得到時才更新
+        line.queue.append(entry.key, entry, tier=get_tier(entry, line))
+
+    line.enabled = state["enabled"]
+    queue_log.info("%s 排隊名單已還原：%d 人，上車系統%s",
+                   line.name, len(line.queue), "開啟" if line.enabled else "關閉")
+    if failed:
+        queue_log.warning("%s 有 %d 位成員查詢失敗，以上車時的資料保留在名單中", line.name, len(failed))
+
+    # 還原完成後才開始記錄；成員都查詢成功時立即寫一份快照（查詢失敗時保留原本的快照與日誌）
+    line.queue.subscribe(lambda op, entries: journal_queue_change(line, op, entries))
+    line.journal.state_fn = lambda: queue_state(line)
+    if not failed:
+        line.journal.request_snapshot()
+
+    # 重新啟動前進行中的直播繼續記錄（關閉中的頻道則結束上一場）
+    line.queue.subscribe(lambda op, entries: history.record(line.channel_id, op, entries))
+    if line.enabled:
+        history.open_stream(line.channel_id)
+    else:
+        history.close_stream(line.channel_id)
 
-def run_web_server():
-    """在背景執行 Flask 伺服器"""
+# ======================
+#  網頁路由
+# ======================
+# 疊加畫面 API 共用的標頭（允許 OBS 瀏覽器來源跨網域讀取，每次都要重新驗證）
+API_HEADERS = {"Access-Control-Allow-Origin": "*", "Cache-Control": "no-cache"}
+FEED_HEARTBEAT = float(os.getenv("FEED_HEARTBEAT", "15"))  # 沒有變動時每隔幾秒送一次心跳
+
+async def home(request):
+    return web.Response(text="LOL 上車系統 Bot is running! ✅")
+
+async def health(request):
+    return web.json_response({"status": "ok", "bot": str(bot.user) if bot.user else "connecting"})
+
+async def ready(request):
+    """就緒檢查：Discord 已連線、排隊名單已還原，且 Twitch（有設定時）也已連線才回傳 200"""
+    discord_ready = bot.is_ready() and not bot.is_closed() and queues_ready.is_set()
+    twitch_ready = twitch_status in ("disabled", "connected")
+    body = {
+        "ready": discord_ready and twitch_ready,
+        "discord": "connected" if discord_ready else "connecting",
+        "twitch": twitch_status,
+        "latency_ms": round(bot.latency * 1000, 1) if discord_ready else None,
+    }
+    return web.json_response(body, status=200 if body["ready"] else 503)
+
+def request_line(request):
+    """?line= 指定的上車頻道（頻道 ID 或名稱），只有一個上車頻道時可省略"""
+    wanted = request.query.get("line")
+    if wanted is None:
+        return next(iter(registry)) if len(registry) == 1 else None
+    if wanted.isdigit():
+        line = registry.for_channel(int(wanted))
+        if line is not None:
+            return line
+    return next((line for line in registry if line.name == wanted), None)
+
+def line_not_found():
+    return web.json_response({"error": "請以 ?line= 指定上車頻道", "lines": [line.name for line in registry]},
+                             status=404, headers=API_HEADERS)
+
+async def queue_snapshot(request):
+    """排隊名單的 JSON 快照（附版本號與 ETag，未變動時回傳 304）"""
+    line = request_line(request)
+    if line is None:
+        return line_not_found()
+    etag, body = line.feed.snapshot()
+    headers = dict(API_HEADERS, ETag=etag)
+    if request.headers.get("If-None-Match") == etag:
+        return web.Response(status=304, headers=headers)
+    return web.Response(body=body, content_type="application/json", charset="utf-8", headers=headers)
+
+async def queue_events(request):
+    """以 server-sent events 推送排隊名單的變動（連線時先送一份完整名單）"""
+    line = request_line(request)
+    if line is None:
+        return line_not_found()
+    response = web.StreamResponse(headers=dict(API_HEADERS, **{
+        "Content-Type": "text/event-stream", "X-Accel-Buffering": "no"}))
+    await response.prepare(request)
+    client = line.feed.connect()
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(client.get(), FEED_HEARTBEAT)
+            except asyncio.TimeoutError:
+                event = b": ping\n\n"  # 保持連線，避免被代理伺服器中斷
+            if event is None:
+                break
+            await response.write(event)
+    except ConnectionResetError:
+        pass  # 客戶端已離開
+    finally:
+        line.feed.disconnect(client)
+    return response
+
+async def metrics_endpoint(request):
+    # Content-Type 帶有 version 參數，aiohttp 的 content_type 參數不接受，直接設定標頭
+    return web.Response(body=metrics.render().encode(), headers={"Content-Type": METRICS_CONTENT_TYPE})
+
+app.router.add_get("/", home)
+app.router.add_get("/health", health)
+app.router.add_get("/ready", ready)
+app.router.add_get("/metrics", metrics_endpoint)
+app.router.add_get("/api/queue", queue_snapshot)
+app.router.add_get("/api/queue/events", queue_events)
+
+async def start_web_server():
+    """在 Bot 的事件循環中啟動網頁伺服器，回傳 runner 以便關閉"""
     port = int(os.getenv("PORT", 10000))
-    print(f"[Flask] 啟動網頁伺服器於端口 {port}")
-    app.run(host="0.0.0.0", port=port, debug=False, use_reloader=False)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "0.0.0.0", port).start()
+    web_log.info("啟動網頁伺服器於端口 %d", port)
+    return runner
 
 # ======================
 #  Discord Bot 事件
 # ======================
 @bot.event
 async def on_ready():
-    print(f"[Discord] [OK] Bot 登入成功: {bot.user}")
-    print(f"[Discord] Bot ID: {bot.user.id}")
-    print(f"[Discord] 已連接到 {len(bot.guilds)} 個伺服器")
+    supervisor.get("discord").mark_up()
+    discord_log.info("Bot 登入成功: %s（ID: %s），已連接到 %d 個伺服器", bot.user, bot.user.id, len(bot.guilds))
 
     # 列出所有伺服器
-    for guild in bot.guilds:
-        safe_name = guild.name.encode('cp950', errors='ignore').decode('cp950')
-        print(f"[Discord] - Server: {safe_name} (ID: {guild.id})")
+    if discord_log.isEnabledFor(logging.DEBUG):
+        for guild in bot.guilds:
+            discord_log.debug("- Server: %s (ID: %s)", guild.name, guild.id)
+
+    if queues_ready.is_set():
+        return  # 重新連線時不需要再還原
+    boot.mark("discord")
+
+    # 等待日誌在背景讀取完成後才還原排隊名單
+    await journals_loaded.wait()
+    for line in registry:
+        # 設定中沒有填伺服器 ID 時，以頻道所在的伺服器為準
+        channel = bot.get_channel(line.channel_id)
+        if channel is not None and line.guild_id is None:
+            line.guild_id = channel.guild.id
+        await restore_queue(line)
+
+    boot.mark("ready")
+    queues_ready.set()
+    log.info("啟動時間：%s", boot.report())
+
+@bot.event
+async def on_resumed():
+    # 斷線後恢復原本的 session（不需要重新 identify，也不會再觸發 on_ready）
+    supervisor.get("discord").mark_up()
+    discord_log.info("已恢復 Gateway session")
+
+@bot.event
+async def on_disconnect():
+    supervisor.get("discord").mark_down()
+    discord_log.warning("與 Discord Gateway 的連線中斷，等待重新連線")
+
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.started_at = time.perf_counter()
+    members.remember(ctx.author)
+
+@bot.after_invoke
+async def record_command_latency(ctx):
+    command_latency.observe(time.perf_counter() - ctx.started_at, ctx.command.qualified_name)
+
+def refresh_member(member):
+    """成員的身分組或顯示名稱可能改變：讓分類快取失效，並更新排隊中的成員（看板的顯示片段也會重算）"""
+    key = queue_key(member)
+    for line in registry.for_guild(member.guild.id):
+        line.classifier.invalidate_member(member.guild.id, member.id)
+        entry = line.queue.get(key)
+        if entry is not None:
+            entry.name = member.display_name
+            entry.tier = platform_tier(member, line)
+            line.queue.retier(key, get_tier(entry, line))
+            line.board.schedule()
+            line.feed.publish("update", [(key, entry)])
+
+@bot.event
+async def on_member_update(before, after):
+    if before.roles != after.roles or before.display_name != after.display_name:
+        refresh_member(after)
+
+@bot.event
+async def on_raw_member_remove(payload):
+    # raw 事件在成員沒被快取時（低記憶體模式）也會觸發
+    members.discard(payload.guild_id, payload.user.id)
+    for line in registry.for_guild(payload.guild_id):
+        line.classifier.invalidate_member(payload.guild_id, payload.user.id)
+
+@bot.event
+async def on_guild_role_update(before, after):
+    if before.name != after.name:
+        for line in registry.for_guild(after.guild.id):
+            line.classifier.invalidate_role(after)
+
+@bot.event
+async def on_guild_role_delete(role):
+    for line in registry.for_guild(role.guild.id):
+        line.classifier.invalidate_role(role)
 
 @bot.event
 async def on_message(message):
-    # 只列印包含關鍵字的訊息
-    if message.author != bot.user:
-        # 關鍵字列表
-        keywords = ["!開始上車", "!停止上車", "!上車", "!跳車", "!排隊", "!查車況"]
-        if any(keyword in message.content for keyword in keywords):
-            print(f"[訊息] {message.author}: {message.content}")
+    # 只處理上車頻道中符合指令表的訊息，其他訊息不會建立 Context
+    if message.author.bot or registry.for_channel(message.channel.id) is None:
+        return
+    command = command_table.match(message.content, DISCORD)
+    if command is None:
+        return
+    discord_log.debug("[訊息] %s: %s", message.author, message.content)
+
+    # 排隊名單還原完成前收到的指令先等待
+    if not queues_ready.is_set():
+        await queues_ready.wait()
     await bot.process_commands(message)
 
 # ======================
@@ -411,358 +947,616 @@ async def on_message(message):
 @bot.command()
 async def 開始上車(ctx):
     """開啟上車系統（僅慕笙寶寶或保姆可用）"""
-    if not is_allowed_channel(ctx):
+    line = get_line(ctx)
+    if line is None:
         return
 
-    if not has_authority(ctx.author):
-        await ctx.send("⛔ 只有慕笙寶寶或保姆能開啟上車系統！")
+    if not has_authority(ctx.author, line):
+        outbox.post(ctx.channel, "⛔ 只有慕笙寶寶或保姆能開啟上車系統！")
         return
 
-    global queue_enabled
-    if queue_enabled:
-        await ctx.send("⚠️ 上車系統已經開啟了！")
+    if line.enabled:
+        outbox.post(ctx.channel, "⚠️ 上車系統已經開啟了！")
         return
 
-    queue_enabled = True
-    await ctx.send("🚀 上車系統已開啟！大家可以開始 !上車 囉～")
-    print(f"[系統] {ctx.author.display_name} 開啟了上車系統")
+    line.enabled = True
+    line.journal.record("open")
+    history.open_stream(line.channel_id)
+    line.board.schedule()
+    outbox.post(ctx.channel, "🚀 上車系統已開啟！大家可以開始 !上車 囉～")
+    queue_log.info("%s 開啟了 %s 的上車系統", ctx.author.display_name, line.name)
 
 @bot.command()
 async def 停止上車(ctx):
     """關閉上車系統（僅慕笙寶寶或保姆可用）"""
-    if not is_allowed_channel(ctx):
+    line = get_line(ctx)
+    if line is None:
         return
 
-    if not has_authority(ctx.author):
-        await ctx.send("⛔ 只有慕笙寶寶或保姆能關閉上車系統！")
+    if not has_authority(ctx.author, line):
+        outbox.post(ctx.channel, "⛔ 只有慕笙寶寶或保姆能關閉上車系統！")
         return
 
-    global queue_enabled
-    if not queue_enabled:
-        await ctx.send("⚠️ 上車系統已經是關閉狀態了！")
+    if not line.enabled:
+        outbox.post(ctx.channel, "⚠️ 上車系統已經是關閉狀態了！")
         return
 
-    queue_enabled = False
-    await ctx.send("🛑 上車系統已關閉！暫時無法上車")
-    print(f"[系統] {ctx.author.display_name} 關閉了上車系統")
+    line.enabled = False
+    line.journal.record("close")
+    history.close_stream(line.channel_id)
+    line.board.schedule()
+    outbox.post(ctx.channel, "🛑 上車系統已關閉！暫時無法上車")
+    queue_log.info("%s 關閉了 %s 的上車系統", ctx.author.display_name, line.name)
 
 @bot.command()
 async def 上車(ctx):
     """加入排隊名單"""
-    if not is_allowed_channel(ctx):
+    line = get_line(ctx)
+    if line is None:
         return
 
     # 檢查上車系統是否開啟
-    if not queue_enabled:
-        await ctx.send("⛔ 上車系統尚未開啟，請等待慕笙寶寶或保姆開啟！")
+    if not line.enabled:
+        outbox.post(ctx.channel, "⛔ 上車系統尚未開啟，請等待慕笙寶寶或保姆開啟！")
         return
 
     # 防止重複處理同一訊息
     msg_id = ctx.message.id
-    if msg_id in processed_messages:
-        print(f"[警告] 重複訊息被忽略: {msg_id}")
+    if not processed_messages.add(msg_id):
+        discord_log.debug("重複訊息被忽略: %s", msg_id)
         return
-    processed_messages.add(msg_id)
 
     user = ctx.author
-    print(f"[指令-上車] {user.display_name} 執行上車指令 (訊息ID: {msg_id})")
 
-    if user in queue:
-        position = queue.index(user) + 1
-        await ctx.send(f"🚗 {user.display_name} 已在排隊中！（第 {position} 位）")
+    key = queue_key(user)
+    position = line.queue.position(key)
+    if position:
+        outbox.post(ctx.channel, f"🚗 {user.display_name} 已在排隊中！（第 {position} 位）")
+        return
+    linked = linked_position(line, key)
+    if linked:
+        position, member = linked
+        outbox.post(ctx.channel, f"🚗 {user.display_name} 已用 Twitch 帳號 {member.name} 排隊中！（第 {position} 位）")
         return
 
     # 直接加到末尾（按打命令的時間順序，不做排序）
-    queue.append(user)
-    position = len(queue)
-    print(f"[指令-上車] {user.display_name} 成功加入，目前第 {position} 位")
-    await ctx.send(f"✅ {user.display_name} 成功上車，目前第 **{position} 位**")
+    entry = discord_entry(user, line)
+    position = line.queue.append(key, entry, tier=get_tier(entry, line))
+    queue_log.info("%s 成功加入，目前第 %d 位", user.display_name, position)
+    outbox.post(ctx.channel, f"✅ {user.display_name} 成功上車，目前第 **{position} 位**")
 
 @bot.command()
 async def 跳車(ctx):
     """離開排隊名單"""
-    if not is_allowed_channel(ctx):
+    line = get_line(ctx)
+    if line is None:
         return
 
     # 檢查上車系統是否開啟
-    if not queue_enabled:
-        await ctx.send("⛔ 上車系統尚未開啟！")
+    if not line.enabled:
+        outbox.post(ctx.channel, "⛔ 上車系統尚未開啟！")
         return
 
     user = ctx.author
-    if user not in queue:
-        await ctx.send(f"❌ {user.display_name} 不在排隊名單中")
+    if leave_queue(line, queue_key(user)) is None:
+        outbox.post(ctx.channel, f"❌ {user.display_name} 不在排隊名單中")
         return
 
-    queue.remove(user)
-    await ctx.send(f"👋 {user.display_name} 已跳車。剩餘人數：{len(queue)}")
+    outbox.post(ctx.channel, f"👋 {user.display_name} 已跳車。剩餘人數：{len(line.queue)}")
 
 @bot.command(name="排隊清單")
 async def 排隊清單(ctx):
     """顯示目前排隊名單"""
-    if not is_allowed_channel(ctx):
+    line = get_line(ctx)
+    if line is None:
         return
 
     # 檢查上車系統是否開啟
-    if not queue_enabled:
-        await ctx.send("⛔ 上車系統尚未開啟！")
+    if not line.enabled:
+        outbox.post(ctx.channel, "⛔ 上車系統尚未開啟！")
         return
 
-    if not queue:
-        await ctx.send("📭 目前沒有人排隊喔～")
-        return
-
-    msg = f"🚌 目前排隊共 {len(queue)} 人：\n"
-    for i, member in enumerate(queue, start=1):
-        role_type = get_role_type(member)
-
-        # 根據身分設定圖示（Twitch 和 Discord 使用相同圖示）
-        if isinstance(member, TwitchBot.TwitchUser):
-            # Twitch 訂閱者使用紅圈，Twitch 普通觀眾使用白圈
-            icon = "🔴" if member.is_subscriber else "⚪"
-        else:
-            # Discord 使用者
-            if role_type == "訂閱":
-                icon = "🔴"  # Discord 訂閱者
-            else:
-                icon = "⚪"  # Discord 普通觀眾
-
-        # 前4位標記為即將上場
-        mark = "🎮" if i <= MAX_PLAYERS else "🕓"
-        msg += f"{mark}{icon} {i}. {member.display_name}（{role_type}）\n"
-
-    await ctx.send(msg)
+    # 顯示排隊看板：看板已存在時只更新內容，不再發送新訊息
+    if not await line.board.show(ctx.channel):
+        try:
+            await ctx.message.add_reaction("📌")
+        except discord.HTTPException:
+            pass
 
 @bot.command(name="查車況")
 async def 查車況(ctx):
     """查看當前上場4人和預備候補4人"""
-    if not is_allowed_channel(ctx):
+    line = get_line(ctx)
+    if line is None:
         return
 
     # 檢查上車系統是否開啟
-    if not queue_enabled:
-        await ctx.send("⛔ 上車系統尚未開啟！")
+    if not line.enabled:
+        outbox.post(ctx.channel, "⛔ 上車系統尚未開啟！")
         return
 
+    queue, board, max_players = line.queue, line.board, line.max_players
     if not queue:
-        await ctx.send("📭 目前沒有人排隊喔～")
+        outbox.post(ctx.channel, "📭 目前沒有人排隊喔～")
         return
 
     # 當前上場：前4位
-    current_players = queue[:MAX_PLAYERS]
+    current_players = queue.slice_items(0, max_players)
     # 預備候補：第5-8位
-    next_players = queue[MAX_PLAYERS:MAX_PLAYERS*2]
-
-    msg = "🎮 **當前上場：**\n"
-    if current_players:
-        for i, member in enumerate(current_players, start=1):
-            role_type = get_role_type(member)
-
-            # 根據身分設定圖示（Twitch 和 Discord 使用相同圖示）
-            if isinstance(member, TwitchBot.TwitchUser):
-                # Twitch 訂閱者使用紅圈，Twitch 普通觀眾使用白圈
-                icon = "🔴" if member.is_subscriber else "⚪"
-            else:
-                # Discord 使用者
-                icon = "🔴" if role_type == "訂閱" else "⚪"
-
-            msg += f"{icon} {i}. {member.display_name}（{role_type}）\n"
-    else:
-        msg += "（無）\n"
+    next_players = queue.slice_items(max_players, max_players*2)
 
-    msg += "\n🕓 **預備候補：**\n"
-    if next_players:
-        for i, member in enumerate(next_players, start=5):
-            role_type = get_role_type(member)
+    lines = ["🎮 **當前上場：**"]
+    lines += [board.line(i, key, member) for i, (key, member) in enumerate(current_players, start=1)] or ["（無）"]
 
-            # 根據身分設定圖示（Twitch 和 Discord 使用相同圖示）
-            if isinstance(member, TwitchBot.TwitchUser):
-                # Twitch 訂閱者使用紅圈，Twitch 普通觀眾使用白圈
-                icon = "🔴" if member.is_subscriber else "⚪"
-            else:
-                icon = "⚪"
-
-            msg += f"{icon} {i}. {member.display_name}（{role_type}）\n"
-    else:
-        msg += "（無）\n"
+    lines += ["", "🕓 **預備候補：**"]
+    lines += [board.line(i, key, member) for i, (key, member) in enumerate(next_players, start=max_players + 1)] or ["（無）"]
 
     # 如果還有更多人在排隊中
-    remaining = len(queue) - MAX_PLAYERS * 2
+    remaining = len(queue) - max_players * 2
     if remaining > 0:
-        msg += f"\n📋 還有 {remaining} 人在排隊中..."
-
-    await ctx.send(msg)
+        lines += ["", f"📋 還有 {remaining} 人在排隊中..."]
+
+    # 預計等待時間（依最近幾輪換人的間隔推算）
+    estimate = history.round_estimate(line.channel_id)
+    if estimate is not None:
+        lines += ["", f"⏱️ 最近每輪約 {format_duration(estimate)}"]
+        key = queue_key(ctx.author)
+        position = queue.position(key)
+        if not position:
+            linked = linked_position(line, key)
+            position = linked[0] if linked else 0
+        if position:
+            eta = history.eta(line.channel_id, position, max_players)
+            lines.append(f"⏳ {ctx.author.display_name} 目前第 {position} 位，預計 {format_duration(eta)}後上場")
+
+    outbox.post(ctx.channel, "\n".join(lines))
 
 @bot.command(name="換人")
 async def 換人(ctx):
-    """執行換人邏輯：前2訂閱優先 + 後2位依排隊順序"""
-    if not is_allowed_channel(ctx):
+    """執行換人邏輯：依換人規則（預設前2訂閱優先）+ 其餘依排隊順序"""
+    line = get_line(ctx)
+    if line is None:
         return
 
-    # 除錯：印出使用者的身分組
-    print(f"[除錯-換人] {ctx.author.display_name} 的身分組：{[role.name for role in ctx.author.roles]}")
-    print(f"[除錯-換人] 權限檢查結果：{has_authority(ctx.author)}")
+    # 除錯：印出使用者的身分組（只在 DEBUG 等級時才組出列表）
+    if discord_log.isEnabledFor(logging.DEBUG):
+        discord_log.debug("[換人] %s 的身分組：%s，權限檢查結果：%s", ctx.author.display_name,
+                          [role.name for role in ctx.author.roles], has_authority(ctx.author, line))
 
-    if not has_authority(ctx.author):
-        await ctx.send("⛔ 只有慕笙寶寶、管理員或保姆能使用這個指令！")
+    if not has_authority(ctx.author, line):
+        outbox.post(ctx.channel, "⛔ 只有慕笙寶寶、管理員或保姆能使用這個指令！")
         return
 
-    global queue
+    queue = line.queue
     if not queue:
-        await ctx.send("⚠️ 目前沒有人排隊")
+        outbox.post(ctx.channel, "⚠️ 目前沒有人排隊")
         return
 
-    # 分離訂閱與觀眾
-    subscribers = [m for m in queue if get_role_type(m) == "訂閱"]
-
-    # 組出這一輪的上場名單
-    new_round = []
-
-    # 1. 優先取最多2位訂閱（依排隊順序）
-    for member in queue:
-        if len(new_round) < 2 and member in subscribers:
-            new_round.append(member)
-
-    # 2. 再依原排隊順序補滿4位（不論身份）
-    for member in queue:
-        if member not in new_round:
-            new_round.append(member)
-        if len(new_round) >= MAX_PLAYERS:
-            break
+    # 依換人規則挑出本輪上場名單，並從排隊名單移除（包含排在後面被優先選上的訂閱者）
+    new_round = [entry for _, entry in line.rotation.rotate(queue, line.max_players)]
 
-    # 3. 移除前4位（已上場）
-    queue = queue[MAX_PLAYERS:] if len(queue) > MAX_PLAYERS else []
-
-    # 組出顯示訊息
-    msg = "🎮 **本輪上場：**\n"
-    for m in new_round:
-        role_type = get_role_type(m)
-        # 根據不同身分顯示不同圖示
-        if role_type == "訂閱":
-            icon = "🔴"
-        else:
-            icon = "⚪"
-        msg += f"{icon} {m.display_name}（{role_type}）\n"
+    # 組出顯示訊息（名稱與身分組在這時才查詢）
+    lines = ["🎮 **本輪上場：**"]
+    for entry in new_round:
+        icon, name, role_type = describe_member(entry, line)
+        lines.append(f"{icon} {name}（{role_type}）")
 
     if queue:
-        msg += "\n🕓 **下一輪候補：**\n"
-        msg += "、".join(m.display_name for m in queue)
+        # 候補只列出一頁，完整名單請看排隊看板
+        waiting = queue.head(line.board.page_size)
+        names = "、".join(describe_member(entry, line)[1] for entry in waiting)
+        if len(queue) > len(waiting):
+            names += f"⋯等 {len(queue)} 人"
+        lines += ["", "🕓 **下一輪候補：**", names]
     else:
-        msg += "\n📭 所有人都已上場完畢"
+        lines += ["", "📭 所有人都已上場完畢"]
 
-    await ctx.send(msg)
+    outbox.post(ctx.channel, "\n".join(lines))
+
+@bot.command(name="直播統計")
+async def 直播統計(ctx):
+    """查看這場（或上一場）直播的上車統計"""
+    line = get_line(ctx)
+    if line is None:
+        return
+
+    # 先寫入緩衝區中的紀錄，統計只讀每場直播與每小時的彙總表
+    await history.flush()
+    stats = await asyncio.to_thread(history.stream_stats, line.channel_id)
+    if not stats:
+        outbox.post(ctx.channel, "📭 還沒有直播的上車紀錄喔～")
+        return
+    stat = stats[0]
+    recent = await asyncio.to_thread(history.hourly, line.channel_id, time.time() - 86400)
+
+    started = datetime.fromtimestamp(stat["started"]).strftime("%m/%d %H:%M")
+    lines = [f"📊 **{'這場直播（進行中）' if stat['ended'] is None else '上一場直播'}**",
+             f"🕒 {started} 開始，共 {format_duration(stat['duration'])}",
+             f"🎮 換人 {stat['rounds']} 次"
+             + (f"（每小時 {stat['rounds_per_hour']:.1f} 次）" if stat["rounds_per_hour"] is not None else "")
+             + (f"，平均每輪 {format_duration(stat['avg_round'])}" if stat["avg_round"] is not None else ""),
+             f"🚗 上車 {stat['joins']} 人次，上場 {stat['players']} 人，中途跳車 {stat['leaves']} 人"]
+    if stat["avg_wait"] is not None:
+        lines.append(f"⏳ 平均等待 {format_duration(stat['avg_wait'])}，最久 {format_duration(stat['wait_max'])}")
+    if recent:
+        busiest = max(recent, key=lambda hour: hour["rounds"])
+        lines.append(f"📅 近 24 小時共換人 {sum(hour['rounds'] for hour in recent)} 次"
+                     f"（最多的一小時 {busiest['rounds']} 次）")
+    outbox.post(ctx.channel, "\n".join(lines))
 
 @bot.command(name="清除")
 async def 清除(ctx):
     """清除所有排隊名單"""
-    if not is_allowed_channel(ctx):
+    line = get_line(ctx)
+    if line is None:
         return
 
-    if not has_authority(ctx.author):
-        await ctx.send("⛔ 只有慕笙寶寶、管理員或保姆能清除名單")
+    if not has_authority(ctx.author, line):
+        outbox.post(ctx.channel, "⛔ 只有慕笙寶寶、管理員或保姆能清除名單")
         return
 
-    global queue
-    queue.clear()
-    await ctx.send("🧹 已清除所有排隊名單")
+    line.queue.clear()
+    outbox.post(ctx.channel, "🧹 已清除所有排隊名單")
 
 @bot.command(name="查身份")
 async def 查身份(ctx):
     """查看自己的所有身分組（除錯用）"""
-    if not is_allowed_channel(ctx):
+    line = get_line(ctx)
+    if line is None:
         return
 
     user = ctx.author
     roles = [role.name for role in user.roles]
-    role_type = get_role_type(user)
+    role_type = get_role_type(user, line)
 
     msg = f"🔍 **{user.display_name} 的身分資訊：**\n"
     msg += f"所有身分組：{', '.join(roles)}\n"
     msg += f"判定結果：{role_type}"
 
-    await ctx.send(msg)
-    print(f"[除錯] {user.display_name} 的身分組列表：{roles}")
+    outbox.post(ctx.channel, msg)
+    discord_log.debug("%s 的身分組列表：%s", user.display_name, roles)
 
 # ======================
 #  語音抽隊指令
 # ======================
 @bot.command(name="抽")
-async def 抽(ctx):
-    """從語音頻道隨機分組"""
-    if not is_allowed_channel(ctx):
+async def 抽(ctx, mode: str = ""):
+    """從語音頻道隨機分組（!抽 平衡：依評分分成實力最接近的兩隊）"""
+    line = get_line(ctx)
+    if line is None:
         return
 
-    if not has_authority(ctx.author):
-        await ctx.send("⛔ 只有慕笙寶寶、管理員或保姆能使用這個指令！")
+    if not has_authority(ctx.author, line):
+        outbox.post(ctx.channel, "⛔ 只有慕笙寶寶、管理員或保姆能使用這個指令！")
         return
 
-    print(f"[指令] 收到抽獎指令，來自 {ctx.author}")
+    discord_log.debug("收到抽獎指令，來自 %s", ctx.author)
 
     if ctx.author.voice and ctx.author.voice.channel:
         vc = ctx.author.voice.channel
-        members = [m.display_name for m in vc.members if not m.bot]
+        members = [m for m in vc.members if not m.bot]
 
         if len(members) < 2:
-            await ctx.send("⚠️ 語音裡人太少，無法分組")
+            outbox.post(ctx.channel, "⚠️ 語音裡人太少，無法分組")
             return
 
-        random.shuffle(members)
-        half = len(members) // 2
-        red = members[:half]
-        blue = members[half:]
         now = datetime.now().strftime("%Y/%m/%d %H:%M")
+        if mode in ("平衡", "balanced"):
+            member_ids = [m.id for m in members]
+            scores = ratings.get_many(ctx.guild.id, member_ids)
+            team_a, team_b = balance(scores, pair_history.hot_pairs(member_ids))
+            red = [members[i] for i in team_a]
+            blue = [members[i] for i in team_b]
+            msg = (f"🔥 LOL 平衡分組結果（{now}）\n"
+                   f"🔴 紅隊（總評分 {sum(scores[i] for i in team_a)}）：{', '.join(m.display_name for m in red)}\n"
+                   f"🔵 藍隊（總評分 {sum(scores[i] for i in team_b)}）：{', '.join(m.display_name for m in blue)}")
+        else:
+            random.shuffle(members)
+            half = len(members) // 2
+            red = members[:half]
+            blue = members[half:]
+            msg = (f"🔥 LOL 分組結果（{now}）\n"
+                   f"🔴 紅隊：{', '.join(m.display_name for m in red)}\n"
+                   f"🔵 藍隊：{', '.join(m.display_name for m in blue)}")
+
+        pair_history.record([m.id for m in red], [m.id for m in blue])
+        outbox.post(ctx.channel, msg)
+    else:
+        outbox.post(ctx.channel, "🎧 請先進入語音頻道再使用 !抽 指令")
+
+@bot.command(name="綁定")
+async def 綁定(ctx, twitch_login: str = ""):
+    """綁定 Twitch 帳號（!綁定 帳號，再到 Twitch 聊天室輸入 !綁定 確認；不帶參數時查看目前綁定）"""
+    line = get_line(ctx)
+    if line is None:
+        return
+
+    user = ctx.author
+    if not twitch_login:
+        login = identity.twitch_for(user.id)
+        if login is None:
+            outbox.post(ctx.channel, f"🔗 {user.display_name} 尚未綁定 Twitch 帳號，輸入 !綁定 <Twitch 帳號> 開始綁定")
+        else:
+            outbox.post(ctx.channel, f"🔗 {user.display_name} 已綁定 Twitch 帳號 **{login}**")
+        return
+
+    login = twitch_login.strip().lstrip("@").lower()
+    identity.request(user.id, login)
+    minutes = max(1, round(identity.ttl / 60))
+    outbox.post(ctx.channel, f"🔗 請在 {minutes} 分鐘內用 Twitch 帳號 **{login}** 在聊天室輸入 !綁定 完成綁定")
+
+@bot.command(name="解除綁定")
+async def 解除綁定(ctx):
+    """解除 Twitch 帳號綁定"""
+    line = get_line(ctx)
+    if line is None:
+        return
+
+    user = ctx.author
+    login = identity.unlink(user.id)
+    if login is None:
+        outbox.post(ctx.channel, f"❌ {user.display_name} 沒有綁定 Twitch 帳號")
+        return
+
+    await asyncio.to_thread(identity.save)
+    # 兩個帳號回到各自平台的層級
+    for line in registry:
+        for key in (("discord", user.id), ("twitch", login)):
+            entry = line.queue.get(key)
+            if entry is not None:
+                entry.link_id = None
+                line.queue.retier(key, get_tier(entry, line))
+                line.feed.publish("update", [(key, entry)])
+    outbox.post(ctx.channel, f"🔓 {user.display_name} 已解除綁定 Twitch 帳號 **{login}**")
+
+@bot.command(name="評分")
+async def 評分(ctx, member: Optional[discord.Member] = None, rating: int = None):
+    """查看或設定 !抽 平衡 使用的玩家評分（設定僅慕笙寶寶、管理員或保姆可用）"""
+    line = get_line(ctx)
+    if line is None:
+        return
+
+    target = member or ctx.author
+    if rating is None:
+        outbox.post(ctx.channel, f"📊 {target.display_name} 的評分：{ratings.get(ctx.guild.id, target.id)}")
+        return
+
+    if not has_authority(ctx.author, line):
+        outbox.post(ctx.channel, "⛔ 只有慕笙寶寶、管理員或保姆能設定評分！")
+        return
+
+    ratings.set(ctx.guild.id, target.id, rating)
+    await asyncio.to_thread(ratings.save)
+    outbox.post(ctx.channel, f"📊 已將 {target.display_name} 的評分設為 {rating}")
 
-        msg = (f"🔥 LOL 分組結果（{now}）\n"
-               f"🔴 紅隊：{', '.join(red)}\n"
-               f"🔵 藍隊：{', '.join(blue)}")
-        await ctx.send(msg)
+DIAG_HELP = "用法：!診斷、!診斷 慢回呼 開 [毫秒] / 關、!診斷 記憶體 [開 / 關]"
+
+def diagnostics_report():
+    """!診斷 的總覽：事件循環延遲、慢回呼、Task、各集合大小與記憶體追蹤狀態"""
+    lines = ["🩺 **診斷**",
+             f"⏱️ 事件循環延遲：目前 {loop_lag_monitor.last_lag * 1000:.1f} ms，"
+             f"最大 {loop_lag_monitor.max_lag * 1000:.1f} ms"]
+
+    threshold = f"{slow_callbacks.threshold * 1000:.0f} ms"
+    if not slow_callbacks.enabled and not slow_callbacks.total:
+        lines.append(f"🐢 慢回呼偵測：關閉（門檻 {threshold}）")
     else:
-        await ctx.send("🎧 請先進入語音頻道再使用 !抽 指令")
+        state = "開啟" if slow_callbacks.enabled else "關閉"
+        lines.append(f"🐢 慢回呼偵測：{state}（門檻 {threshold}），共 {slow_callbacks.total} 次")
+        lines += [f"　• {name[:80]} ×{count}" for name, count in slow_callbacks.counts.most_common(5)]
+        if slow_callbacks.recent:
+            when, name, elapsed = slow_callbacks.recent[-1]
+            lines.append(f"　最近一次：{datetime.fromtimestamp(when):%H:%M:%S} {name[:80]}（{elapsed * 1000:.0f} ms）")
+
+    tasks = task_summary()
+    lines.append(f"🧵 Task：{sum(count for _, count in tasks)} 個")
+    lines += [f"　• {name[:80]} ×{count}" for name, count in tasks[:8]]
+
+    lines.append("📦 大小：")
+    lines += [f"　• 排隊名單 {line.name}：{len(line.queue)} 人（疊加畫面 {line.feed.clients} 個）" for line in registry]
+    lines += [f"　• processed_messages：{len(processed_messages)}/{processed_messages.maxsize}",
+              f"　• twitch_processed_users：{len(twitch_processed_users)}/{twitch_processed_users.maxsize}",
+              f"　• Twitch 指令緩衝區：{twitch_ingest.backlog}，待送訊息：{outbox.backlog}，"
+              f"待寫入歷史：{history.pending}"]
+    if LOW_MEMORY:
+        lines.append(f"　• 成員 LRU：{len(members)}/{members.maxsize}")
+
+    lines.append(f"🧠 記憶體追蹤：{'開啟（!診斷 記憶體 查看）' if memory_tracer.tracing else '關閉'}")
+    return "\n".join(lines)
+
+async def memory_report(limit=10):
+    """tracemalloc 快照中配置最多的程式位置（快照在執行緒池中取得）"""
+    result = await asyncio.to_thread(memory_tracer.top, limit)
+    if result is None:
+        return "🧠 記憶體追蹤沒有開啟，請先輸入 !診斷 記憶體 開（追蹤期間所有配置都會變慢）"
+    total, rows = result
+    lines = [f"🧠 **記憶體配置**（追蹤開始後，共 {total / 1024:.0f} KiB）"]
+    for where, size, count in rows:
+        # 只顯示最後兩層路徑，避免訊息太長
+        where = "/".join(Path(where).parts[-2:])
+        lines.append(f"　• {where}：{size / 1024:.1f} KiB（{count} 個）")
+    return "\n".join(lines)
+
+@bot.command(name="診斷")
+async def 診斷(ctx, section: str = "", action: str = "", value: float = None):
+    """查看 Bot 的執行狀態，開關慢回呼偵測與記憶體追蹤（僅慕笙寶寶、管理員或保姆可用）"""
+    line = get_line(ctx)
+    if line is None:
+        return
+
+    if not has_authority(ctx.author, line):
+        outbox.post(ctx.channel, "⛔ 只有慕笙寶寶、管理員或保姆能查看診斷資訊！")
+        return
+
+    if not section:
+        outbox.post(ctx.channel, diagnostics_report())
+    elif section == "慢回呼" and action == "開":
+        slow_callbacks.clear()
+        slow_callbacks.enable(value / 1000 if value else None)
+        outbox.post(ctx.channel, f"🐢 慢回呼偵測已開啟（門檻 {slow_callbacks.threshold * 1000:.0f} ms）")
+    elif section == "慢回呼" and action == "關":
+        slow_callbacks.disable()
+        outbox.post(ctx.channel, "🐢 慢回呼偵測已關閉")
+    elif section == "記憶體" and action == "開":
+        memory_tracer.start()
+        outbox.post(ctx.channel, "🧠 記憶體追蹤已開啟，之後的配置才會被記錄；輸入 !診斷 記憶體 查看")
+    elif section == "記憶體" and action == "關":
+        memory_tracer.stop()
+        outbox.post(ctx.channel, "🧠 記憶體追蹤已關閉")
+    elif section == "記憶體":
+        outbox.post(ctx.channel, await memory_report())
+    else:
+        outbox.post(ctx.channel, DIAG_HELP)
+    log.info("%s 執行了 !診斷 %s %s", ctx.author.display_name, section, action)
+
+# ======================
+#  指令分派表
+# ======================
+# 由上面註冊的 Discord 指令與 Twitch 支援的指令建立，之後每則訊息只查表一次
+command_table = CommandTable(prefix=bot.command_prefix)
+for command in bot.commands:
+    command_table.add(command.name, [DISCORD], aliases=command.aliases)
+for name in TWITCH_OPS:
+    command_table.add(name, [TWITCH])
+
+# 停用的指令（以逗號分隔，例如 DISABLED_COMMANDS=抽,查身份）
+for name in os.getenv("DISABLED_COMMANDS", "").split(","):
+    name = name.strip()
+    if name and not command_table.set_enabled(name, False):
+        log.warning("DISABLED_COMMANDS 中的指令 %s 不存在", name)
 
 # ======================
 #  啟動程式
 # ======================
-if __name__ == "__main__":
-    print("[系統] 正在啟動 LOL 上車系統 Bot...")
+async def load_journals(journal_tasks):
+    """在執行緒池中讀取各頻道上次的排隊狀態（不延遲 Discord 登入），讀完後啟動日誌寫入工作"""
+    try:
+        try:
+            await asyncio.to_thread(history.load)
+        except Exception:
+            # 排隊歷史只用於統計，讀不到時停止記錄，仍要還原各頻道的排隊名單
+            history.enabled = False
+            log.exception("排隊歷史讀取失敗，停止記錄")
+        # 舊版的日誌放在 STATE_DIR 下，搬到預設頻道（沒有預設頻道時為第一個頻道）
+        default_line = registry.for_channel(ALLOWED_CHANNEL_ID) or next(iter(registry), None)
+        if default_line is not None:
+            try:
+                await asyncio.to_thread(migrate_legacy_journal, STATE_DIR, default_line)
+            except OSError:
+                log.exception("無法搬移舊的排隊日誌到 %s", default_line.name)
+        for line in registry:
+            try:
+                line.restored_state = await asyncio.to_thread(line.journal.load)
+            except Exception:
+                # 讀不到的頻道以空的名單開始，還原後會寫一份新的快照取代損壞的檔案
+                log.exception("%s 的排隊日誌讀取失敗，以空的名單開始", line.name)
+                line.restored_state = {"enabled": False, "entries": []}
+            journal_tasks.append(asyncio.create_task(line.journal.run()))
+        boot.mark("journal")
+        log.info("共 %d 個上車頻道", len(registry))
+    finally:
+        # 即使讀取失敗也要放行，否則 on_ready 會一直等待
+        journals_loaded.set()
+
+def discord_retry_after(error):
+    """Discord 回傳 429 時要求等待的秒數"""
+    if isinstance(error, discord.HTTPException) and error.status == 429:
+        return float(error.response.headers.get("Retry-After", 0))
+    return None
+
+async def connect_discord(token):
+    """登入並連線到 Discord Gateway，直到連線結束
+
+    discord.py 的 connect(reconnect=True) 在斷線時會先嘗試恢復 session，
+    只有無法恢復時才會拋出例外，交給監督退避後重新呼叫這裡。
+    """
+    if bot.is_closed():
+        # 上次的連線被關閉（例如無法恢復的關閉代碼），重設狀態後重新登入
+        bot.clear()
+    if bot.user is None:
+        await bot.login(token)  # 登入失敗或重設狀態後才需要重新登入
+
+    # 每天能建立的 session 有上限，用完時等到重置再 identify
+    _, _, limit = await bot.http.get_bot_gateway()
+    delay = session_start_delay(limit)
+    if delay:
+        discord_log.warning("今日的 Gateway session 次數已用完，%.0f 秒後再連線", delay)
+        await asyncio.sleep(delay)
+    elif limit["remaining"] < limit["total"] // 10:
+        discord_log.warning("Gateway session 次數剩餘 %d/%d", limit["remaining"], limit["total"])
+
+    await bot.connect(reconnect=True)
+
+async def main():
+    """在同一個事件循環中執行 Discord 與 Twitch Bot"""
+    boot.mark("import")
+    token = os.getenv("DISCORD_TOKEN")
+    if not token:
+        log.error("找不到 DISCORD_TOKEN 環境變數！")
+        return
 
-    # 在背景啟動網頁伺服器
-    web_thread = Thread(target=run_web_server, daemon=True)
-    web_thread.start()
+    # 先啟動網頁伺服器，讓平台的端口檢測盡快通過
+    web_runner = await start_web_server()
+    boot.mark("web")
+
+    # 排隊狀態在背景讀取（成員在 Discord 連線後才還原），不等待讀取完成就開始登入
+    journal_tasks = []
+    load_task = asyncio.create_task(load_journals(journal_tasks))
+
+    # Twitch Bot 與 Discord Bot 共用同一個事件循環，排隊狀態只有一個擁有者
+    twitch_task = asyncio.create_task(run_twitch_bot())
+    ingest_task = asyncio.create_task(twitch_ingest.run())
+    sweeper_task = asyncio.create_task(sweeper.run())
+    lag_task = asyncio.create_task(loop_lag_monitor.run())
+    history_task = asyncio.create_task(history.run())
+    members_task = asyncio.create_task(members.run())
+    if os.getenv("DIAG_SLOW_CALLBACKS", "0") == "1":
+        slow_callbacks.enable()
+
+    # 啟動 Discord Bot（由監督負責重新連線；驗證失敗等錯誤不重試）
+    discord_log.info("正在連接到 Discord Gateway...")
+    discord_connection = supervisor.watch(
+        "discord", lambda: connect_discord(token),
+        fatal=(discord.LoginFailure, discord.PrivilegedIntentsRequired),
+        retry_after=discord_retry_after,
+    )
 
-    # 在背景啟動 Twitch Bot
-    twitch_thread = Thread(target=run_twitch_in_thread, daemon=True)
-    twitch_thread.start()
+    try:
+        await discord_connection.run()
+    finally:
+        load_task.cancel()
+        twitch_task.cancel()
+        ingest_task.cancel()
+        sweeper_task.cancel()
+        lag_task.cancel()
+        history_task.cancel()
+        members_task.cancel()
+        slow_callbacks.disable()
+        for line in registry:
+            line.feed.close()
+        # 等被取消的寫入工作結束後才做最後一次寫入，避免兩次寫入同時進行
+        for line, task in zip(registry, journal_tasks):
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await line.journal.flush()
+        await asyncio.gather(history_task, return_exceptions=True)
+        await history.flush()
+        history.close()
+        if twitch_bot:
+            await twitch_bot.close()
+        if not bot.is_closed():
+            await bot.close()
+        await web_runner.cleanup()
 
-    import time
-    time.sleep(2)  # 等待 Flask 和 Twitch 啟動
+if __name__ == "__main__":
+    setup_logging()
+    log.info("正在啟動 LOL 上車系統 Bot...")
 
-    # 啟動 Discord Bot（帶重試機制）
-    print("[Discord] 正在連接到 Discord Gateway...")
-    token = os.getenv("DISCORD_TOKEN")
-    if not token:
-        print("[錯誤] 找不到 DISCORD_TOKEN 環境變數！")
-    else:
-        max_retries = 5
-        retry_delay = 60  # 等待 60 秒後重試
+    import sys
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-        for attempt in range(max_retries):
-            try:
-                print(f"[Discord] 嘗試連接 (第 {attempt + 1}/{max_retries} 次)...")
-                bot.run(token)
-                break  # 如果成功連接，跳出循環
-            except discord.errors.HTTPException as e:
-                if "429" in str(e) or "rate limit" in str(e).lower():
-                    print(f"[警告] 遇到 Rate Limit 錯誤！")
-                    if attempt < max_retries - 1:
-                        print(f"[系統] 等待 {retry_delay} 秒後重試...")
-                        time.sleep(retry_delay)
-                        retry_delay *= 2  # 指數退避：每次等待時間加倍
-                    else:
-                        print("[錯誤] 已達到最大重試次數，放棄連接")
-                        raise
-                else:
-                    print(f"[錯誤] Discord HTTP 錯誤：{e}")
-                    raise
-            except Exception as e:
-                print(f"[錯誤] 啟動 Bot 時發生錯誤：{e}")
-                raise
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        log.info("Bot 已停止")
@@ -0,0 +1,119 @@
+"""低記憶體模式的成員查詢
+
+低記憶體模式（LOW_MEMORY=1）下 discord.py 不再快取所有伺服器成員，
+guild.get_member() 只找得到語音頻道中的成員。需要其他成員時：
+- 下指令、上車的成員放進一個有上限的 LRU（之後查綁定帳號等不需要再查詢）
+- 還原排隊名單時，找不到的成員以 Gateway 的 query_members 一次查 100 人，
+  不會逐一發 HTTP 請求
+- 沒被快取的成員改身分組不會觸發 on_member_update，所以 LRU 中的成員在 ttl 秒後
+  過期：過期時從 LRU 移除，並由背景工作批次重新查詢，查到後交給 on_refresh
+"""
+import asyncio
+import time
+from collections import OrderedDict
+
+import discord
+
+from botlog import get_logger
+from storage import FlushLoop
+
+log = get_logger("discord.members")
+
+QUERY_CHUNK = 100  # query_members 一次最多查詢 100 人
+
+
+class MemberLRU:
+    """伺服器成員快取之外，最近用到的成員（maxsize 為 0 時不記錄）"""
+
+    def __init__(self, maxsize=256, ttl=None, on_refresh=None, window=1.0):
+        self.maxsize = maxsize
+        self.ttl = ttl                # 成員資料的有效秒數（None 表示不過期）
+        self.on_refresh = on_refresh  # on_refresh(Member)：過期的成員重新查詢後呼叫
+        self._members = OrderedDict()  # (伺服器 ID, 成員 ID) -> (Member, 過期時間)
+        self._stale = {}               # 伺服器 ID -> (Guild, {待重新查詢的成員 ID})
+        self._refresher = FlushLoop(self.refresh, window)  # 收集一批過期成員後再查詢
+
+        # 統計數據
+        self.hits = 0     # 在 LRU 中找到的次數
+        self.misses = 0   # 伺服器快取與 LRU 都找不到的次數
+        self.queried = 0  # 透過 query_members 查到的成員數
+        self.expired = 0  # 過期而重新查詢的成員數
+
+    def __len__(self):
+        return len(self._members)
+
+    def get(self, guild, member_id):
+        """先查 discord.py 的成員快取，再查 LRU（都沒有時回傳 None）"""
+        member = guild.get_member(member_id)
+        if member is not None:
+            return member
+        key = (guild.id, member_id)
+        cached = self._members.get(key)
+        if cached is not None and cached[1] is not None and cached[1] <= time.monotonic():
+            # 身分組可能已經改變：不再使用舊資料，排入重新查詢
+            del self._members[key]
+            self._stale.setdefault(guild.id, (guild, set()))[1].add(member_id)
+            self.expired += 1
+            self._refresher.wake()
+            cached = None
+        if cached is None:
+            self.misses += 1
+            return None
+        self._members.move_to_end(key)
+        self.hits += 1
+        return cached[0]
+
+    def remember(self, member):
+        if not self.maxsize or getattr(member, "guild", None) is None:
+            return
+        key = (member.guild.id, member.id)
+        self._members[key] = (member, time.monotonic() + self.ttl if self.ttl else None)
+        self._members.move_to_end(key)
+        if len(self._members) > self.maxsize:
+            self._members.popitem(last=False)
+
+    def discard(self, guild_id, member_id):
+        self._members.pop((guild_id, member_id), None)
+
+    async def fetch_many(self, guild, member_ids):
+        """查詢多位成員，回傳 ({成員 ID: Member}, {查詢失敗的成員 ID})
+
+        查詢成功但結果中沒有的成員已不在伺服器中，兩者都不會出現；
+        查詢逾時或失敗的成員放在第二個集合，無法判斷是否還在伺服器。
+        """
+        found = {}
+        failed = set()
+        missing = []
+        for member_id in member_ids:
+            member = self.get(guild, member_id)
+            if member is not None:
+                found[member_id] = member
+            else:
+                missing.append(member_id)
+
+        for start in range(0, len(missing), QUERY_CHUNK):
+            chunk = missing[start:start + QUERY_CHUNK]
+            try:
+                result = await guild.query_members(user_ids=chunk, limit=len(chunk), cache=False)
+            except (asyncio.TimeoutError, discord.ClientException) as e:
+                log.warning("查詢 %d 位成員失敗：%s", len(chunk), e)
+                failed.update(chunk)
+                continue
+            self.queried += len(result)
+            for member in result:
+                found[member.id] = member
+                self.remember(member)
+        return found, failed
+
+    async def run(self):
+        """背景工作：批次重新查詢過期的成員"""
+        await self._refresher.run()
+
+    async def refresh(self):
+        """重新查詢過期的成員，查到的成員放回 LRU 並交給 on_refresh"""
+        stale, self._stale = self._stale, {}
+        for guild, member_ids in stale.values():
+            found, _ = await self.fetch_many(guild, list(member_ids))
+            if self.on_refresh is not None:
+                for member in found.values():
+                    self.on_refresh(member)
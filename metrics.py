@@ -0,0 +1,169 @@
+"""Prometheus 格式的效能指標
+
+記錄端只做整數加法與 bisect（指標只會在事件循環中被修改，不需要鎖），
+直方圖的 bucket 事先分好；佇列長度、訊息積壓等數值則在被讀取（/metrics）
+時才透過回呼函數計算，平常完全沒有成本。
+"""
+import asyncio
+import time
+from bisect import bisect_left
+
+# Prometheus 文字格式的 Content-Type
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 預設的延遲 bucket（秒）
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _label_pairs(label, label_value):
+    """標籤名稱可以是單一字串，或與標籤值 tuple 對應的名稱 tuple"""
+    if not label:
+        return []
+    if isinstance(label, tuple):
+        return list(zip(label, label_value))
+    return [(label, label_value)]
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """只增不減的計數器，可帶一個標籤"""
+
+    def __init__(self, name, help_text, label=None):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self._values = {}
+
+    def inc(self, label_value=None, amount=1):
+        self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def value(self, label_value=None):
+        return self._values.get(label_value, 0)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for label_value, value in list(self._values.items()):
+            labels = _label_pairs(self.label, label_value)
+            yield f"{self.name}{_format_labels(labels)} {_format_value(value)}"
+
+
+class Histogram:
+    """事先分好 bucket 的直方圖，可帶一個標籤"""
+
+    def __init__(self, name, help_text, label=None, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series = {}  # 標籤值 -> [各 bucket 次數..., 總和, 次數]
+
+    def observe(self, value, label_value=None):
+        series = self._series.get(label_value)
+        if series is None:
+            series = self._series[label_value] = [0] * (len(self.buckets) + 3)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for label_value, series in list(self._series.items()):
+            series = list(series)
+            base = _label_pairs(self.label, label_value)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                labels = base + [("le", _format_value(float(bound)))]
+                yield f"{self.name}_bucket{_format_labels(labels)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(base)} {_format_value(series[-2])}"
+            yield f"{self.name}_count{_format_labels(base)} {series[-1]}"
+
+
+class CallbackMetric:
+    """讀取時才透過回呼函數取值的指標
+
+    fn() 回傳單一數值，或 {標籤值: 數值} 的 dict（多個標籤時標籤值為 tuple）。
+    """
+
+    def __init__(self, name, help_text, fn, label=None, metric_type="gauge"):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        self.label = label
+        self.type = metric_type
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.type}"
+        values = self.fn()
+        if not isinstance(values, dict):
+            values = {None: values}
+        for label_value, value in values.items():
+            labels = _label_pairs(self.label, label_value)
+            yield f"{self.name}{_format_labels(labels)} {_format_value(value)}"
+
+
+class Registry:
+    """所有指標的集合"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def callback(self, *args, **kwargs):
+        return self.register(CallbackMetric(*args, **kwargs))
+
+    def render(self):
+        """輸出 Prometheus text format"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class LoopLagMonitor:
+    """量測事件循環延遲：定期 sleep，實際醒來時間與預期的差距就是延遲"""
+
+    def __init__(self, histogram, label_value, interval=0.5):
+        self.histogram = histogram
+        self.label_value = label_value
+        self.interval = interval
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    async def run(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - expected)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self.histogram.observe(lag, self.label_value)
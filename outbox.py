@@ -0,0 +1,166 @@
+"""對外訊息發送佇列
+
+所有送往 Discord 頻道的訊息都先放進各頻道的佇列，由每個頻道一個的
+背景工作依序送出：
+- 短時間內的多則公告會合併成一則（不超過 Discord 2000 字上限）
+- 在本地追蹤每個頻道的速率限制（token bucket），等待期間累積的訊息
+  會在下一次發送時一起合併，避免大量 !上車 時觸發 429
+"""
+import asyncio
+import time
+from collections import deque
+
+from botlog import get_logger
+
+log = get_logger("discord.outbox")
+
+MESSAGE_LIMIT = 2000  # Discord 單則訊息字數上限
+
+
+def split_message(content, limit=MESSAGE_LIMIT):
+    """將過長的訊息依換行切成多段，每段不超過 limit 字"""
+    if len(content) <= limit:
+        return [content]
+
+    chunks = []
+    current = ""
+    for line in content.split("\n"):
+        # 單行本身就超過上限時硬切
+        while len(line) > limit:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if not current:
+            current = line
+        elif len(current) + 1 + len(line) <= limit:
+            current += "\n" + line
+        else:
+            chunks.append(current)
+            current = line
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class RateBucket:
+    """每個頻道的速率限制：每 per 秒最多 rate 則訊息"""
+
+    __slots__ = ("rate", "per", "tokens", "updated")
+
+    def __init__(self, rate, per):
+        self.rate = rate
+        self.per = per
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+
+    def reserve(self):
+        """取用一個額度，回傳需要等待的秒數（0 表示可立即發送）"""
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate / self.per)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens * self.per / self.rate
+
+
+class Outbox:
+    """合併、限速後送出頻道訊息"""
+
+    def __init__(self, window=1.5, rate=5, per=5.0, limit=MESSAGE_LIMIT):
+        self.window = window  # 公告合併的等待時間（秒）
+        self.rate = rate
+        self.per = per
+        self.limit = limit
+        self._pending = {}   # 頻道 ID -> deque[(內容, 是否等待合併)]
+        self._workers = {}   # 頻道 ID -> 背景發送工作
+        self._buckets = {}   # 頻道 ID -> RateBucket
+
+        # 統計數據
+        self.sent = 0               # 實際送出的訊息數
+        self.posted = 0             # 收到的訊息數
+        self.rate_limit_waits = 0   # 因速率限制而等待的次數
+        self.rate_limit_wait_seconds = 0.0
+
+    @property
+    def backlog(self):
+        """尚未送出的訊息數"""
+        return sum(len(p) for p in self._pending.values())
+
+    def post(self, channel, content, coalesce=False):
+        """將訊息排入頻道佇列（不等待送出）
+
+        coalesce=True 時會先等待 window 秒，讓同時間的公告合併成一則。
+        """
+        if not content:
+            return
+        pending = self._pending.get(channel.id)
+        if pending is None:
+            pending = self._pending[channel.id] = deque()
+        for chunk in split_message(content, self.limit):
+            pending.append((chunk, coalesce))
+        self.posted += 1
+
+        if channel.id not in self._workers:
+            self._workers[channel.id] = asyncio.get_running_loop().create_task(self._drain(channel))
+
+    async def send_now(self, channel, content, **kwargs):
+        """立即發送一則訊息並回傳 Message（仍遵守頻道速率限制，不合併）"""
+        wait = self._bucket(channel.id).reserve()
+        if wait > 0:
+            self.rate_limit_waits += 1
+            self.rate_limit_wait_seconds += wait
+            await asyncio.sleep(wait)
+        message = await channel.send(content, **kwargs)
+        self.sent += 1
+        return message
+
+    async def flush(self):
+        """等待所有頻道的訊息送出"""
+        while self._workers:
+            await asyncio.gather(*list(self._workers.values()), return_exceptions=True)
+
+    def _bucket(self, channel_id):
+        bucket = self._buckets.get(channel_id)
+        if bucket is None:
+            bucket = self._buckets[channel_id] = RateBucket(self.rate, self.per)
+        return bucket
+
+    def _take(self, pending):
+        """從佇列前端取出可以合併成一則的訊息"""
+        content, _ = pending.popleft()
+        while pending:
+            nxt = pending[0][0]
+            if len(content) + 1 + len(nxt) > self.limit:
+                break
+            content += "\n" + nxt
+            pending.popleft()
+        return content
+
+    async def _drain(self, channel):
+        channel_id = channel.id
+        pending = self._pending[channel_id]
+        bucket = self._bucket(channel_id)
+        try:
+            while pending:
+                if pending[0][1] and self.window > 0:
+                    await asyncio.sleep(self.window)
+
+                wait = bucket.reserve()
+                if wait > 0:
+                    self.rate_limit_waits += 1
+                    self.rate_limit_wait_seconds += wait
+                    await asyncio.sleep(wait)
+
+                content = self._take(pending)
+                try:
+                    await channel.send(content)
+                    self.sent += 1
+                except Exception as e:
+                    log.error("發送訊息到頻道 %s 失敗 - %s", channel_id, e)
+        finally:
+            del self._workers[channel_id]
+            if not pending:
+                del self._pending[channel_id]
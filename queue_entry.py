@@ -0,0 +1,61 @@
+"""排隊名單中的一位成員
+
+名單原本直接存 discord.Member 與 TwitchUser 物件：Member 會連帶引用伺服器狀態，
+身分組變更後也不會更新。QueueEntry 只記錄穩定的 ID 與排隊時需要的資料，
+兩個平台共用；顯示名稱與身分組在渲染時才從 Discord 的快取查詢。
+"""
+import time
+
+from rotation import TIER_FOLLOWER, TIER_TWITCH_SUB, TIER_VIEWER, TIERS
+
+DISCORD = "discord"
+TWITCH = "twitch"
+
+
+def twitch_tier(is_subscriber, is_follower):
+    """Twitch 觀眾的身份層級"""
+    if is_subscriber:
+        return TIER_TWITCH_SUB
+    if is_follower:
+        return TIER_FOLLOWER
+    return TIER_VIEWER
+
+
+class QueueEntry:
+    """排隊中的一位成員（Discord 成員或 Twitch 觀眾）"""
+
+    __slots__ = ("platform", "uid", "name", "tier", "joined_at", "link_id")
+
+    def __init__(self, platform, uid, name, tier=TIER_VIEWER, joined_at=None, link_id=None):
+        self.platform = platform  # "discord" / "twitch"
+        self.uid = uid            # Discord 成員 ID / Twitch 帳號
+        self.name = name          # 上車時的顯示名稱（查不到成員時使用）
+        self.tier = tier          # 在自己平台上的身份層級（換人時會再與綁定的帳號合併）
+        self.joined_at = time.time() if joined_at is None else joined_at
+        self.link_id = link_id    # 綁定的另一個平台的 ID（沒有綁定時為 None）
+
+    @property
+    def key(self):
+        return (self.platform, self.uid)
+
+    @property
+    def is_twitch(self):
+        return self.platform == TWITCH
+
+    def to_dict(self):
+        """寫入日誌用的 dict"""
+        data = {"key": [self.platform, self.uid], "name": self.name, "tier": self.tier,
+                "joined_at": self.joined_at}
+        if self.link_id is not None:
+            data["link_id"] = self.link_id
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        platform, uid = data["key"]
+        tier = data.get("tier")
+        if tier not in TIERS:
+            # 舊版日誌：Twitch 觀眾只記錄訂閱 / 追隨狀態，Discord 成員沒有層級
+            tier = twitch_tier(data.get("is_subscriber"), data.get("is_follower")) if platform == TWITCH else TIER_VIEWER
+        return cls(platform, uid, data.get("name", str(uid)), tier,
+                   joined_at=data.get("joined_at"), link_id=data.get("link_id"))
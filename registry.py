@@ -0,0 +1,180 @@
+"""多頻道上車系統
+
+每個 Discord 頻道（可連結一個 Twitch 頻道）各自擁有獨立的排隊名單、開關、
+設定、看板與日誌，由 LineRegistry 以頻道 ID / Twitch 頻道名稱做 O(1) 查詢。
+
+設定來源（依序）：
+1. 環境變數 QUEUE_LINES（JSON）
+2. 環境變數 QUEUE_LINES_FILE 指定的檔案（預設為 lines.json）
+3. 都沒有時使用單一頻道的預設設定
+
+JSON 格式為列表，每個元素例如：
+    {"channel_id": 123, "twitch_channel": "m0623lalala", "max_players": 4,
+     "authorized_roles": ["保姆"], "authority_keywords": ["管理"], "rotation_quotas": "discord_sub:2"}
+
+改為每個頻道一個子目錄之前，日誌直接放在狀態目錄下；migrate_legacy_journal
+會在第一次啟動時把舊檔案搬到預設頻道的目錄。
+"""
+import json
+import os
+from pathlib import Path
+
+from board import QueueBoard
+from botlog import get_logger
+from feed import QueueFeed
+from journal import QueueJournal
+from ride_queue import RideQueue
+from role_cache import RoleClassifier
+from rotation import RotationEngine, RotationPolicy
+
+log = get_logger("queue")
+
+
+class LineSettings:
+    """單一上車頻道的設定"""
+
+    def __init__(self, channel_id, twitch_channel=None, guild_id=None, name=None,
+                 max_players=4, authorized_roles=(), authority_keywords=(), rotation_quotas="discord_sub:2",
+                 rotation_max_consecutive=0, rotation_cooldown=0):
+        self.channel_id = int(channel_id)
+        self.twitch_channel = twitch_channel.lower() if twitch_channel else None
+        self.guild_id = int(guild_id) if guild_id else None
+        self.name = name or str(channel_id)
+        self.max_players = int(max_players)
+        self.authorized_roles = list(authorized_roles)
+        # 身分組名稱包含任一關鍵字也視為有權限
+        self.authority_keywords = list(authority_keywords)
+        self.rotation_quotas = rotation_quotas
+        self.rotation_max_consecutive = int(rotation_max_consecutive)
+        self.rotation_cooldown = int(rotation_cooldown)
+
+    @classmethod
+    def from_dict(cls, data, defaults):
+        merged = dict(defaults)
+        merged.update(data)
+        return cls(**merged)
+
+
+class QueueLine:
+    """一個頻道的上車系統"""
+
+    def __init__(self, settings, outbox, describe, state_dir, board_page_size=20,
+                 board_debounce=2.0, snapshot_every=500, role_cache_size=None, role_cache_ttl=None):
+        self.settings = settings
+        self.channel_id = settings.channel_id
+        self.guild_id = settings.guild_id
+        self.twitch_channel = settings.twitch_channel
+        self.max_players = settings.max_players
+
+        self.queue = RideQueue()
+        self._enabled = False  # 上車系統開關（預設關閉）
+        self.describe = describe
+        self.classifier = RoleClassifier(settings.authorized_roles, settings.authority_keywords, maxsize=role_cache_size, ttl=role_cache_ttl)
+        self.rotation = RotationEngine(RotationPolicy(
+            quotas=RotationPolicy.parse_quotas(settings.rotation_quotas),
+            max_consecutive=settings.rotation_max_consecutive,
+            cooldown=settings.rotation_cooldown,
+        ))
+        self.board = QueueBoard(
+            self.queue, outbox, lambda member: describe(member, self),
+            is_enabled=lambda: self.enabled,
+            max_players=self.max_players,
+            page_size=board_page_size,
+            debounce=board_debounce,
+            stamp=lambda entry: (entry.name, entry.tier, self.classifier.generation),
+        )
+        self.feed = QueueFeed(self.queue, self._feed_entry, self._feed_state)
+        self.journal = QueueJournal(Path(state_dir) / str(self.channel_id), snapshot_every=snapshot_every)
+        self.restored_state = None  # 啟動時讀取的狀態，等 Discord 連線後才能還原成員
+
+    @property
+    def name(self):
+        return self.settings.name
+
+    @property
+    def enabled(self):
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, value):
+        self._enabled = value
+        self.feed.publish("open" if value else "close")
+
+    def has_authority(self, member):
+        return self.classifier.has_authority(member)
+
+    def _feed_entry(self, key, member):
+        """疊加畫面 API 中的一位成員"""
+        platform, uid = key
+        icon, name, role_type = self.describe(member, self)
+        return {"id": f"{platform}:{uid}", "platform": platform, "name": name,
+                "icon": icon, "role": role_type}
+
+    def _feed_state(self):
+        return {"line": self.name, "enabled": self._enabled, "max_players": self.max_players}
+
+
+class LineRegistry:
+    """以 Discord 頻道 / Twitch 頻道查詢上車系統"""
+
+    def __init__(self):
+        self._by_channel = {}
+        self._by_twitch = {}
+
+    def __iter__(self):
+        return iter(self._by_channel.values())
+
+    def __len__(self):
+        return len(self._by_channel)
+
+    def add(self, line):
+        if line.channel_id in self._by_channel:
+            raise ValueError(f"頻道 {line.channel_id} 重複設定")
+        self._by_channel[line.channel_id] = line
+        if line.twitch_channel:
+            self._by_twitch[line.twitch_channel] = line
+        return line
+
+    def for_channel(self, channel_id):
+        return self._by_channel.get(channel_id)
+
+    def for_twitch(self, twitch_channel):
+        return self._by_twitch.get(twitch_channel.lower()) if twitch_channel else None
+
+    def for_guild(self, guild_id):
+        return [line for line in self._by_channel.values() if line.guild_id == guild_id]
+
+    def twitch_channels(self):
+        return list(self._by_twitch)
+
+
+def load_line_settings(defaults):
+    """讀取所有上車頻道的設定（見模組說明），defaults 為預設頻道的設定值"""
+    raw = os.getenv("QUEUE_LINES")
+    if not raw:
+        path = Path(os.getenv("QUEUE_LINES_FILE", str(Path(__file__).parent / "lines.json")))
+        if path.exists():
+            raw = path.read_text(encoding="utf-8")
+    if not raw:
+        return [LineSettings(**defaults)]
+
+    shared = {k: v for k, v in defaults.items() if k not in ("channel_id", "twitch_channel", "guild_id", "name")}
+    return [LineSettings.from_dict(item, shared) for item in json.loads(raw)]
+
+
+def migrate_legacy_journal(state_dir, line):
+    """把舊版放在狀態目錄下的快照與日誌搬到 line 的日誌目錄（目標已有檔案時不動）
+
+    會做檔案 I/O，請在執行緒池中呼叫。回傳是否有搬移。
+    """
+    state_dir = Path(state_dir)
+    target = line.journal.directory
+    names = (QueueJournal.SNAPSHOT_FILE, QueueJournal.JOURNAL_FILE)
+    legacy = [name for name in names if (state_dir / name).exists()]
+    if not legacy or any((target / name).exists() for name in names):
+        return False
+    target.mkdir(parents=True, exist_ok=True)
+    for name in legacy:
+        os.replace(state_dir / name, target / name)
+    log.info("已將舊的排隊日誌搬到頻道 %s（%s）", line.name, target)
+    return True
@@ -0,0 +1,317 @@
+"""排隊名單資料結構
+
+依照上車順序（FIFO）保存名單，同時以 key（Discord 成員 ID / Twitch 帳號）
+建立索引，並用 Fenwick tree 維護名次，讓「是否在排隊」、「排第幾位」、
+「中途跳車」、「取出前 N 位」都不必掃描整個名單。
+
+每位成員可以帶有一個身份層級（tier），每個層級另外維護一條依上車順序
+排列的子佇列，讓換人時可以直接取出某個層級最前面的幾位。
+"""
+from bisect import insort
+from collections import deque
+
+
+class _Fenwick:
+    """計數用 Fenwick tree（內部 1-based）"""
+
+    __slots__ = ("size", "tree")
+
+    def __init__(self, flags):
+        # 以 O(n) 由 0/1 旗標建樹
+        self.size = len(flags)
+        tree = [0] + list(flags)
+        for i in range(1, self.size + 1):
+            parent = i + (i & -i)
+            if parent <= self.size:
+                tree[parent] += tree[i]
+        self.tree = tree
+
+    def add(self, index, delta):
+        """在第 index 格（0-based）加上 delta"""
+        i = index + 1
+        tree = self.tree
+        while i <= self.size:
+            tree[i] += delta
+            i += i & -i
+
+    def prefix(self, index):
+        """回傳第 0 ~ index 格（含）的總和"""
+        i = index + 1
+        total = 0
+        tree = self.tree
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def find(self, rank):
+        """回傳前綴和第一次達到 rank 的格子（0-based），rank 從 1 起算"""
+        pos = 0
+        step = 1 << self.size.bit_length()
+        tree = self.tree
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and tree[nxt] < rank:
+                pos = nxt
+                rank -= tree[nxt]
+            step >>= 1
+        return pos
+
+
+class RideQueue:
+    """保持上車順序、可依 key 快速查詢的排隊名單
+
+    - 查詢是否在名單、取得成員：O(1)
+    - 查詢名次、中途移除：O(log n)
+    - 取出第 a ~ b 位：O(log n + 取出人數)
+    - 依層級取出最前面的成員：攤提 O(取出人數)
+    - 變更層級：排到子佇列末尾時 O(1)，插到中間時 O(該層級的資料數)
+
+    名單變動時會通知以 subscribe() 註冊的監聽函數：
+    listener(op, entries)，op 為 "join" / "leave" / "rotate" / "clear"，
+    或呼叫 remove_many 時指定的其他名稱；entries 為 [(key, 成員), ...]。
+    """
+
+    _MIN_CAPACITY = 64
+
+    def __init__(self):
+        self._items = []   # 格子 -> 成員（已離開的格子為 None）
+        self._keys = []    # 格子 -> key
+        self._index = {}   # key -> 格子
+        self._head = 0     # 第一個仍有效的格子（前面的格子都已離開，走訪時直接跳過）
+        self._count = 0
+        self._tree = _Fenwick([0] * self._MIN_CAPACITY)
+        self._listeners = []
+        self._ticket = 0      # 每次上車遞增的序號（整理格子時不變）
+        self._stamp = 0       # 每次加入子佇列遞增，用來辨識子佇列中的舊資料
+        self._meta = {}       # key -> (序號, 層級, stamp)
+        self._tiers = {}      # 層級 -> deque[(序號, stamp, key)]，可能含已失效的舊資料
+        self._tier_counts = {}
+
+    def subscribe(self, listener):
+        """註冊名單變動的監聽函數"""
+        self._listeners.append(listener)
+
+    def _notify(self, op, entries):
+        for listener in self._listeners:
+            listener(op, entries)
+
+    # ---------- 查詢 ----------
+    def __len__(self):
+        return self._count
+
+    def __bool__(self):
+        return self._count > 0
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __iter__(self):
+        items = self._items
+        for i in range(self._head, len(items)):
+            item = items[i]
+            if item is not None:
+                yield item
+
+    def iter_items(self):
+        """依排隊順序逐一列出 (key, 成員)（迭代期間不可修改名單）"""
+        items, keys = self._items, self._keys
+        for i in range(self._head, len(items)):
+            item = items[i]
+            if item is not None:
+                yield keys[i], item
+
+    def keys(self):
+        """依排隊順序列出所有 key"""
+        items, keys = self._items, self._keys
+        return [keys[i] for i in range(self._head, len(items)) if items[i] is not None]
+
+    def items(self):
+        """依排隊順序列出所有 (key, 成員)"""
+        items, keys = self._items, self._keys
+        return [(keys[i], items[i]) for i in range(self._head, len(items)) if items[i] is not None]
+
+    def get(self, key, default=None):
+        """依 key 取得成員"""
+        slot = self._index.get(key)
+        if slot is None:
+            return default
+        return self._items[slot]
+
+    def position(self, key):
+        """回傳 key 目前的名次（從 1 起算），不在名單中則回傳 None"""
+        slot = self._index.get(key)
+        if slot is None:
+            return None
+        return self._tree.prefix(slot)
+
+    def tier_count(self, tier):
+        """該層級目前的人數"""
+        return self._tier_counts.get(tier, 0)
+
+    def iter_tier(self, tier):
+        """依上車順序列出某層級的 (key, 成員)（迭代期間不可修改名單）"""
+        dq = self._tiers.get(tier)
+        if not dq:
+            return
+        meta = self._meta
+        # 先丟掉前端已失效的資料，讓下次查詢不必再跳過
+        while dq and meta.get(dq[0][2]) != (dq[0][0], tier, dq[0][1]):
+            dq.popleft()
+        for ticket, stamp, key in dq:
+            if meta.get(key) == (ticket, tier, stamp):
+                yield key, self._items[self._index[key]]
+
+    def slice_items(self, start, stop=None):
+        """取出第 start ~ stop-1 位的 (key, 成員)（0-based，與 list 切片相同）"""
+        if stop is None or stop > self._count:
+            stop = self._count
+        if start < 0:
+            start = 0
+        if start >= stop:
+            return []
+        items, keys = self._items, self._keys
+        slot = self._tree.find(start + 1)
+        result = []
+        wanted = stop - start
+        while len(result) < wanted:
+            item = items[slot]
+            if item is not None:
+                result.append((keys[slot], item))
+            slot += 1
+        return result
+
+    def head(self, n):
+        """取出前 n 位（不移除）"""
+        return [item for _, item in self.slice_items(0, n)]
+
+    # ---------- 修改 ----------
+    def append(self, key, item, tier=None):
+        """加到名單末尾，回傳名次"""
+        if key in self._index:
+            raise ValueError(f"{key!r} 已在排隊名單中")
+        if len(self._items) >= self._tree.size:
+            self._rebuild(grow=True)
+        slot = len(self._items)
+        self._items.append(item)
+        self._keys.append(key)
+        self._index[key] = slot
+        self._tree.add(slot, 1)
+        self._count += 1
+        self._ticket += 1
+        self._tier_add(key, self._ticket, tier)
+        self._notify("join", [(key, item)])
+        return self._count
+
+    def remove(self, key):
+        """依 key 移除，回傳被移除的成員（不在名單中則回傳 None）"""
+        slot = self._index.pop(key, None)
+        if slot is None:
+            return None
+        item = self._items[slot]
+        self._items[slot] = None
+        self._keys[slot] = None
+        self._tree.add(slot, -1)
+        self._count -= 1
+        self._forget(key)
+        self._skip_dead_head()
+        self._maybe_compact()
+        self._notify("leave", [(key, item)])
+        return item
+
+    def remove_many(self, keys, op="rotate"):
+        """一次移除多位（例如換人上場），回傳 [(key, 成員), ...]"""
+        removed = []
+        for key in keys:
+            slot = self._index.pop(key, None)
+            if slot is None:
+                continue
+            removed.append((key, self._items[slot]))
+            self._items[slot] = None
+            self._keys[slot] = None
+            self._tree.add(slot, -1)
+            self._count -= 1
+            self._forget(key)
+        self._skip_dead_head()
+        self._maybe_compact()
+        if removed:
+            self._notify(op, removed)
+        return removed
+
+    def retier(self, key, tier):
+        """變更成員的層級（保留原本的上車順序）"""
+        meta = self._meta.get(key)
+        if meta is None or meta[1] == tier:
+            return
+        if meta[1] is not None:
+            self._tier_counts[meta[1]] -= 1
+        self._tier_add(key, meta[0], tier)
+
+    def clear(self):
+        """清空名單"""
+        self._items = []
+        self._keys = []
+        self._index = {}
+        self._head = 0
+        self._count = 0
+        self._tree = _Fenwick([0] * self._MIN_CAPACITY)
+        self._meta = {}
+        self._tiers = {}
+        self._tier_counts = {}
+        self._notify("clear", [])
+
+    # ---------- 內部維護 ----------
+    def _tier_add(self, key, ticket, tier):
+        self._stamp += 1
+        self._meta[key] = (ticket, tier, self._stamp)
+        if tier is None:
+            return
+        dq = self._tiers.get(tier)
+        if dq is None:
+            dq = self._tiers[tier] = deque()
+        entry = (ticket, self._stamp, key)
+        if not dq or dq[-1][0] < ticket:
+            dq.append(entry)
+        else:
+            # 排在中間（例如變更層級的舊成員）：deque 的索引是 O(n)，不能直接二分搜尋，
+            # 轉成 list 插入後重建子佇列，整體 O(該層級的資料數)
+            entries = list(dq)
+            insort(entries, entry)
+            dq = self._tiers[tier] = deque(entries)
+        count = self._tier_counts.get(tier, 0) + 1
+        self._tier_counts[tier] = count
+        # 子佇列中的失效資料太多時重建
+        if len(dq) > 2 * count + self._MIN_CAPACITY:
+            meta = self._meta
+            self._tiers[tier] = deque(e for e in dq if meta.get(e[2]) == (e[0], tier, e[1]))
+
+    def _forget(self, key):
+        ticket, tier, _ = self._meta.pop(key)
+        if tier is not None:
+            self._tier_counts[tier] -= 1
+
+    def _skip_dead_head(self):
+        # 換人通常移除最前面的人，_head 只會往後移，攤提 O(1)
+        items = self._items
+        head = self._head
+        while head < len(items) and items[head] is None:
+            head += 1
+        self._head = head
+
+    def _maybe_compact(self):
+        # 已離開的格子多於仍在排隊的人數時才整理，攤提後仍是 O(1)
+        dead = len(self._items) - self._count
+        if dead > self._MIN_CAPACITY and dead > self._count:
+            self._rebuild(grow=False)
+
+    def _rebuild(self, grow):
+        live = [(k, it) for k, it in zip(self._keys, self._items) if it is not None]
+        capacity = self._MIN_CAPACITY
+        needed = len(live) * 2 if grow else len(live) + 1
+        while capacity < needed:
+            capacity *= 2
+        self._keys = [k for k, _ in live]
+        self._items = [it for _, it in live]
+        self._index = {k: i for i, k in enumerate(self._keys)}
+        self._head = 0
+        self._tree = _Fenwick([1] * len(live) + [0] * (capacity - len(live)))
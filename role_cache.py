@@ -0,0 +1,113 @@
+"""身分組分類快取
+
+has_authority / get_role_type 原本每次呼叫都要掃過成員所有身分組並做
+多次子字串比對。這裡改為：
+- 每個身分組（依 role ID）只比對一次，結果快取起來
+- 每個成員（依伺服器 + 成員 ID）的分類結果連同當時的身分組組合快取起來，
+  查詢時身分組組合不同就重新分類，另外由 on_member_update / 身分組變更事件使快取失效
+- 低記憶體模式下成員快取改為有上限（maxsize）的 LRU，並在 ttl 秒後過期以限制記憶體用量
+"""
+import re
+import time
+from collections import OrderedDict
+
+
+class RoleClassifier:
+    """依身分組判斷權限與身份類型，並快取結果"""
+
+    SUBSCRIBER = "訂閱"
+    VIEWER = "觀眾"
+
+    def __init__(self, authorized_roles, authority_keywords=(), subscriber_keywords=("訂閱",),
+                 maxsize=None, ttl=None):
+        self._authorized = frozenset(authorized_roles)
+        self._authority_re = self._keywords(authority_keywords)
+        self._subscriber_re = self._keywords(subscriber_keywords)
+        self.maxsize = maxsize  # 成員快取上限（None 表示不限制）
+        self.ttl = ttl          # 成員快取的有效秒數（None 表示不過期）
+        self._role_flags = {}   # role ID -> (是否有權限, 是否為訂閱)
+        self._members = OrderedDict()  # (伺服器 ID, 成員 ID) -> ((是否有權限, 身份類型), 身分組 ID 組合, 過期時間)
+        # 分類結果可能改變時遞增（快取失效、過期後重新分類的結果不同），看板以此判斷顯示片段是否要重算
+        self.generation = 0
+
+        # 統計數據
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._members)
+
+    @staticmethod
+    def _keywords(keywords):
+        """關鍵字的比對式（沒有關鍵字時回傳 None，空的比對式會比對到所有名稱）"""
+        keywords = [k for k in keywords if k]
+        return re.compile("|".join(map(re.escape, keywords))) if keywords else None
+
+    def _flags(self, role):
+        flags = self._role_flags.get(role.id)
+        if flags is None:
+            name = role.name
+            flags = (
+                name in self._authorized or (self._authority_re is not None and self._authority_re.search(name) is not None),
+                self._subscriber_re is not None and self._subscriber_re.search(name) is not None,
+            )
+            self._role_flags[role.id] = flags
+        return flags
+
+    def classify(self, member):
+        """回傳 (是否有權限, 身份類型)"""
+        guild = getattr(member, "guild", None)
+        key = None
+        previous = None
+        roles = frozenset(role.id for role in member.roles)
+        if guild is not None:
+            key = (guild.id, member.id)
+            cached = self._members.get(key)
+            if cached is not None:
+                previous, cached_roles, expires = cached
+                # 身分組組合不同時（例如沒有觸發 on_member_update 的成員）重新分類
+                if cached_roles == roles and (expires is None or expires > time.monotonic()):
+                    if self.maxsize is not None:
+                        self._members.move_to_end(key)
+                    self.hits += 1
+                    return previous
+        self.misses += 1
+
+        authority = False
+        subscriber = False
+        for role in member.roles:
+            is_authority, is_subscriber = self._flags(role)
+            authority = authority or is_authority
+            subscriber = subscriber or is_subscriber
+        result = (authority, self.SUBSCRIBER if subscriber else self.VIEWER)
+        if previous is not None and previous != result:
+            self.generation += 1
+        if key is not None:
+            self._members[key] = (result, roles, time.monotonic() + self.ttl if self.ttl else None)
+            if self.maxsize is not None:
+                self._members.move_to_end(key)
+                if len(self._members) > self.maxsize:
+                    self._members.popitem(last=False)
+        return result
+
+    def has_authority(self, member):
+        return self.classify(member)[0]
+
+    def role_type(self, member):
+        return self.classify(member)[1]
+
+    # ---------- 快取失效 ----------
+    def invalidate_member(self, guild_id, member_id):
+        self._members.pop((guild_id, member_id), None)
+        self.generation += 1
+
+    def invalidate_role(self, role):
+        """身分組改名或刪除：重新比對該身分組，並清除該伺服器的成員快取"""
+        self._role_flags.pop(role.id, None)
+        self.invalidate_guild(role.guild.id)
+
+    def invalidate_guild(self, guild_id):
+        # 身分組變更很少發生，直接掃過整個快取
+        for key in [key for key in self._members if key[0] == guild_id]:
+            del self._members[key]
+        self.generation += 1
@@ -0,0 +1,124 @@
+"""換人（輪替上場）規則
+
+依照可設定的規則，從排隊名單中一次挑出下一輪的上場名單：
+1. 依層級順序，從各層級的子佇列中取出最多「配額」位（例如訂閱者 2 位）
+2. 剩下的名額依原排隊順序補滿
+挑選只走訪需要的成員，不會掃描整個名單。
+
+另外支援：
+- max_consecutive：同一人最多可連續上場幾輪（0 表示不限制）
+- cooldown：上場後需間隔幾輪才能再上場（0 表示不限制）
+若符合條件的人數不足，仍會依排隊順序補滿，避免上場人數不足。
+"""
+from collections import deque
+
+# 身份層級
+TIER_DISCORD_SUB = "discord_sub"   # Discord 訂閱者
+TIER_TWITCH_SUB = "twitch_sub"     # Twitch 訂閱者
+TIER_FOLLOWER = "follower"         # Twitch 追隨者
+TIER_VIEWER = "viewer"             # 一般觀眾
+
+TIERS = (TIER_DISCORD_SUB, TIER_TWITCH_SUB, TIER_FOLLOWER, TIER_VIEWER)
+
+
+def higher_tier(a, b):
+    """兩個層級中優先順序較高的一個（None 表示沒有）"""
+    if a is None or b is None:
+        return a if b is None else b
+    return a if TIERS.index(a) <= TIERS.index(b) else b
+
+
+class RotationPolicy:
+    """換人規則設定"""
+
+    def __init__(self, quotas=None, max_consecutive=0, cooldown=0):
+        # 層級 -> 每輪最多優先上場人數（依 TIERS 順序套用）
+        self.quotas = dict(quotas) if quotas is not None else {TIER_DISCORD_SUB: 2}
+        self.max_consecutive = max_consecutive
+        self.cooldown = cooldown
+
+    @classmethod
+    def parse_quotas(cls, text):
+        """解析 "discord_sub:2,twitch_sub:1" 格式的配額設定"""
+        quotas = {}
+        for part in text.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            tier, _, count = part.partition(":")
+            tier = tier.strip()
+            if tier not in TIERS:
+                raise ValueError(f"未知的身份層級：{tier}")
+            quotas[tier] = int(count)
+        return quotas
+
+
+class RotationEngine:
+    """依 RotationPolicy 挑選每一輪的上場名單"""
+
+    def __init__(self, policy=None):
+        self.policy = policy or RotationPolicy()
+        self.round = 0
+        # 最近幾輪的上場名單：deque[{key: 連續上場輪數}]
+        self._recent = deque(maxlen=max(self.policy.cooldown, 1))
+
+    def _eligible(self, key):
+        policy = self.policy
+        if policy.cooldown > 0:
+            for played in self._recent:
+                if key in played:
+                    return False
+        if policy.max_consecutive > 0 and self._recent:
+            if self._recent[-1].get(key, 0) >= policy.max_consecutive:
+                return False
+        return True
+
+    def pick(self, queue, count):
+        """挑出下一輪的上場名單（不修改名單），回傳 [(key, 成員), ...]"""
+        picked = []
+        chosen = set()
+
+        # 1. 依層級配額優先挑選
+        for tier in TIERS:
+            quota = self.policy.quotas.get(tier, 0)
+            if quota <= 0:
+                continue
+            taken = 0
+            for key, member in queue.iter_tier(tier):
+                if taken >= quota or len(picked) >= count:
+                    break
+                if self._eligible(key):
+                    picked.append((key, member))
+                    chosen.add(key)
+                    taken += 1
+
+        # 2. 依排隊順序補滿
+        skipped = []
+        if len(picked) < count:
+            for key, member in queue.iter_items():
+                if key in chosen:
+                    continue
+                if self._eligible(key):
+                    picked.append((key, member))
+                    chosen.add(key)
+                    if len(picked) >= count:
+                        break
+                elif len(skipped) < count:
+                    skipped.append((key, member))
+
+        # 3. 符合條件的人不夠時，由冷卻中的人依序補上
+        for entry in skipped:
+            if len(picked) >= count:
+                break
+            picked.append(entry)
+
+        return picked
+
+    def rotate(self, queue, count):
+        """挑出下一輪上場名單並從排隊名單移除"""
+        picked = self.pick(queue, count)
+        previous = self._recent[-1] if self._recent else {}
+        self._recent.append({key: previous.get(key, 0) + 1 for key, _ in picked})
+        self.round += 1
+        queue.remove_many([key for key, _ in picked], op="rotate")
+        return picked
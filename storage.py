@@ -0,0 +1,49 @@
+"""持久化的共用工具
+
+- 評分、帳號綁定與排隊快照都存成單一 JSON 檔，一律以 write_json 寫入：
+  先寫到暫存檔並 fsync，再以 os.replace 取代原檔，寫到一半當機也不會損壞
+- 排隊日誌與歷史資料庫先放進緩衝區，由 FlushLoop 合併一小段時間內的變動後
+  一次寫入，事件循環中不做磁碟 I/O
+"""
+import asyncio
+import json
+import os
+from pathlib import Path
+
+
+def write_json(path, data):
+    """以原子取代的方式寫入 JSON 檔（會阻塞，請在執行緒池中呼叫）"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class FlushLoop:
+    """緩衝區的背景寫入工作：wake() 後等待 interval 秒，讓同時間的變動合併成一次 flush()"""
+
+    def __init__(self, flush, interval):
+        self.flush = flush        # async flush()
+        self.interval = interval
+        self._wakeup = None       # 在 run() 中建立，確保綁定到 Bot 的事件循環
+        self._pending = False     # run() 開始前就有資料
+
+    def wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+        else:
+            self._pending = True
+
+    async def run(self):
+        self._wakeup = asyncio.Event()
+        if self._pending:
+            self._wakeup.set()
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(self.interval)
+            self._wakeup.clear()
+            await self.flush()
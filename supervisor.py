@@ -0,0 +1,158 @@
+"""Discord / Twitch 連線監督
+
+每個連線由一個 Connection 負責：
+- 連線失敗或中斷時，以帶隨機抖動的指數退避重新啟動
+  （連線穩定超過 stable_after 秒後，退避時間重新計算）
+- 驗證失敗等無法靠重試解決的錯誤（fatal）直接放棄，不會一直重試
+- 記錄斷線次數、重新啟動次數與累計斷線時間，供 /metrics 使用
+
+Discord 的連線本身（discord.py 的 connect(reconnect=True)）會在斷線時
+優先恢復（RESUME）原本的 session，只有它放棄時才會由這裡重新啟動；
+排隊名單等狀態都在 Bot 物件之外，重新連線不會遺失。
+"""
+import asyncio
+import random
+import time
+
+from botlog import get_logger
+
+log = get_logger("system.supervisor")
+
+
+class Backoff:
+    """帶抖動的指數退避：第 n 次等待 base * 2^n 秒（上限 cap）的一半到全部"""
+
+    def __init__(self, base=1.0, cap=300.0, rng=random):
+        self.base = base
+        self.cap = cap
+        self.rng = rng
+        self.attempts = 0
+
+    def next(self):
+        delay = min(self.cap, self.base * 2 ** self.attempts)
+        self.attempts += 1
+        # 多個連線同時失敗時，抖動讓它們不會在同一時間重試
+        return delay / 2 + self.rng.uniform(0, delay / 2)
+
+    def reset(self):
+        self.attempts = 0
+
+
+def session_start_delay(limit):
+    """Discord 的 session_start_limit 已用完時需要等待的秒數（未用完時為 0）"""
+    if limit.get("remaining", 1) > 0:
+        return 0
+    return limit.get("reset_after", 0) / 1000
+
+
+class Connection:
+    """一個受監督的連線"""
+
+    def __init__(self, name, factory, backoff, fatal=(), retry_after=None, stable_after=60.0):
+        self.name = name
+        self.factory = factory          # await factory()：連線直到中斷（正常結束表示不需要重新連線）
+        self.backoff = backoff
+        self.fatal = tuple(fatal)       # 不重試的例外類型
+        self.retry_after = retry_after  # retry_after(例外) -> 伺服器要求的最少等待秒數或 None
+        self.stable_after = stable_after
+
+        self.state = "starting"  # starting / connected / disconnected / waiting / stopped / failed
+        self.last_error = None
+        self._up_at = None       # 這次連線成功的時間
+        self._down_at = None     # 這次斷線的時間（尚未連線過時為 None）
+
+        # 統計數據
+        self.reconnects = 0      # 斷線後重新連上的次數（包含 RESUME）
+        self.restarts = 0        # 連線失敗後重新啟動的次數
+        self._downtime = 0.0     # 已結束的斷線期間總秒數
+
+    @property
+    def up(self):
+        return self.state == "connected"
+
+    @property
+    def downtime(self):
+        """累計斷線秒數（包含目前這次尚未恢復的斷線）"""
+        if self._down_at is None:
+            return self._downtime
+        return self._downtime + time.monotonic() - self._down_at
+
+    def mark_up(self):
+        """連線成功（由 on_ready / on_resumed 等事件呼叫）"""
+        now = time.monotonic()
+        if self._down_at is not None:
+            self.reconnects += 1
+            self._downtime += now - self._down_at
+            log.info("%s 已重新連線（斷線 %.1f 秒）", self.name, now - self._down_at)
+            self._down_at = None
+        self._up_at = now
+        self.state = "connected"
+
+    def mark_down(self):
+        """連線中斷（由 on_disconnect 等事件呼叫，重複呼叫不會重複計算）"""
+        if self.state != "connected":
+            return
+        self._down_at = time.monotonic()
+        self.state = "disconnected"
+
+    async def run(self):
+        """執行連線，失敗時退避後重新啟動"""
+        while True:
+            self.state = "starting" if self._down_at is None else "disconnected"
+            try:
+                await self.factory()
+            except asyncio.CancelledError:
+                raise
+            except self.fatal as e:
+                self.mark_down()
+                self.state = "failed"
+                self.last_error = repr(e)
+                log.error("%s 發生無法重試的錯誤，停止連線：%s", self.name, e)
+                raise
+            except Exception as e:
+                self.last_error = repr(e)
+                if self._up_at is not None and time.monotonic() - self._up_at >= self.stable_after:
+                    self.backoff.reset()  # 之前連線很穩定，這次從頭開始退避
+                self.mark_down()
+                if self._down_at is None:
+                    self._down_at = time.monotonic()  # 還沒連上過就失敗，也算進斷線時間
+                self._up_at = None
+
+                delay = self.backoff.next()
+                if self.retry_after is not None:
+                    delay = max(delay, self.retry_after(e) or 0)
+                self.restarts += 1
+                self.state = "waiting"
+                log.warning("%s 連線失敗：%s，%.1f 秒後重新連線（第 %d 次）", self.name, e, delay, self.restarts)
+                await asyncio.sleep(delay)
+            else:
+                self.mark_down()
+                self.state = "stopped"
+                log.info("%s 連線已結束", self.name)
+                return
+
+
+class Supervisor:
+    """管理所有受監督的連線"""
+
+    def __init__(self, base=1.0, cap=300.0, stable_after=60.0, rng=random):
+        self.base = base
+        self.cap = cap
+        self.stable_after = stable_after
+        self.rng = rng
+        self._connections = {}  # 名稱 -> Connection
+
+    def watch(self, name, factory, fatal=(), retry_after=None):
+        """建立受監督的連線（await connection.run() 開始執行）"""
+        connection = Connection(
+            name, factory, Backoff(self.base, self.cap, self.rng),
+            fatal=fatal, retry_after=retry_after, stable_after=self.stable_after,
+        )
+        self._connections[name] = connection
+        return connection
+
+    def get(self, name):
+        return self._connections.get(name)
+
+    def __iter__(self):
+        return iter(list(self._connections.values()))
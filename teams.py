@@ -0,0 +1,192 @@
+"""平衡分隊
+
+!抽 平衡 依每位玩家的評分把語音頻道分成兩隊，讓兩隊評分總和的差距最小：
+- 人數不多時（exact_limit 以下）列舉所有分法，保證是最佳解
+- 人數多時先以貪婪法分隊，再反覆交換兩隊的玩家直到無法改善，
+  40 人以上也只需要幾毫秒
+- PairHistory 記錄最近幾次分隊中誰和誰同隊，同隊次數已達上限的兩人
+  再被分在一起時會加上懲罰分數，盡量避免總是同一批人同隊
+
+評分存在本地 JSON 檔（RatingStore），沒有評分的玩家使用預設評分。
+"""
+import itertools
+import json
+import random
+from collections import Counter, deque
+from pathlib import Path
+
+from storage import write_json
+
+DEFAULT_RATING = 1000
+EXACT_LIMIT = 16       # 人數不超過此值時使用窮舉法
+PAIR_PENALTY = 100.0   # 每一組同隊次數超過上限的玩家增加的差距分數
+
+
+class RatingStore:
+    """玩家評分（伺服器 ID -> 成員 ID -> 評分），存成一個 JSON 檔"""
+
+    def __init__(self, path, default=DEFAULT_RATING):
+        self.path = Path(path)
+        self.default = default
+        self._ratings = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._ratings = json.load(f)
+
+    def get(self, guild_id, member_id):
+        return self._ratings.get(str(guild_id), {}).get(str(member_id), self.default)
+
+    def get_many(self, guild_id, member_ids):
+        ratings = self._ratings.get(str(guild_id), {})
+        return [ratings.get(str(member_id), self.default) for member_id in member_ids]
+
+    def set(self, guild_id, member_id, rating):
+        self._ratings.setdefault(str(guild_id), {})[str(member_id)] = rating
+
+    def save(self):
+        """寫入磁碟（會阻塞，請在執行緒池中呼叫）"""
+        write_json(self.path, self._ratings)
+
+
+class PairHistory:
+    """最近 window 次分隊中，每兩位玩家同隊的次數"""
+
+    def __init__(self, window=5, limit=2):
+        self.window = window
+        self.limit = limit  # 同隊次數達到此值後，再同隊就會被懲罰（0 表示不限制）
+        self._draws = deque()
+        self._counts = Counter()
+
+    def record(self, *teams):
+        pairs = [tuple(sorted(pair)) for team in teams for pair in itertools.combinations(team, 2)]
+        self._draws.append(pairs)
+        self._counts.update(pairs)
+        while len(self._draws) > self.window:
+            self._counts.subtract(self._draws.popleft())
+
+    def hot_pairs(self, player_ids):
+        """同隊次數已達上限的玩家組合（以 player_ids 中的索引表示）"""
+        if not self.limit or not self._counts:
+            return []
+        hot = []
+        for i, j in itertools.combinations(range(len(player_ids)), 2):
+            pair = tuple(sorted((player_ids[i], player_ids[j])))
+            if self._counts[pair] >= self.limit:
+                hot.append((i, j))
+        return hot
+
+
+def _solve_exact(ratings, hot_pairs, pair_penalty):
+    n = len(ratings)
+    total = sum(ratings)
+    size = n // 2
+    best_mask, best_cost = 0, None
+    # 人數為偶數時固定最後一位玩家在 B 隊，避免 A/B 對調的重複分法；
+    # 奇數時兩隊人數不同，對調後不是同一種分法，最後一位也要能分到 A 隊
+    players = range(n - 1) if n % 2 == 0 else range(n)
+    for combo in itertools.combinations(players, size):
+        team_a = 0
+        mask = 0
+        for i in combo:
+            team_a += ratings[i]
+            mask |= 1 << i
+        cost = abs(total - 2 * team_a)
+        if best_cost is not None and cost >= best_cost:
+            continue
+        for i, j in hot_pairs:
+            if (mask >> i & 1) == (mask >> j & 1):
+                cost += pair_penalty
+        if best_cost is None or cost < best_cost:
+            best_mask, best_cost = mask, cost
+            if cost == 0:
+                break
+    return best_mask
+
+
+def _solve_heuristic(ratings, hot_pairs, pair_penalty, rng, restarts=4):
+    n = len(ratings)
+    total = sum(ratings)
+    size = n // 2
+    neighbors = [set() for _ in range(n)]
+    for i, j in hot_pairs:
+        neighbors[i].add(j)
+        neighbors[j].add(i)
+
+    best_mask, best_cost = 0, None
+    for attempt in range(restarts):
+        # 貪婪法：由高分到低分，放進目前總分較低且還有空位的隊伍（之後的嘗試稍微打亂順序）
+        if attempt == 0:
+            order = sorted(range(n), key=lambda i: -ratings[i])
+        else:
+            order = sorted(range(n), key=lambda i: -ratings[i] * rng.uniform(0.8, 1.2))
+        mask, sum_a, count_a, sum_b, count_b = 0, 0, 0, 0, 0
+        for i in order:
+            if count_a < size and (count_b >= n - size or sum_a <= sum_b):
+                mask |= 1 << i
+                sum_a += ratings[i]
+                count_a += 1
+            else:
+                sum_b += ratings[i]
+                count_b += 1
+
+        # gain[i]：只把玩家 i 換到另一隊時，同隊懲罰的變化量
+        gain = [0] * n
+        for i in range(n):
+            side = mask >> i & 1
+            same = sum(1 for k in neighbors[i] if (mask >> k & 1) == side)
+            gain[i] = (len(neighbors[i]) - 2 * same) * pair_penalty
+        penalty = sum(pair_penalty for i, j in hot_pairs if (mask >> i & 1) == (mask >> j & 1))
+        cost = abs(total - 2 * sum_a) + penalty
+
+        # 交換改善：每輪找出讓成本下降最多的一組交換，直到無法改善
+        while cost > 0:
+            team_a = [i for i in range(n) if mask >> i & 1]
+            team_b = [i for i in range(n) if not mask >> i & 1]
+            best_swap, best_swap_cost = None, cost
+            for i in team_a:
+                base = sum_a - ratings[i]
+                penalty_i = penalty + gain[i]
+                adjacent = neighbors[i]
+                for j in team_b:
+                    swap_cost = abs(total - 2 * (base + ratings[j])) + penalty_i + gain[j]
+                    if j in adjacent:
+                        # i、j 交換前後都不同隊，但 gain[i]、gain[j] 都把這組算成會變同隊
+                        swap_cost -= 2 * pair_penalty
+                    if swap_cost < best_swap_cost:
+                        best_swap, best_swap_cost = (i, j), swap_cost
+            if best_swap is None:
+                break
+
+            i, j = best_swap
+            adjacent = 2 * pair_penalty if j in neighbors[i] else 0
+            mask ^= (1 << i) | (1 << j)
+            sum_a += ratings[j] - ratings[i]
+            penalty += gain[i] + gain[j] - adjacent
+            cost = best_swap_cost
+            # 其餘與 i、j 有關的組合同隊 / 不同隊對調，更新相關玩家的 gain
+            for moved in (i, j):
+                side = mask >> moved & 1
+                for k in neighbors[moved]:
+                    if k != i and k != j:
+                        gain[k] += -2 * pair_penalty if (mask >> k & 1) == side else 2 * pair_penalty
+                gain[moved] = adjacent - gain[moved]
+
+        if best_cost is None or cost < best_cost:
+            best_mask, best_cost = mask, cost
+            if cost == 0:
+                break
+    return best_mask
+
+
+def balance(ratings, hot_pairs=(), pair_penalty=PAIR_PENALTY, exact_limit=EXACT_LIMIT, rng=random):
+    """將玩家分成兩隊，回傳 (A 隊索引, B 隊索引)，A 隊人數為 n // 2"""
+    n = len(ratings)
+    if n < 2:
+        return list(range(n)), []
+    if n <= exact_limit:
+        mask = _solve_exact(ratings, hot_pairs, pair_penalty)
+    else:
+        mask = _solve_heuristic(ratings, hot_pairs, pair_penalty, rng)
+    team_a = [i for i in range(n) if mask >> i & 1]
+    team_b = [i for i in range(n) if not mask >> i & 1]
+    return team_a, team_b
@@ -0,0 +1,30 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# 測試直接 import 專案根目錄的模組（main.py 旁的扁平模組）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+class FakeClock:
+    """取代模組中的 time（只提供 monotonic）；不修改 time 模組本身，事件循環的時鐘照常前進"""
+
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """clock("模組名稱", ...)：讓這些模組改用可手動設定的時鐘，回傳 FakeClock"""
+    fake = FakeClock()
+
+    def install(*modules):
+        for module in modules:
+            monkeypatch.setattr(f"{module}.time", fake)
+        return fake
+
+    return install
@@ -0,0 +1,51 @@
+"""排隊看板的渲染與顯示片段快取"""
+from board import QueueBoard
+from outbox import MESSAGE_LIMIT
+from ride_queue import RideQueue
+
+
+class Entry:
+    def __init__(self, name, tier="viewer"):
+        self.name = name
+        self.tier = tier
+
+
+def make_board(count, name_length=10, page_size=20):
+    queue = RideQueue()
+    for i in range(count):
+        queue.append(i, Entry(f"{i:0{name_length}d}"))
+    calls = []
+    generation = [0]
+
+    def describe(entry):
+        calls.append(entry.name)
+        return "⚪", entry.name, "觀眾"
+
+    board = QueueBoard(queue, outbox=None, describe=describe, is_enabled=lambda: True, max_players=4,
+                       page_size=page_size, stamp=lambda entry: (entry.name, entry.tier, generation[0]))
+    return queue, board, calls, generation
+
+
+def test_unchanged_entries_skip_describe():
+    queue, board, calls, generation = make_board(5)
+    first = board.render()
+    assert len(calls) == 5
+    assert board.render() == first
+    assert len(calls) == 5
+    assert board.fragment_hits == 5
+
+    queue.get(2).name = "renamed"
+    assert "renamed" in board.render()
+    assert calls[5:] == ["renamed"]
+
+    generation[0] += 1  # 分類快取失效：所有片段重算
+    board.render()
+    assert len(calls) == 11
+
+
+def test_render_truncates_at_whole_line():
+    _, board, _, _ = make_board(40, name_length=120, page_size=40)
+    content = board.render()
+    assert len(content) <= MESSAGE_LIMIT
+    last = content.rsplit("\n", 1)[1]
+    assert last.endswith("（觀眾）")
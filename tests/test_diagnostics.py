@@ -0,0 +1,33 @@
+"""慢回呼偵測"""
+import asyncio
+import time
+
+from diagnostics import SlowCallbackMonitor
+
+
+async def pause():
+    await asyncio.sleep(0)
+
+
+async def worker():
+    await pause()
+    time.sleep(0.03)  # 阻塞事件循環，這一步執行完 Task 就結束了
+
+
+def test_records_task_and_coroutine_running_the_slow_step():
+    monitor = SlowCallbackMonitor(threshold=0.02)
+
+    async def scenario():
+        monitor.enable()
+        try:
+            await asyncio.create_task(worker(), name="worker-task")
+        finally:
+            monitor.disable()
+
+    asyncio.run(scenario())
+    assert monitor.total >= 1
+    # 呼叫鏈在執行前取得：Task 結束後就只剩最外層的 worker
+    assert any(name.startswith("worker-task (") and name != "worker-task (worker)" for name in monitor.counts), monitor.counts
+
+    monitor.clear()
+    assert monitor.total == 0 and not monitor.counts and not monitor.recent
@@ -0,0 +1,64 @@
+"""ExpiringSet 的過期、容量上限與 Sweeper"""
+import asyncio
+
+import pytest
+
+from expiring import ExpiringSet, Sweeper
+
+
+@pytest.fixture
+def now(clock):
+    return clock("expiring")
+
+
+def test_key_expires_after_ttl(now):
+    keys = ExpiringSet(ttl=10, maxsize=100)
+    assert keys.add("a")
+    assert not keys.add("a") and keys.hits == 1
+    now.now += 9.9
+    assert "a" in keys
+    now.now += 0.1
+    assert "a" not in keys
+    assert keys.add("a")  # 過期後可以再加入
+
+
+def test_oldest_key_evicted_at_capacity(now):
+    keys = ExpiringSet(ttl=10, maxsize=2)
+    for key in ("a", "b", "c"):
+        keys.add(key)
+    assert "a" not in keys and "b" in keys and "c" in keys
+    assert keys.evictions == 1 and len(keys) == 2
+
+
+def test_sweep_removes_only_expired_prefix(now):
+    keys = ExpiringSet(ttl=10, maxsize=100)
+    keys.add("a")
+    now.now += 5
+    keys.add("b")
+    now.now += 6
+    assert keys.sweep() == 1
+    assert len(keys) == 1 and "b" in keys
+
+
+def test_discard_releases_key(now):
+    keys = ExpiringSet(ttl=10, maxsize=100)
+    keys.add("a")
+    keys.discard("a")
+    assert keys.add("a")
+
+
+def test_sweeper_cleans_registered_sets(now):
+    sweeper = Sweeper(interval=0.01)
+    first = sweeper.register(ExpiringSet(ttl=1, maxsize=10))
+    second = sweeper.register(ExpiringSet(ttl=100, maxsize=10))
+    first.add("a")
+    second.add("b")
+    now.now += 2
+
+    async def scenario():
+        task = asyncio.create_task(sweeper.run())
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(scenario())
+    assert len(first) == 0 and len(second) == 1
@@ -0,0 +1,92 @@
+"""排隊歷史的彙總統計與等待時間推算（記憶體中的 SQLite）"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from history import QueueHistory
+
+LINE = 1
+T0 = 1_700_000_000.0  # 整點以外的固定時間
+
+
+def entry(uid, joined_at):
+    return SimpleNamespace(platform="discord", uid=uid, joined_at=joined_at)
+
+
+def pairs(*entries):
+    return [(("discord", e.uid), e) for e in entries]
+
+
+@pytest.fixture
+def history():
+    history = QueueHistory(":memory:", window=3, max_round=3600)
+    history.load()
+    yield history
+    history.close()
+
+
+def flush(history):
+    asyncio.run(history.flush())
+
+
+def test_stream_rollup_counts_joins_leaves_and_waits(history):
+    a, b, c = entry(1, T0), entry(2, T0 + 10), entry(3, T0 + 20)
+    history.open_stream(LINE, now=T0)
+    for e in (a, b, c):
+        history.record(LINE, "join", pairs(e), now=e.joined_at)
+    history.record(LINE, "leave", pairs(c), now=T0 + 50)             # 中途跳車
+    history.record(LINE, "merge", pairs(entry(4, T0)), now=T0 + 55)  # 綁定合併不算跳車
+    history.record(LINE, "rotate", pairs(a, b), now=T0 + 100)
+    history.close_stream(LINE, now=T0 + 1200)
+    flush(history)
+
+    [stat] = history.stream_stats(LINE)
+    assert (stat["joins"], stat["leaves"], stat["players"], stat["rounds"]) == (3, 1, 2, 1)
+    assert stat["avg_wait"] == pytest.approx((100 + 90) / 2)
+    assert stat["wait_max"] == pytest.approx(100)
+    assert stat["duration"] == pytest.approx(1200)
+    assert stat["rounds_per_hour"] == pytest.approx(3)
+
+    hours = history.hourly(LINE, since=T0 - 3600)
+    assert sum(h["joins"] for h in hours) == 3 and sum(h["leaves"] for h in hours) == 1
+
+
+def test_round_durations_and_eta(history):
+    history.open_stream(LINE, now=T0)
+    now = T0 + 1000
+    for i, gap in enumerate((0, 600, 900, 700, 5000)):  # 第一次換人與超過 max_round 的間隔不算一輪
+        now += gap
+        history.record(LINE, "rotate", pairs(entry(i, T0)), now=now)
+    flush(history)
+
+    [stat] = history.stream_stats(LINE)
+    assert stat["rounds"] == 5 and stat["avg_round"] == pytest.approx((600 + 900 + 700) / 3)
+    assert history.round_estimate(LINE) == 700
+
+    # 上次換人 100 秒後：第 1~4 位還要 600 秒，第 5 位再多一輪
+    assert history.eta(LINE, 1, 4, now=now + 100) == pytest.approx(600)
+    assert history.eta(LINE, 5, 4, now=now + 100) == pytest.approx(1300)
+    assert history.eta(LINE, 0, 4) is None
+
+
+def test_eta_without_rounds(history):
+    history.open_stream(LINE, now=T0)
+    assert history.eta(LINE, 1, 4) is None
+
+
+def test_rounds_reload_from_database(tmp_path):
+    path = tmp_path / "history.db"
+    history = QueueHistory(path, window=3)
+    history.load()
+    history.open_stream(LINE, now=T0)
+    for i, ts in enumerate((T0 + 100, T0 + 400, T0 + 1000)):
+        history.record(LINE, "rotate", pairs(entry(i, T0)), now=ts)
+    flush(history)
+    history.close()
+
+    reopened = QueueHistory(path, window=3)
+    reopened.load()
+    assert reopened.round_estimate(LINE) == pytest.approx(450)
+    assert reopened.eta(LINE, 1, 4, now=T0 + 1100) == pytest.approx(350)  # 直播仍在進行
+    reopened.close()
@@ -0,0 +1,24 @@
+"""ChatIngest 的溢出處理"""
+from ingest import OP_JOIN, ChatIngest, ChatRequest
+
+
+def request(name):
+    return ChatRequest(None, OP_JOIN, name, None)
+
+
+def test_drop_oldest_reports_evicted_request():
+    dropped = []
+    ingest = ChatIngest(handler=None, maxsize=2, overflow="drop_oldest", on_drop=dropped.append)
+    for name in ("a", "b", "c"):
+        assert ingest.offer(request(name))
+    assert [r.user_name for r in dropped] == ["a"]
+    assert [r.user_name for r in ingest._take()] == ["b", "c"]
+    assert ingest.dropped == 1
+
+
+def test_drop_newest_rejects_without_callback():
+    dropped = []
+    ingest = ChatIngest(handler=None, maxsize=1, on_drop=dropped.append)
+    assert ingest.offer(request("a"))
+    assert not ingest.offer(request("b"))
+    assert dropped == [] and ingest.dropped == 1
@@ -0,0 +1,101 @@
+"""QueueJournal 的寫入與重播"""
+import asyncio
+import json
+import time
+
+from journal import QueueJournal
+
+
+def entry(key):
+    return {"key": ["discord", key], "name": f"m{key}"}
+
+
+def record_ops(journal, ops):
+    for op, data in ops:
+        journal.record(op, **data)
+    asyncio.run(journal.flush())
+
+
+def test_replay_without_snapshot(tmp_path):
+    journal = QueueJournal(tmp_path)
+    record_ops(journal, [
+        ("open", {}),
+        ("join", {"key": ["discord", 1], "entry": entry(1)}),
+        ("join", {"key": ["discord", 2], "entry": entry(2)}),
+        ("join", {"key": ["discord", 3], "entry": entry(3)}),
+        ("leave", {"key": ["discord", 2]}),
+        ("rotate", {"keys": [["discord", 1]]}),
+        ("join", {"key": ["discord", 4], "entry": entry(4)}),
+        ("join", {"key": ["discord", 5], "entry": entry(5)}),
+        ("merge", {"keys": [["discord", 5]]}),
+    ])
+    state = QueueJournal(tmp_path).load()
+    assert state == {"enabled": True, "entries": [entry(3), entry(4)]}
+
+
+def test_snapshot_then_tail(tmp_path):
+    journal = QueueJournal(tmp_path)
+    entries = [entry(1), entry(2)]
+    journal.state_fn = lambda: {"enabled": True, "entries": list(entries)}
+    record_ops(journal, [("join", {"key": ["discord", k], "entry": entry(k)}) for k in (1, 2)])
+    journal.request_snapshot()
+    asyncio.run(journal.flush())
+    assert journal.journal_path.read_text() == ""
+
+    record_ops(journal, [("leave", {"key": ["discord", 1]}), ("close", {})])
+    restored = QueueJournal(tmp_path)
+    assert restored.load() == {"enabled": False, "entries": [entry(2)]}
+
+    # 序號接續快照與日誌，之後的紀錄不會被當成舊資料略過
+    record_ops(restored, [("join", {"key": ["discord", 5], "entry": entry(5)})])
+    assert QueueJournal(tmp_path).load()["entries"] == [entry(2), entry(5)]
+
+
+def test_records_already_in_snapshot_are_skipped(tmp_path):
+    journal = QueueJournal(tmp_path)
+    record_ops(journal, [("join", {"key": ["discord", 1], "entry": entry(1)}),
+                         ("join", {"key": ["discord", 2], "entry": entry(2)})])
+    # 寫完快照但還沒清空日誌就當機：日誌中序號 <= 快照的紀錄不能再套用一次
+    journal.snapshot_path.write_text(json.dumps({"seq": 2, "enabled": False, "entries": [entry(2)]}))
+    assert QueueJournal(tmp_path).load()["entries"] == [entry(2)]
+
+
+def test_truncated_last_line_is_ignored(tmp_path):
+    journal = QueueJournal(tmp_path)
+    record_ops(journal, [("join", {"key": ["discord", 1], "entry": entry(1)}), ("clear", {}),
+                         ("join", {"key": ["discord", 2], "entry": entry(2)})])
+    with open(journal.journal_path, "a", encoding="utf-8") as f:
+        f.write('{"seq": 4, "op": "jo')
+    assert QueueJournal(tmp_path).load()["entries"] == [entry(2)]
+
+
+def test_snapshot_requested_after_snapshot_every(tmp_path):
+    journal = QueueJournal(tmp_path, snapshot_every=3)
+    journal.state_fn = lambda: {"enabled": False, "entries": []}
+    record_ops(journal, [("open", {}), ("close", {}), ("open", {})])
+    assert journal.snapshot_path.exists()
+    assert json.loads(journal.snapshot_path.read_text())["seq"] == 3
+
+
+def test_flush_after_cancelled_flush_keeps_order(tmp_path):
+    journal = QueueJournal(tmp_path)
+    append = journal._append
+    delays = [0.05]  # 只有第一批寫得慢
+
+    def slow_append(lines):
+        time.sleep(delays.pop() if delays else 0)
+        append(lines)
+
+    journal._append = slow_append
+
+    async def scenario():
+        journal.record("join", key=["discord", 1], entry=entry(1))
+        task = asyncio.create_task(journal.flush())
+        await asyncio.sleep(0.01)  # 第一批正在執行緒中寫入
+        journal.record("join", key=["discord", 2], entry=entry(2))
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await journal.flush()
+
+    asyncio.run(scenario())
+    assert QueueJournal(tmp_path).load()["entries"] == [entry(1), entry(2)]
@@ -0,0 +1,63 @@
+"""低記憶體模式的成員 LRU 過期與重新查詢"""
+import asyncio
+from types import SimpleNamespace
+
+from members import MemberLRU
+
+
+class FakeGuild:
+    def __init__(self, guild_id, roles):
+        self.id = guild_id
+        self.roles = roles  # 成員 ID -> 目前的身分組名稱
+        self.queries = []
+
+    def get_member(self, member_id):
+        return None
+
+    async def query_members(self, user_ids, limit, cache):
+        self.queries.append(list(user_ids))
+        return [self.member(member_id) for member_id in user_ids if member_id in self.roles]
+
+    def member(self, member_id):
+        return SimpleNamespace(id=member_id, guild=self, roles=self.roles[member_id])
+
+
+def test_member_without_ttl_never_expires():
+    guild = FakeGuild(1, {5: "觀眾"})
+    lru = MemberLRU(maxsize=10)
+    lru.remember(guild.member(5))
+    assert lru.get(guild, 5).roles == "觀眾"
+
+
+def test_expired_member_is_queried_again(clock):
+    now = clock("members")
+    guild = FakeGuild(1, {5: "觀眾", 6: "觀眾"})
+    refreshed = []
+    lru = MemberLRU(maxsize=10, ttl=30, on_refresh=refreshed.append)
+    lru.remember(guild.member(5))
+    lru.remember(guild.member(6))
+
+    guild.roles[5] = "訂閱"
+    now.now += 31
+    assert lru.get(guild, 5) is None and lru.get(guild, 6) is None
+    assert lru.expired == 2
+
+    asyncio.run(lru.refresh())
+    assert guild.queries == [[5, 6]]
+    assert [(m.id, m.roles) for m in refreshed] == [(5, "訂閱"), (6, "觀眾")]
+    assert lru.get(guild, 5).roles == "訂閱"
+
+
+class FailingGuild(FakeGuild):
+    async def query_members(self, user_ids, limit, cache):
+        raise asyncio.TimeoutError
+
+
+def test_fetch_many_separates_departed_and_failed_members():
+    guild = FakeGuild(1, {5: "觀眾"})
+    lru = MemberLRU(maxsize=10)
+    found, failed = asyncio.run(lru.fetch_many(guild, [5, 6]))
+    assert list(found) == [5] and failed == set()  # 6 已不在伺服器
+
+    found, failed = asyncio.run(lru.fetch_many(FailingGuild(2, {}), [7, 8]))
+    assert found == {} and failed == {7, 8}
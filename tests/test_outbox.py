@@ -0,0 +1,72 @@
+"""Outbox 的訊息合併與速率限制"""
+import asyncio
+
+from outbox import Outbox, RateBucket, split_message
+
+
+class Channel:
+    def __init__(self, channel_id=1):
+        self.id = channel_id
+        self.messages = []
+
+    async def send(self, content, **kwargs):
+        self.messages.append(content)
+        return content
+
+
+def test_rate_bucket_refills_over_time(clock):
+    now = clock("outbox")
+    bucket = RateBucket(rate=2, per=1.0)
+    assert [bucket.reserve(), bucket.reserve()] == [0.0, 0.0]
+    assert bucket.reserve() == 0.5   # 額度用完，等下一個額度
+    assert bucket.reserve() == 1.0
+    now.now += 2.0                    # 補回額度（不超過 rate）
+    assert bucket.reserve() == 0.0
+
+
+def test_coalesced_announcements_sent_as_one_message():
+    channel = Channel()
+
+    async def scenario():
+        outbox = Outbox(window=0.01, rate=5, per=1.0)
+        for i in range(3):
+            outbox.post(channel, f"公告 {i}", coalesce=True)
+        await outbox.flush()
+        return outbox
+
+    outbox = asyncio.run(scenario())
+    assert channel.messages == ["公告 0\n公告 1\n公告 2"]
+    assert (outbox.posted, outbox.sent, outbox.backlog) == (3, 1, 0)
+
+
+def test_coalescing_respects_message_limit():
+    channel = Channel()
+
+    async def scenario():
+        outbox = Outbox(window=0.01, limit=10)
+        for text in ("aaaa", "bbbb", "cccc"):
+            outbox.post(channel, text, coalesce=True)
+        await outbox.flush()
+
+    asyncio.run(scenario())
+    assert channel.messages == ["aaaa\nbbbb", "cccc"]
+
+
+def test_sends_wait_for_rate_limit():
+    channel = Channel()
+
+    async def scenario():
+        outbox = Outbox(window=0, rate=1, per=0.05)
+        for i in range(3):
+            await outbox.send_now(channel, str(i))
+        return outbox
+
+    outbox = asyncio.run(scenario())
+    assert channel.messages == ["0", "1", "2"]
+    assert outbox.rate_limit_waits == 2
+    assert outbox.rate_limit_wait_seconds > 0
+
+
+def test_split_message_on_lines():
+    assert split_message("ab\ncd\nef", limit=5) == ["ab\ncd", "ef"]
+    assert split_message("abcdefg", limit=3) == ["abc", "def", "g"]
@@ -0,0 +1,71 @@
+"""多頻道設定與舊日誌搬移"""
+import asyncio
+from types import SimpleNamespace
+
+from journal import QueueJournal
+from registry import LineSettings, migrate_legacy_journal
+from role_cache import RoleClassifier
+
+
+def role(role_id, name):
+    return SimpleNamespace(id=role_id, name=name)
+
+
+def member(*roles):
+    return SimpleNamespace(id=1, roles=list(roles))
+
+
+def line_at(directory):
+    return SimpleNamespace(name="預設", journal=QueueJournal(directory))
+
+
+def test_legacy_journal_moved_to_default_line(tmp_path):
+    old = QueueJournal(tmp_path)
+    old.record("open")
+    old.record("join", key=["discord", 1], entry={"key": ["discord", 1], "name": "m1"})
+    asyncio.run(old.flush())
+
+    line = line_at(tmp_path / "123")
+    assert migrate_legacy_journal(tmp_path, line)
+    assert not (tmp_path / QueueJournal.JOURNAL_FILE).exists()
+    state = line.journal.load()
+    assert state["enabled"] and [e["name"] for e in state["entries"]] == ["m1"]
+
+    # 已經搬過（或目標已有日誌）時不再動
+    assert not migrate_legacy_journal(tmp_path, line)
+
+
+def test_legacy_journal_kept_when_target_exists(tmp_path):
+    (tmp_path / QueueJournal.JOURNAL_FILE).write_text("", encoding="utf-8")
+    (tmp_path / "123").mkdir()
+    (tmp_path / "123" / QueueJournal.SNAPSHOT_FILE).write_text("{}", encoding="utf-8")
+    assert not migrate_legacy_journal(tmp_path, line_at(tmp_path / "123"))
+    assert (tmp_path / QueueJournal.JOURNAL_FILE).exists()
+
+
+def test_authority_keywords_per_line():
+    settings = LineSettings(1, authorized_roles=["Mod"], authority_keywords=["管理"])
+    classifier = RoleClassifier(settings.authorized_roles, settings.authority_keywords)
+    assert classifier.has_authority(member(role(1, "Mod")))
+    assert classifier.has_authority(member(role(2, "頻道管理員")))
+    assert not classifier.has_authority(member(role(3, "保姆")))
+
+
+def test_no_authority_keywords_matches_nothing():
+    classifier = RoleClassifier([], [])
+    assert not classifier.has_authority(member(role(1, "任何身分組")))
+    assert classifier.role_type(member(role(2, "訂閱者"))) == RoleClassifier.SUBSCRIBER
+
+
+def test_role_change_reclassified_without_invalidation():
+    guild = SimpleNamespace(id=9)
+    moderator = SimpleNamespace(id=1, guild=guild, roles=[role(1, "頻道管理員")])
+    classifier = RoleClassifier([], ["管理"], ttl=300)
+    assert classifier.has_authority(moderator)
+    assert classifier.has_authority(moderator) and classifier.hits == 1
+
+    # 沒有 on_member_update（低記憶體模式）時，身分組改變也要立即生效
+    demoted = SimpleNamespace(id=1, guild=guild, roles=[role(2, "觀眾")])
+    generation = classifier.generation
+    assert not classifier.has_authority(demoted)
+    assert classifier.generation > generation
@@ -0,0 +1,122 @@
+"""RideQueue 與參考模型（普通 list）的比對"""
+import random
+
+import pytest
+
+from ride_queue import RideQueue
+
+TIERS = ("a", "b", "c", None)
+
+
+class Model:
+    """最直接的實作：依上車順序的 list"""
+
+    def __init__(self):
+        self.entries = []  # [key, 成員, 層級]
+
+    def keys(self):
+        return [k for k, _, _ in self.entries]
+
+    def find(self, key):
+        for i, entry in enumerate(self.entries):
+            if entry[0] == key:
+                return i
+        return None
+
+
+def check(q, model):
+    assert len(q) == len(model.entries)
+    assert q.keys() == model.keys()
+    assert q.items() == [(k, v) for k, v, _ in model.entries]
+    assert list(q) == [v for _, v, _ in model.entries]
+    for i, (k, _, _) in enumerate(model.entries):
+        assert q.position(k) == i + 1
+        assert k in q
+    for tier in TIERS[:-1]:
+        expected = [(k, v) for k, v, t in model.entries if t == tier]
+        assert list(q.iter_tier(tier)) == expected
+        assert q.tier_count(tier) == len(expected)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_operations_match_model(seed):
+    rng = random.Random(seed)
+    q, model = RideQueue(), Model()
+    events = []
+    q.subscribe(lambda op, entries: events.append((op, list(entries))))
+    next_key = 0
+
+    for step in range(1500):
+        roll = rng.random()
+        if roll < 0.45 or not model.entries:
+            key, tier = next_key, rng.choice(TIERS)
+            next_key += 1
+            assert q.append(key, f"m{key}", tier=tier) == len(model.entries) + 1
+            model.entries.append([key, f"m{key}", tier])
+            assert events[-1] == ("join", [(key, f"m{key}")])
+        elif roll < 0.65:
+            key = rng.choice(model.keys())
+            assert q.remove(key) == f"m{key}"
+            del model.entries[model.find(key)]
+            assert events[-1] == ("leave", [(key, f"m{key}")])
+        elif roll < 0.75:
+            keys = rng.sample(model.keys(), min(len(model.entries), rng.randint(1, 6)))
+            removed = q.remove_many(keys + ["missing"])
+            assert removed == [(k, f"m{k}") for k in keys]
+            for k in keys:
+                del model.entries[model.find(k)]
+        elif roll < 0.9:
+            key, tier = rng.choice(model.keys()), rng.choice(TIERS)
+            q.retier(key, tier)
+            model.entries[model.find(key)][2] = tier
+        elif roll < 0.995:
+            start = rng.randint(0, len(model.entries) + 2)
+            stop = start + rng.randint(0, 25)
+            expected = [(k, v) for k, v, _ in model.entries[start:stop]]
+            assert q.slice_items(start, stop) == expected
+            assert q.head(stop) == [v for _, v, _ in model.entries[:stop]]
+        else:
+            q.clear()
+            model.entries = []
+            assert events[-1] == ("clear", [])
+        if step % 50 == 0:
+            check(q, model)
+    check(q, model)
+
+
+def test_duplicate_append_rejected():
+    q = RideQueue()
+    q.append("x", 1)
+    with pytest.raises(ValueError):
+        q.append("x", 2)
+    assert q.remove("y") is None
+    assert q.position("y") is None
+    assert q.get("y", "default") == "default"
+
+
+def test_retier_keeps_join_order_within_tier():
+    q = RideQueue()
+    for key in range(200):
+        q.append(key, key, tier="viewer")
+    # 由後往前改成訂閱者：每次都插到子佇列中間
+    for key in range(199, -1, -3):
+        q.retier(key, "sub")
+    assert [k for k, _ in q.iter_tier("sub")] == list(range(1, 200, 3))
+    assert q.keys() == list(range(200))
+
+
+def test_scans_skip_rotated_prefix():
+    q = RideQueue()
+    for key in range(40):
+        q.append(key, key)
+    q.remove_many(list(range(4)))
+    q.remove(5)
+    assert q._head == 4  # 第 5 格（key 4）仍在排隊
+    q.remove(4)
+    assert q._head == 6
+    assert q.keys() == list(range(6, 40)) and next(iter(q)) == 6
+
+    q.remove_many(list(range(6, 40)))
+    assert q._head == len(q._items) and not q.keys()
+    q.append("new", "new")
+    assert q.items() == [("new", "new")] and q.position("new") == 1
@@ -0,0 +1,98 @@
+"""RotationEngine 的換人規則"""
+import random
+
+import pytest
+
+from ride_queue import RideQueue
+from rotation import (
+    TIER_DISCORD_SUB, TIER_FOLLOWER, TIER_TWITCH_SUB, TIER_VIEWER, TIERS,
+    RotationEngine, RotationPolicy, higher_tier,
+)
+
+
+def make_queue(tiers):
+    q = RideQueue()
+    for i, tier in enumerate(tiers):
+        q.append(i, f"m{i}", tier=tier)
+    return q
+
+
+def keys(picked):
+    return [key for key, _ in picked]
+
+
+def test_subscribers_first_then_queue_order():
+    q = make_queue([TIER_VIEWER, TIER_VIEWER, TIER_DISCORD_SUB, TIER_VIEWER, TIER_DISCORD_SUB, TIER_DISCORD_SUB])
+    engine = RotationEngine(RotationPolicy({TIER_DISCORD_SUB: 2}))
+    assert keys(engine.rotate(q, 4)) == [2, 4, 0, 1]
+    assert q.keys() == [3, 5]
+    assert engine.round == 1
+
+
+def test_quotas_apply_in_tier_order():
+    q = make_queue([TIER_VIEWER, TIER_FOLLOWER, TIER_TWITCH_SUB, TIER_DISCORD_SUB, TIER_TWITCH_SUB])
+    policy = RotationPolicy(RotationPolicy.parse_quotas("twitch_sub:1, discord_sub:1,follower:1"))
+    assert keys(RotationEngine(policy).pick(q, 4)) == [3, 2, 1, 0]
+    assert len(q) == 5  # pick 不修改名單
+
+
+def test_parse_quotas_rejects_unknown_tier():
+    with pytest.raises(ValueError):
+        RotationPolicy.parse_quotas("gold:1")
+
+
+def test_cooldown_skips_recent_players_unless_short():
+    policy = RotationPolicy({}, cooldown=1)
+    engine = RotationEngine(policy)
+    q = make_queue([TIER_VIEWER] * 4)
+    played = engine.rotate(q, 2)
+    for key, member in played:
+        q.append(key, member, tier=TIER_VIEWER)
+    # 0、1 剛上場，先選 2、3
+    assert keys(engine.rotate(q, 2)) == [2, 3]
+    # 只剩冷卻中的人時仍然補滿
+    q2 = make_queue([TIER_VIEWER] * 2)
+    engine2 = RotationEngine(policy)
+    engine2.rotate(q2, 2)
+    q2.append(0, "m0", tier=TIER_VIEWER)
+    q2.append(1, "m1", tier=TIER_VIEWER)
+    assert keys(engine2.rotate(q2, 2)) == [0, 1]
+
+
+def test_max_consecutive_blocks_third_round():
+    engine = RotationEngine(RotationPolicy({}, max_consecutive=2))
+    q = make_queue([TIER_VIEWER])
+    q.append(1, "m1", tier=TIER_VIEWER)
+    for _ in range(2):
+        engine.rotate(q, 1)
+        q.remove(1)
+        q.append(0, "m0", tier=TIER_VIEWER)
+        q.append(1, "m1", tier=TIER_VIEWER)
+    # 0 已連續上場兩輪，這輪讓 1 上
+    assert keys(engine.pick(q, 1)) == [1]
+
+
+def reference_pick(entries, quotas, count):
+    """只有配額時的參考實作：entries 為依排隊順序的 [(key, 層級)]"""
+    picked = []
+    for tier in TIERS:
+        quota = quotas.get(tier, 0)
+        picked += [k for k, t in entries if t == tier and k not in picked][:max(0, min(quota, count - len(picked)))]
+    picked += [k for k, _ in entries if k not in picked][:count - len(picked)]
+    return picked
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_random_queues_match_reference(seed):
+    rng = random.Random(seed)
+    entries = [(i, rng.choice(TIERS)) for i in range(rng.randint(0, 40))]
+    quotas = {tier: rng.randint(0, 3) for tier in TIERS if rng.random() < 0.6}
+    count = rng.randint(1, 8)
+    q = make_queue([t for _, t in entries])
+    assert keys(RotationEngine(RotationPolicy(quotas)).pick(q, count)) == reference_pick(entries, quotas, count)
+
+
+def test_higher_tier():
+    assert higher_tier(TIER_VIEWER, TIER_TWITCH_SUB) == TIER_TWITCH_SUB
+    assert higher_tier(None, TIER_FOLLOWER) == TIER_FOLLOWER
+    assert higher_tier(TIER_DISCORD_SUB, None) == TIER_DISCORD_SUB
@@ -0,0 +1,51 @@
+"""JSON 檔的原子寫入與各存檔的讀回"""
+import asyncio
+import json
+
+from identity import IdentityIndex
+from storage import FlushLoop, write_json
+from teams import RatingStore
+
+
+def test_write_json_replaces_file(tmp_path):
+    path = tmp_path / "sub" / "data.json"
+    write_json(path, {"a": 1})
+    write_json(path, {"a": 2})
+    assert json.loads(path.read_text(encoding="utf-8")) == {"a": 2}
+    assert [p.name for p in path.parent.iterdir()] == ["data.json"]
+
+
+def test_ratings_round_trip(tmp_path):
+    store = RatingStore(tmp_path / "ratings.json")
+    store.set(1, 2, 1234)
+    store.save()
+    assert RatingStore(tmp_path / "ratings.json").get(1, 2) == 1234
+
+
+def test_identity_round_trip(tmp_path):
+    index = IdentityIndex(tmp_path / "identities.json")
+    index.request(42, "viewer")
+    assert index.confirm("viewer") == 42
+    index.save()
+    loaded = IdentityIndex(tmp_path / "identities.json")
+    assert loaded.discord_for("viewer") == 42 and loaded.twitch_for(42) == "viewer"
+
+
+def test_flush_loop_merges_wakeups():
+    calls = []
+
+    async def flush():
+        calls.append(len(calls))
+
+    async def scenario():
+        writer = FlushLoop(flush, 0.01)
+        writer.wake()  # run() 開始前的資料也會寫入
+        task = asyncio.create_task(writer.run())
+        await asyncio.sleep(0.05)
+        for _ in range(3):
+            writer.wake()
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(scenario())
+    assert calls == [0, 1]
@@ -0,0 +1,32 @@
+"""平衡分隊與窮舉結果比對"""
+import itertools
+import random
+
+from teams import PAIR_PENALTY, balance
+
+
+def cost(ratings, hot_pairs, team_a):
+    members = set(team_a)
+    diff = abs(sum(ratings) - 2 * sum(ratings[i] for i in team_a))
+    return diff + sum(PAIR_PENALTY for i, j in hot_pairs if (i in members) == (j in members))
+
+
+def brute_force(ratings, hot_pairs):
+    n = len(ratings)
+    return min(cost(ratings, hot_pairs, combo) for combo in itertools.combinations(range(n), n // 2))
+
+
+def test_odd_count_can_put_last_player_in_team_a():
+    team_a, team_b = balance([1, 1, 10])
+    assert cost([1, 1, 10], [], team_a) == 8
+
+
+def test_exact_matches_brute_force():
+    rng = random.Random(18)
+    for n in range(2, 11):
+        for _ in range(30):
+            ratings = [rng.randint(800, 1400) for _ in range(n)]
+            hot_pairs = [pair for pair in itertools.combinations(range(n), 2) if rng.random() < 0.15]
+            team_a, team_b = balance(ratings, hot_pairs)
+            assert len(team_a) == n // 2 and sorted(team_a + team_b) == list(range(n))
+            assert cost(ratings, hot_pairs, team_a) == brute_force(ratings, hot_pairs), (ratings, hot_pairs)
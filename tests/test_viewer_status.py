@@ -0,0 +1,75 @@
+"""Twitch 觀眾狀態的批次查詢與快取（以替身客戶端離線測試）"""
+import asyncio
+
+from viewer_status import MAX_IDS_PER_REQUEST, StatusResolver
+
+
+class RecordingClient:
+    """記錄每次呼叫的 Helix 替身：subs 為訂閱者，follows 為追隨者"""
+
+    def __init__(self, subs=(), follows=(), fail=False):
+        self.subs = set(subs)
+        self.follows = set(follows)
+        self.fail = fail
+        self.subscriber_calls = []
+
+    async def user_ids(self, logins):
+        return {login: f"b-{login}" for login in logins}
+
+    async def subscribers(self, broadcaster_id, user_ids):
+        self.subscriber_calls.append(list(user_ids))
+        if self.fail:
+            raise ConnectionError("offline")
+        return {uid for uid in user_ids if uid in self.subs}
+
+    async def is_follower(self, broadcaster_id, user_id):
+        if self.fail:
+            raise ConnectionError("offline")
+        return user_id in self.follows
+
+    async def close(self):
+        pass
+
+
+def resolve(resolver, channel, user_ids):
+    """排入查詢並處理一批，回傳 user_id -> ViewerStatus"""
+    results = {}
+    for user_id in user_ids:
+        resolver.request(channel, user_id, lambda status, user_id=user_id: results.__setitem__(user_id, status))
+    pending, resolver._pending = resolver._pending, {}
+    asyncio.run(resolver._resolve(pending))
+    return results
+
+
+def test_one_subscribers_call_per_hundred_users():
+    client = RecordingClient()
+    user_ids = [str(i) for i in range(MAX_IDS_PER_REQUEST * 2 + 5)]
+    resolve(StatusResolver(client), "chan", user_ids)
+    assert [len(call) for call in client.subscriber_calls] == [100, 100, 5]
+
+
+def test_positive_and_negative_ttl(clock):
+    now = clock("viewer_status")
+    now.now = 1000.0
+    client = RecordingClient(subs={"sub"}, follows={"fan"})
+    resolver = StatusResolver(client, ttl=600, negative_ttl=120)
+    results = resolve(resolver, "chan", ["sub", "fan", "nobody"])
+
+    assert (results["sub"].subscriber, results["sub"].follower) == (True, False)
+    assert results["sub"].expires == 1600.0   # 訂閱但沒追隨也是查到的狀態
+    assert results["fan"].expires == 1600.0
+    assert results["nobody"].expires == 1120.0
+    assert resolver.cached("chan", "fan") is results["fan"]
+
+    now.now = 1200.0
+    assert resolver.cached("chan", "nobody") is None
+    assert resolver.cached("chan", "fan") is results["fan"]
+
+
+def test_callbacks_fire_when_lookup_fails(clock):
+    clock("viewer_status").now = 0.0
+    resolver = StatusResolver(RecordingClient(fail=True), ttl=600, negative_ttl=120)
+    results = resolve(resolver, "chan", ["a", "b"])
+    assert set(results) == {"a", "b"}
+    assert all(s.subscriber is None and s.follower is None and s.expires == 120 for s in results.values())
+    assert resolver.errors == 1 + 2  # 訂閱一次、追隨每人一次
@@ -0,0 +1,33 @@
+"""Twitch 聊天監聽 Bot
+
+只在設定了 Twitch 帳號時才由 main.py 載入，沒有使用 Twitch 時完全不需要
+import twitchio。聊天指令的處理邏輯在 main.py，這裡只負責連線與轉送訊息。
+"""
+from twitchio.ext import commands as twitch_commands
+
+from botlog import get_logger
+
+log = get_logger("twitch")
+
+
+class TwitchBot(twitch_commands.Bot):
+    """Twitch 聊天監聽 Bot"""
+
+    def __init__(self, *args, on_ready=None, on_chat=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_ready = on_ready  # 連線成功時呼叫 on_ready()
+        self.on_chat = on_chat    # 收到聊天訊息時呼叫 await on_chat(message)
+
+    async def event_ready(self):
+        """Twitch 連線成功"""
+        log.info("已登入為 %s", self.nick)
+        if self.on_ready:
+            self.on_ready()
+
+    async def event_message(self, message):
+        """監聽 Twitch 聊天訊息"""
+        # 忽略機器人本身的訊息
+        if message.echo:
+            return
+        if self.on_chat:
+            await self.on_chat(message)
@@ -0,0 +1,212 @@
+"""Twitch 觀眾的訂閱 / 追隨狀態查詢
+
+聊天訊息的 tags 只有訂閱徽章，沒有追隨狀態，所以追隨者一直被當成一般觀眾。
+StatusResolver 在背景向 Twitch Helix API 查詢：
+- 需要查詢的使用者先收集起來，每隔 window 秒批次查詢一次
+  （訂閱狀態一次最多查 100 人；追隨狀態 API 一次只能查一人，以有限的並行數查詢）
+- 查詢結果快取 ttl 秒；沒有訂閱也沒有追隨、或查詢失敗時只快取 negative_ttl 秒，避免重複打 API
+- 查到後以 callback 通知，不會延遲上車的回覆
+
+HelixClient 的 base_url 可以指向本地的假伺服器，也可以換成任何提供相同
+三個方法的物件（例如 benchmarks.fakes.FakeHelixClient），不需要連線 Twitch。
+"""
+import asyncio
+import time
+
+import aiohttp
+
+from botlog import get_logger
+
+log = get_logger("twitch.status")
+
+HELIX_URL = "https://api.twitch.tv/helix"
+MAX_IDS_PER_REQUEST = 100  # Helix 一次查詢最多 100 個 user_id / login
+
+
+class HelixError(Exception):
+    """Helix API 回傳錯誤"""
+
+    def __init__(self, status, message):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+
+class HelixClient:
+    """Twitch Helix API 的最小客戶端（只有查詢狀態用到的三個方法）"""
+
+    def __init__(self, client_id, token, base_url=HELIX_URL, timeout=5.0):
+        self.client_id = client_id
+        self.token = token[len("oauth:"):] if token.startswith("oauth:") else token
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._session = None  # 第一次查詢時建立，確保綁定到 Bot 的事件循環
+
+    async def _get(self, path, params):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                headers={"Client-Id": self.client_id, "Authorization": f"Bearer {self.token}"},
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        async with self._session.get(f"{self.base_url}{path}", params=params) as response:
+            if response.status != 200:
+                raise HelixError(response.status, await response.text())
+            return await response.json()
+
+    async def user_ids(self, logins):
+        """login -> user_id（最多 100 個）"""
+        data = await self._get("/users", [("login", login) for login in logins])
+        return {user["login"]: user["id"] for user in data["data"]}
+
+    async def subscribers(self, broadcaster_id, user_ids):
+        """回傳 user_ids 中有訂閱的 user_id 集合（最多 100 個）"""
+        params = [("broadcaster_id", broadcaster_id)] + [("user_id", uid) for uid in user_ids]
+        data = await self._get("/subscriptions", params)
+        return {sub["user_id"] for sub in data["data"]}
+
+    async def is_follower(self, broadcaster_id, user_id):
+        data = await self._get("/channels/followers", {"broadcaster_id": broadcaster_id, "user_id": user_id})
+        return bool(data["data"])
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class ViewerStatus:
+    """查詢結果（None 表示查詢失敗、狀態未知）"""
+
+    __slots__ = ("subscriber", "follower", "expires")
+
+    def __init__(self, subscriber, follower, expires):
+        self.subscriber = subscriber
+        self.follower = follower
+        self.expires = expires
+
+
+class StatusResolver:
+    """批次查詢並快取 Twitch 觀眾的訂閱 / 追隨狀態"""
+
+    def __init__(self, client, ttl=600, negative_ttl=120, window=0.5, concurrency=4):
+        self.client = client
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.window = window
+        self.concurrency = concurrency
+
+        self._cache = {}         # (頻道, user_id) -> ViewerStatus
+        self._pending = {}       # (頻道, user_id) -> [callback, ...]
+        self._broadcasters = {}  # 頻道 login -> broadcaster_id
+        self._wakeup = None
+
+        # 統計數據
+        self.hits = 0
+        self.misses = 0
+        self.api_calls = 0
+        self.errors = 0
+
+    def cached(self, channel, user_id):
+        """快取中的狀態（沒有或已過期時回傳 None）"""
+        status = self._cache.get((channel, user_id))
+        if status is None or status.expires < time.monotonic():
+            return None
+        self.hits += 1
+        return status
+
+    def request(self, channel, user_id, callback):
+        """排入查詢，查到後呼叫 callback(ViewerStatus)；同一使用者重複排入只查一次"""
+        self.misses += 1
+        key = (channel, user_id)
+        callbacks = self._pending.get(key)
+        if callbacks is None:
+            callbacks = self._pending[key] = []
+        callbacks.append(callback)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def run(self):
+        """背景查詢工作"""
+        self._wakeup = asyncio.Event()
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            # 等待一小段時間，讓同時間上車的觀眾合併成一批
+            await asyncio.sleep(self.window)
+            pending, self._pending = self._pending, {}
+            try:
+                await self._resolve(pending)
+            except Exception:
+                log.exception("查詢觀眾狀態失敗")
+
+    async def _resolve(self, pending):
+        by_channel = {}
+        for channel, user_id in pending:
+            by_channel.setdefault(channel, []).append(user_id)
+
+        await self._resolve_broadcasters([c for c in by_channel if c not in self._broadcasters])
+
+        for channel, user_ids in by_channel.items():
+            broadcaster_id = self._broadcasters.get(channel)
+            for start in range(0, len(user_ids), MAX_IDS_PER_REQUEST):
+                chunk = user_ids[start:start + MAX_IDS_PER_REQUEST]
+                results = await self._lookup(broadcaster_id, chunk) if broadcaster_id else {}
+                now = time.monotonic()
+                for user_id in chunk:
+                    subscriber, follower = results.get(user_id, (None, None))
+                    # 沒有訂閱也沒有追隨、或查詢失敗的結果只快取較短的時間（剛追隨的觀眾很快就能被查到）
+                    ttl = self.ttl if subscriber or follower else self.negative_ttl
+                    status = self._cache[(channel, user_id)] = ViewerStatus(subscriber, follower, now + ttl)
+                    for callback in pending[(channel, user_id)]:
+                        try:
+                            callback(status)
+                        except Exception:
+                            log.exception("套用觀眾狀態失敗")
+
+        # 順便清掉過期的快取
+        now = time.monotonic()
+        for key in [k for k, s in self._cache.items() if s.expires < now]:
+            del self._cache[key]
+
+    async def _resolve_broadcasters(self, channels):
+        if not channels:
+            return
+        try:
+            self.api_calls += 1
+            self._broadcasters.update(await self.client.user_ids(channels))
+        except Exception as e:
+            self.errors += 1
+            log.warning("無法取得頻道 %s 的 broadcaster_id：%s", channels, e)
+
+    async def _lookup(self, broadcaster_id, user_ids):
+        """user_id -> (是否訂閱, 是否追隨)，查不到的狀態為 None，兩者都查不到的使用者不會出現在結果中"""
+        try:
+            self.api_calls += 1
+            subscribers = await self.client.subscribers(broadcaster_id, user_ids)
+        except Exception as e:
+            # 權杖沒有 channel:read:subscriptions 權限時只查追隨狀態
+            self.errors += 1
+            log.debug("無法查詢訂閱狀態：%s", e)
+            subscribers = None
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def follower(user_id):
+            async with semaphore:
+                try:
+                    self.api_calls += 1
+                    return user_id, await self.client.is_follower(broadcaster_id, user_id)
+                except Exception as e:
+                    self.errors += 1
+                    log.debug("無法查詢 %s 的追隨狀態：%s", user_id, e)
+                    return user_id, None
+
+        results = {}
+        for user_id, is_follower in await asyncio.gather(*(follower(uid) for uid in user_ids)):
+            if is_follower is None and subscribers is None:
+                continue
+            results[user_id] = (None if subscribers is None else user_id in subscribers, is_follower)
+        return results
+
+    async def close(self):
+        await self.client.close()